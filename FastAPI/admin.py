@@ -224,18 +224,17 @@ class EventsAdminSite(admin.AdminSite):
     index_title = "Tableau de bord principal"
     
     def index(self, request, extra_context=None):
-        from django.utils import timezone
+        from .statistiques import StatistiquesService
         
-        # Statistiques pour le tableau de bord
+        # Statistiques pour le tableau de bord (ligne matérialisée)
+        stats = StatistiquesService.get()
         extra_context = extra_context or {}
         extra_context.update({
-            'total_utilisateurs': Utilisateur.objects.filter(is_active=True).count(),
-            'total_lieux': Lieu.objects.count(),
-            'total_evenements': Evenement.objects.count(),
-            'evenements_a_venir': Evenement.objects.filter(
-                date_debut__gt=timezone.now()
-            ).count(),
-            'avis_total': AvisLieu.objects.count() + AvisEvenement.objects.count(),
+            'total_utilisateurs': stats.nombre_utilisateurs_actifs,
+            'total_lieux': stats.nombre_lieux,
+            'total_evenements': stats.nombre_evenements,
+            'evenements_a_venir': stats.evenements_a_venir,
+            'avis_total': stats.nombre_avis_lieux + stats.nombre_avis_evenements,
         })
         
         return super().index(request, extra_context)
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Utilitaires de cache
+Fichier: cache_utils.py
+
+- cache_aside: lecture/recalcul protégé contre les ruées (XFetch, TTL souple,
+  verrou de recalcul)
+- cached_api_response: cache des réponses des endpoints publics en lecture
+  seule, sur deux niveaux:
+    - L1: dictionnaire par processus, très courte durée de vie
+    - L2: cache Django (Redis en production)
+  Les clés incluent un compteur de génération incrémenté par les signaux
+  (voir signals.py) : toute écriture invalide d'un coup toutes les réponses.
+"""
+
+import hashlib
+import math
+import random
+import threading
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from rest_framework.response import Response
+import logging
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_GENERATION_KEY = 'response_cache_generation'
+
+# Expiration L2: borne la durée pendant laquelle un événement "à venir"
+# peut rester affiché après avoir commencé
+RESPONSE_CACHE_TIMEOUT = 60
+
+# Durée de vie L1 (et de la génération lue dans le cache partagé)
+L1_TIMEOUT = 2.0
+L1_MAX_ENTRIES = 512
+
+# Période supplémentaire pendant laquelle une valeur expirée peut être
+# servie pendant qu'un seul processus la recalcule
+DEFAULT_STALE_TIMEOUT = 60
+
+# Durée max d'un recalcul (au-delà, le verrou expire et un autre peut recalculer)
+RECOMPUTE_LOCK_TIMEOUT = 30
+
+# Attente max d'une valeur en cours de calcul par un autre processus
+RECOMPUTE_WAIT = 2.0
+RECOMPUTE_POLL_INTERVAL = 0.05
+
+_l1 = {}
+_l1_lock = threading.Lock()
+_generation_locale = {'valeur': None, 'lue_a': 0.0}
+
+
+def _enveloppe_valide(entree):
+    return isinstance(entree, dict) and 'expire_douce' in entree
+
+
+def _recalculer(key, compute, timeout, stale_timeout, cache_none):
+    debut = time.time()
+    valeur = compute()
+    delta = time.time() - debut
+
+    if valeur is not None or cache_none:
+        cache.set(key, {
+            'valeur': valeur,
+            'delta': delta,
+            'expire_douce': time.time() + timeout,
+        }, timeout + stale_timeout)
+    return valeur
+
+
+def cache_aside(key, compute, timeout, stale_timeout=DEFAULT_STALE_TIMEOUT,
+                beta=1.0, cache_none=False):
+    """
+    Lire `key` dans le cache ou la calculer avec `compute()`.
+
+    - Recalcul probabiliste anticipé (XFetch): plus l'expiration approche
+      et plus le calcul est long, plus un appel a de chances de recalculer
+      avant l'expiration.
+    - TTL souple: après `timeout` secondes, la valeur reste servie pendant
+      `stale_timeout` secondes pendant qu'un seul appelant la recalcule.
+    - Verrou de recalcul: un seul processus recalcule une clé à la fois; en
+      l'absence de valeur, les autres attendent brièvement son résultat.
+
+    Les résultats None ne sont pas mis en cache sauf si cache_none=True.
+    """
+    lock_key = f"{key}_recalcul"
+    entree = cache.get(key)
+
+    if _enveloppe_valide(entree):
+        # 1 - random() est dans ]0, 1] : log() toujours défini
+        anticipation = entree['delta'] * beta * -math.log(1.0 - random.random())
+        if time.time() + anticipation < entree['expire_douce']:
+            return entree['valeur']
+
+        if not cache.add(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT):
+            # Un autre appelant recalcule déjà: servir la valeur périmée
+            return entree['valeur']
+
+        try:
+            return _recalculer(key, compute, timeout, stale_timeout, cache_none)
+        except Exception as e:
+            logger.error(f"Erreur recalcul du cache '{key}', valeur périmée servie: {e}")
+            return entree['valeur']
+        finally:
+            cache.delete(lock_key)
+
+    if cache.add(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT):
+        try:
+            return _recalculer(key, compute, timeout, stale_timeout, cache_none)
+        finally:
+            cache.delete(lock_key)
+
+    # Un autre appelant calcule cette valeur: attendre son résultat
+    limite = time.monotonic() + RECOMPUTE_WAIT
+    while time.monotonic() < limite:
+        time.sleep(RECOMPUTE_POLL_INTERVAL)
+        entree = cache.get(key)
+        if _enveloppe_valide(entree):
+            return entree['valeur']
+
+    return _recalculer(key, compute, timeout, stale_timeout, cache_none)
+
+
+def get_generation():
+    """Génération courante, relue dans le cache partagé au plus toutes les L1_TIMEOUT secondes"""
+    maintenant = time.monotonic()
+    if _generation_locale['valeur'] is not None and maintenant - _generation_locale['lue_a'] < L1_TIMEOUT:
+        return _generation_locale['valeur']
+
+    generation = cache.get(RESPONSE_CACHE_GENERATION_KEY)
+    if generation is None:
+        generation = 1
+        cache.add(RESPONSE_CACHE_GENERATION_KEY, generation, None)
+
+    _generation_locale['valeur'] = generation
+    _generation_locale['lue_a'] = maintenant
+    return generation
+
+
+def bump_generation():
+    """Invalider toutes les réponses en cache (appelé par les signaux)"""
+    try:
+        cache.incr(RESPONSE_CACHE_GENERATION_KEY)
+    except ValueError:
+        cache.set(RESPONSE_CACHE_GENERATION_KEY, 2, None)
+
+    # Le processus qui écrit voit immédiatement ses propres modifications
+    with _l1_lock:
+        _l1.clear()
+    _generation_locale['valeur'] = None
+
+
+def _l1_get(key):
+    entree = _l1.get(key)
+    if entree and entree[0] > time.monotonic():
+        return entree[1]
+    return None
+
+
+def _l1_set(key, data):
+    with _l1_lock:
+        if len(_l1) >= L1_MAX_ENTRIES:
+            _l1.clear()
+        _l1[key] = (time.monotonic() + L1_TIMEOUT, data)
+
+
+def make_response_cache_key(nom, request):
+    """Clé: endpoint + génération + paramètres de requête triés"""
+    params = sorted(
+        (cle, tuple(valeurs)) for cle, valeurs in request.query_params.lists()
+    )
+    empreinte = hashlib.md5(repr(params).encode('utf-8')).hexdigest()
+    return f"response_{nom}_{get_generation()}_{empreinte}"
+
+
+def cached_api_response(nom, timeout=RESPONSE_CACHE_TIMEOUT):
+    """
+    Décorateur pour les vues @api_view en lecture seule.
+    À placer sous @api_view/@permission_classes:
+
+    @api_view(['GET'])
+    @permission_classes([])
+    @cached_api_response('statistiques')
+    def statistiques(request):
+        ...
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return func(request, *args, **kwargs)
+
+            key = make_response_cache_key(nom, request)
+
+            data = _l1_get(key)
+            if data is not None:
+                return Response(data)
+
+            reponse_calculee = {}
+
+            def compute():
+                response = func(request, *args, **kwargs)
+                reponse_calculee['response'] = response
+                # Les réponses d'erreur ne sont pas mises en cache
+                return response.data if response.status_code == 200 else None
+
+            data = cache_aside(key, compute, timeout)
+
+            if 'response' in reponse_calculee:
+                response = reponse_calculee['response']
+                if response.status_code != 200:
+                    return response
+
+            _l1_set(key, data)
+            return Response(data)
+        return wrapper
+    return decorator
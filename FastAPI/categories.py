@@ -0,0 +1,62 @@
+"""
+Facettes de catégories de lieux (comptes mis en cache)
+Fichier: categories.py
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, Min
+from django.utils.text import slugify
+from .cache_utils import cache_aside
+
+# Les clés sont invalidées à chaque écriture sur Lieu (voir signals.py)
+CATEGORIES_CACHE_KEY = 'categories_facettes'
+CATEGORIES_LOME_CACHE_KEY = 'categories_facettes_lome'
+CATEGORIES_CACHE_TIMEOUT = 60 * 60
+
+# Limites approximatives de Lomé (mêmes valeurs que donnees_lome)
+LOME_LAT_RANGE = (6.0, 6.3)
+LOME_LNG_RANGE = (1.0, 1.4)
+
+
+def slug_categorie(categorie):
+    """Forme normalisée d'une catégorie, utilisée pour les filtres exacts"""
+    return slugify(categorie or '')
+
+
+def _calculer_facettes(queryset):
+    facettes = queryset.exclude(categorie_slug='').values('categorie_slug').annotate(
+        libelle=Min('categorie'),
+        nombre=Count('id')
+    ).order_by('-nombre', 'categorie_slug')
+
+    return [
+        {
+            'categorie': facette['libelle'],
+            'slug': facette['categorie_slug'],
+            'nombre_lieux': facette['nombre'],
+        }
+        for facette in facettes
+    ]
+
+
+def get_categories_facettes(lome_seulement=False):
+    """Retourner les catégories avec leur nombre de lieux"""
+    from .models import Lieu
+
+    cache_key = CATEGORIES_LOME_CACHE_KEY if lome_seulement else CATEGORIES_CACHE_KEY
+
+    def compute():
+        queryset = Lieu.objects.all()
+        if lome_seulement:
+            queryset = queryset.filter(
+                latitude__range=LOME_LAT_RANGE,
+                longitude__range=LOME_LNG_RANGE
+            )
+        return _calculer_facettes(queryset)
+
+    return cache_aside(cache_key, compute, CATEGORIES_CACHE_TIMEOUT, cache_none=True)
+
+
+def invalider_categories():
+    """Invalider les comptes mis en cache (appelé après une écriture sur Lieu)"""
+    cache.delete_many([CATEGORIES_CACHE_KEY, CATEGORIES_LOME_CACHE_KEY])
@@ -0,0 +1,143 @@
+"""
+Garde des connexions WebSocket d'un processus: plafond de connexions,
+battements de cœur et fermeture des connexions inactives
+Fichier: connection_guard.py
+
+Les sockets morts sont détectés par les pings du protocole WebSocket de
+Daphne (--ping-interval / --ping-timeout, voir render.yaml). En plus, le
+serveur envoie une trame applicative {"type": "ping"} aux connexions
+silencieuses depuis heartbeat_interval secondes. Un client qui y répond par
+{"type": "pong"} adopte la surveillance applicative: toute trame reçue compte
+alors comme une activité, et sans activité depuis idle_timeout secondes
+(client figé) la connexion est fermée avec le code 4408, ce qui libère son
+descripteur de fichier et ses groupes. Les clients en simple écoute, qui
+n'envoient rien, ne sont jamais fermés pour inactivité.
+
+Au-delà de max_connexions connexions dans le processus, une nouvelle
+connexion reçoit une trame 'server_busy' avec un délai de réessai aléatoire
+(pour étaler les reconnexions), puis est fermée avec le code 1013.
+"""
+
+import asyncio
+import json
+import random
+import time
+
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+REAPER_INTERVAL = 10
+
+# Codes de fermeture: 1013 Try Again Later, 1009 Message Too Big (RFC 6455), 4408 inactivité
+CLOSE_CODE_TRY_AGAIN_LATER = 1013
+CLOSE_CODE_MESSAGE_TOO_BIG = 1009
+CLOSE_CODE_INACTIVE = 4408
+
+# Délai de réessai proposé aux connexions refusées (secondes)
+BUSY_RETRY_AFTER = (5, 30)
+
+
+class ConnectionGuard:
+    """Connexions acceptées du processus et leur dernière activité"""
+
+    def __init__(self, metriques, max_connexions, idle_timeout, heartbeat_interval):
+        self.metriques = metriques
+        self.max_connexions = max_connexions
+        self.idle_timeout = idle_timeout
+        self.heartbeat_interval = heartbeat_interval
+        # channel_name -> [consumer, dernière activité, dernier ping, surveillance adoptée]
+        self._connexions = {}
+        self._tache = None
+
+    def __len__(self):
+        return len(self._connexions)
+
+    def admettre(self):
+        """Vrai si le processus peut accepter une connexion de plus"""
+        if len(self._connexions) < self.max_connexions:
+            return True
+        self.metriques.incrementer('connexions_refusees')
+        return False
+
+    @staticmethod
+    def delai_reessai():
+        return random.randint(*BUSY_RETRY_AFTER)
+
+    def enregistrer(self, consumer):
+        maintenant = time.monotonic()
+        self._connexions[consumer.channel_name] = [consumer, maintenant, maintenant, False]
+        self._demarrer()
+
+    def activite(self, channel_name):
+        connexion = self._connexions.get(channel_name)
+        if connexion:
+            connexion[1] = time.monotonic()
+
+    def pong(self, channel_name):
+        """Le client répond aux pings serveur: la fermeture pour inactivité s'applique"""
+        connexion = self._connexions.get(channel_name)
+        if connexion:
+            connexion[3] = True
+
+    def retirer(self, channel_name):
+        self._connexions.pop(channel_name, None)
+
+    def _demarrer(self):
+        if self._tache is not None and not self._tache.done() \
+                and self._tache.get_loop() is asyncio.get_running_loop():
+            return
+        self._tache = asyncio.ensure_future(self._boucle())
+
+    async def _boucle(self):
+        while True:
+            await asyncio.sleep(REAPER_INTERVAL)
+            try:
+                await self.inspecter()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur inspection des connexions WebSocket: {e}")
+
+    async def inspecter(self):
+        """Un passage: ping des connexions silencieuses, fermeture des inactives surveillées"""
+        debut = time.monotonic()
+        pings = fermees = silencieuses = surveillees = 0
+
+        for channel_name, connexion in list(self._connexions.items()):
+            consumer, derniere_activite, dernier_ping, surveillee = connexion
+            surveillees += surveillee
+            inactivite = debut - derniere_activite
+            if surveillee and inactivite >= self.idle_timeout:
+                self.retirer(channel_name)
+                fermees += 1
+                try:
+                    await consumer.close(code=CLOSE_CODE_INACTIVE)
+                except Exception as e:
+                    logger.warning(f"Fermeture de la connexion inactive {channel_name}: {e}")
+                continue
+            if inactivite >= self.heartbeat_interval:
+                silencieuses += 1
+                if debut - dernier_ping >= self.heartbeat_interval:
+                    connexion[2] = debut
+                    pings += 1
+                    try:
+                        await consumer.send(text_data=json.dumps({
+                            'type': 'ping',
+                            'timestamp': timezone.now().isoformat()
+                        }))
+                    except Exception as e:
+                        logger.warning(f"Ping de {channel_name} impossible: {e}")
+
+        if fermees:
+            logger.info(f"🧹 {fermees} connexion(s) WebSocket inactive(s) fermée(s)")
+        self.metriques.incrementer('pings_serveur', pings)
+        self.metriques.incrementer('connexions_fermees_inactives', fermees)
+        self.metriques.definir('connexions', len(self._connexions))
+        self.metriques.definir('connexions_silencieuses', silencieuses)
+        self.metriques.definir('connexions_surveillees', surveillees)
+        self.metriques.definir('connexions_max', self.max_connexions)
+        self.metriques.observer('duree_inspection_s', time.monotonic() - debut)
+        self.metriques.publier_periodiquement()
+        return pings, fermees
@@ -1,29 +1,452 @@
+import asyncio
+import itertools
 import json
+import uuid
+from collections import OrderedDict
+from functools import cached_property
+from urllib.parse import parse_qs
+from django.conf import settings
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser
 from django.utils import timezone
-from .models import Utilisateur, Evenement, Lieu
+from .models import Lieu
 from .serializers import EvenementSerializer, LieuSerializer
+from .subscriber_index import LOCATION_TOPIC_MESSAGE_TYPE, location_listener
+from .notification_frames import (
+    ajouter_champ, construire_frame, encoder, frame_evenement, frame_lieu, frame_localisation,
+    frame_rappel
+)
+from .notification_journal import position_courante, relire
+from .frame_codecs import negocier
+from .metrics import RegistreMetriques, identifiant_processus
+from .presence import presence
+from .rate_limit import ip_depuis_scope, limiteur_connexions_ws, limiteur_messages_ws
+from .user_notifications import compter_non_lues, marquer_lues, page_non_lues
+from .websocket_utils import DynamicGroupManager, ProductionWebSocketConfig
+from .connection_guard import (
+    CLOSE_CODE_MESSAGE_TOO_BIG, CLOSE_CODE_TRY_AGAIN_LATER, ConnectionGuard
+)
+from .subscription_filters import FiltreAbonnement, lire_cercle
+from .zone_snapshots import evenements_zone
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Numéros de séquence mémorisés par connexion pour écarter les doublons reprise/direct
+RESUME_DEDUP_WINDOW = 256
 
-class EventNotificationConsumer(AsyncWebsocketConsumer):
+# Abonnements simultanés d'une connexion multiplexée (/ws/stream/)
+MAX_STREAM_SUBSCRIPTIONS = 50
+
+# Groupes event_<id> suivis par une connexion /ws/events/
+MAX_EVENT_SUBSCRIPTIONS = 100
+
+metriques_websocket = RegistreMetriques(f'websocket_{identifiant_processus()}')
+
+garde_connexions = ConnectionGuard(
+    metriques_websocket,
+    max_connexions=getattr(
+        settings, 'WEBSOCKET_MAX_CONNECTIONS', ProductionWebSocketConfig.MAX_CONNECTIONS
+    ),
+    idle_timeout=getattr(
+        settings, 'WEBSOCKET_IDLE_TIMEOUT',
+        ProductionWebSocketConfig.CONNECTION_TIMEOUT.total_seconds()
+    ),
+    heartbeat_interval=getattr(
+        settings, 'WEBSOCKET_HEARTBEAT_INTERVAL',
+        ProductionWebSocketConfig.HEARTBEAT_INTERVAL.total_seconds()
+    )
+)
+
+# Les cellules géographiques sont rejointes par le canal du processus, pas par les consumers
+presence.ajouter_source_groupes(location_listener.compteurs_groupes)
+
+
+class FrameSenderMixin:
+    """
+    Envoi au client de trames JSON déjà encodées (voir notification_frames.py).
+    
+    Les trames passent par une file sortante par connexion, vidée après
+    WEBSOCKET_FLUSH_WINDOW_MS: les notifications de même clé de fusion
+    (ex: modifications successives d'un même événement) n'y occupent qu'une
+    place, la plus récente. La file est bornée (WEBSOCKET_SEND_QUEUE_MAX):
+    au-delà, la trame la plus ancienne est abandonnée et comptée. Les clients
+    qui se connectent avec ?batch=1 reçoivent une trame 'batch' par fenêtre.
+    """
+    
+    flush_window = getattr(settings, 'WEBSOCKET_FLUSH_WINDOW_MS', 200) / 1000
+    send_queue_max = getattr(settings, 'WEBSOCKET_SEND_QUEUE_MAX', 100)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._file_sortante = OrderedDict()
+        self._sequence_file = itertools.count()
+        self._tache_envoi = None
+        self.trames_fusionnees = 0
+        self.trames_abandonnees = 0
+    
+    @cached_property
+    def batch_frames(self):
+        """Le client accepte les trames groupées (?batch=1 dans l'URL)"""
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        return query.get('batch', [''])[0].lower() in ('1', 'true')
+    
+    async def send_frame(self, frame, cle=None):
+        """Mettre une trame en file; `cle` fusionne les trames d'un même objet"""
+        if self.flush_window <= 0:
+            await self.send(text_data=frame)
+            return
+        
+        if cle is None:
+            cle = next(self._sequence_file)
+        elif cle in self._file_sortante:
+            self.trames_fusionnees += 1
+            metriques_websocket.incrementer('trames_fusionnees')
+        self._file_sortante[cle] = frame
+        
+        if len(self._file_sortante) > self.send_queue_max:
+            self._file_sortante.popitem(last=False)
+            self.trames_abandonnees += 1
+            metriques_websocket.incrementer('trames_abandonnees')
+        
+        if self._tache_envoi is None:
+            self._tache_envoi = asyncio.ensure_future(self._vider_file_apres_fenetre())
+    
+    async def _vider_file_apres_fenetre(self):
+        try:
+            while self._file_sortante:
+                await asyncio.sleep(self.flush_window)
+                frames = list(self._file_sortante.values())
+                self._file_sortante.clear()
+                await self._envoyer_frames(frames)
+        except Exception as e:
+            logger.error(f"Erreur envoi de la file sortante {self.channel_name}: {e}")
+        finally:
+            self._tache_envoi = None
+    
+    async def _envoyer_frames(self, frames):
+        metriques_websocket.incrementer('trames_envoyees', len(frames))
+        if self.batch_frames and len(frames) > 1:
+            # Les trames sont déjà encodées: assemblage sans re-sérialisation
+            await self.send(
+                text_data=f'{{"type":"batch","count":{len(frames)},"messages":[{",".join(frames)}]}}'
+            )
+        else:
+            for frame in frames:
+                await self.send(text_data=frame)
+        metriques_websocket.publier_periodiquement()
+    
+    async def websocket_disconnect(self, message):
+        if self._tache_envoi is not None:
+            self._tache_envoi.cancel()
+        self._file_sortante.clear()
+        await super().websocket_disconnect(message)
+    
+    @staticmethod
+    def get_frame(event, type_client, builder, *args):
+        """Trame pré-encodée du message, ou encodage local pour les anciens émetteurs"""
+        frames = event.get('frames')
+        if frames and type_client in frames:
+            return frames[type_client]
+        return event.get('frame') or builder(*args)
+
+
+class FrameCodecMixin:
+    """
+    Encodage des trames choisi à la poignée de main parmi les sous-protocoles
+    du client (voir frame_codecs.py): JSON texte, JSON compressé ou MessagePack.
+    Tous les envois texte du consumer passent par le codec de la connexion.
+    """
+    
+    @cached_property
+    def codec(self):
+        return negocier(self.scope.get('subprotocols'))
+    
+    async def accept(self, subprotocol=None, headers=None):
+        if subprotocol is None and self.codec.subprotocol in self.scope.get('subprotocols', ()):
+            subprotocol = self.codec.subprotocol
+        await super().accept(subprotocol, headers)
+    
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if text_data is not None and self.codec.binaire:
+            bytes_data = self.codec.encoder(text_data)
+            metriques_websocket.incrementer(f'octets_{self.codec.nom}', len(bytes_data))
+            text_data = None
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+    
+    async def websocket_receive(self, message):
+        if message.get('text') is None and message.get('bytes') is not None:
+            try:
+                message = {'type': message['type'], 'text': self.codec.decoder(message['bytes'])}
+            except Exception as e:
+                logger.warning(f"Trame binaire illisible ({self.codec.nom}) de {self.channel_name}: {e}")
+                return
+        await super().websocket_receive(message)
+
+
+class PresenceMixin:
+    """Suivi de présence (presence.py) des connexions acceptées et de leurs groupes"""
+    
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        user = self.scope.get('user')
+        presence.connecter(
+            self.channel_name,
+            user.id if getattr(user, 'is_authenticated', False) else None
+        )
+    
+    async def rejoindre_groupe(self, groupe):
+        await self.channel_layer.group_add(groupe, self.channel_name)
+        presence.rejoindre(self.channel_name, groupe)
+    
+    async def quitter_groupe(self, groupe):
+        await self.channel_layer.group_discard(groupe, self.channel_name)
+        presence.quitter(self.channel_name, groupe)
+    
+    async def websocket_disconnect(self, message):
+        presence.deconnecter(self.channel_name)
+        await super().websocket_disconnect(message)
+
+
+class ConnectionGuardMixin:
+    """
+    Admission et surveillance des connexions (voir connection_guard.py):
+    plafond par processus, taille maximale des messages reçus, activité
+    du client pour les battements de cœur et la fermeture des inactives.
+    Les consumers appellent pong_recu() à la réception d'un {"type": "pong"}.
+    """
+    
+    max_message_size = getattr(
+        settings, 'WEBSOCKET_MAX_MESSAGE_SIZE', ProductionWebSocketConfig.MAX_MESSAGE_SIZE
+    )
+    
+    async def websocket_connect(self, message):
+        if garde_connexions.admettre():
+            await super().websocket_connect(message)
+            return
+        # Acceptée puis fermée: le client reçoit le code 1013 et le délai de réessai
+        logger.warning(f"Connexion WebSocket refusée: {len(garde_connexions)} connexions actives")
+        await super().accept()
+        await self.send(text_data=json.dumps({
+            'type': 'server_busy',
+            'message': 'Serveur saturé, réessayez plus tard',
+            'retry_after': garde_connexions.delai_reessai()
+        }))
+        await self.close(code=CLOSE_CODE_TRY_AGAIN_LATER)
+    
+    async def accept(self, *args, **kwargs):
+        await super().accept(*args, **kwargs)
+        garde_connexions.enregistrer(self)
+    
+    async def websocket_receive(self, message):
+        garde_connexions.activite(self.channel_name)
+        donnees = message.get('text') if message.get('text') is not None else message.get('bytes')
+        if donnees is not None and len(donnees) > self.max_message_size:
+            logger.warning(f"Message trop grand ({len(donnees)}) refusé: {self.channel_name}")
+            metriques_websocket.incrementer('messages_trop_grands')
+            await self.close(code=CLOSE_CODE_MESSAGE_TOO_BIG)
+            return
+        await super().websocket_receive(message)
+    
+    def pong_recu(self):
+        """Réponse à un ping serveur: la connexion adopte la fermeture pour inactivité"""
+        garde_connexions.pong(self.channel_name)
+    
+    async def websocket_disconnect(self, message):
+        garde_connexions.retirer(self.channel_name)
+        await super().websocket_disconnect(message)
+
+
+class ResumeMixin:
+    """
+    Reprise après reconnexion (voir notification_journal.py): le client
+    indique le dernier 'seq' reçu (?resume_from=... dans l'URL, ou champ
+    resume_from des messages d'abonnement) et ne reçoit que les notifications
+    manquées, suivies d'une trame 'resume_complete'. Si le journal ne couvre
+    plus l'écart, il reçoit 'resync_required' et recharge ses listes.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._seqs_remis = OrderedDict()
+    
+    @cached_property
+    def resume_from(self):
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        return query.get('resume_from', [None])[0]
+    
+    def deja_remis(self, message):
+        """Vrai si cette notification numérotée a déjà été remise à la connexion"""
+        seq = message.get('seq')
+        if not seq:
+            return False
+        if seq in self._seqs_remis:
+            return True
+        self._seqs_remis[seq] = True
+        if len(self._seqs_remis) > RESUME_DEDUP_WINDOW:
+            self._seqs_remis.popitem(last=False)
+        return False
+    
+    async def dispatch(self, message):
+        if self.deja_remis(message):
+            return
+        await super().dispatch(message)
+    
+    async def rejouer(self, groupes, depuis):
+        """Rejouer les notifications manquées des groupes; False si un rechargement est nécessaire"""
+        messages, position, raison = await relire(groupes, depuis)
+        if raison:
+            logger.info(f"Reprise impossible pour {self.channel_name} ({raison})")
+            await self.send_frame(construire_frame(
+                'resync_required', reason=raison, resume_from=depuis, seq=position
+            ))
+            return False
+        
+        remis = 0
+        for message in messages:
+            if message.get('type') == LOCATION_TOPIC_MESSAGE_TYPE:
+                remis += await location_listener.remettre(self, message)
+            elif not self.deja_remis(message):
+                await super().dispatch(message)
+                remis += 1
+        metriques_websocket.incrementer('notifications_rejouees', remis)
+        await self.send_frame(construire_frame('resume_complete', count=remis, seq=position))
+        return True
+
+
+class SubscriptionFilterMixin:
+    """
+    Filtre d'abonnement de la connexion (set_filter / clear_filter, voir
+    subscription_filters.py), évalué sur les attributs des messages
+    d'événements: les événements écartés ne sont pas envoyés
+    """
+    
+    filtre = None
+    
+    def filtre_refuse(self, event):
+        if self.filtre is None or self.filtre.accepte(event.get('attributs')):
+            return False
+        metriques_websocket.incrementer('notifications_filtrees')
+        return True
+    
+    async def handle_filter(self, data):
+        """Enregistrer ou retirer le filtre; un filtre invalide laisse le précédent en place"""
+        if data.get('type') == 'clear_filter':
+            self.filtre = None
+            await self.send(text_data=json.dumps({'type': 'filter_cleared'}))
+            return
+        try:
+            self.filtre = FiltreAbonnement.depuis_message(data.get('filter'))
+        except ValueError as e:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': f'Filtre invalide: {e}'
+            }))
+            return
+        await self.send(text_data=json.dumps({
+            'type': 'filter_set',
+            'filter': self.filtre.definition
+        }))
+
+
+class EventSubscriptionMixin:
+    """
+    Suivi d'événements précis (subscribe_event / unsubscribe_event): groupes
+    event_<id> de la connexion, qui reçoit leurs modifications, annulation
+    et nouveaux avis
+    """
+    
+    async def handle_event_subscription(self, data, abonner):
+        """
+        Gérer l'abonnement aux groupes event_<id>: modifications, annulation
+        et nouveaux avis ne sont envoyés qu'aux abonnés de l'événement
+        """
+        event_ids = data.get('event_ids') or [data.get('event_id')]
+        try:
+            groupes = [
+                DynamicGroupManager.create_event_group(uuid.UUID(str(event_id)))
+                for event_id in event_ids
+            ]
+        except (TypeError, ValueError):
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': "Identifiant d'événement invalide"
+            }))
+            return
+        
+        if not hasattr(self, 'event_groups'):
+            self.event_groups = set()
+        if abonner and len(self.event_groups | set(groupes)) > MAX_EVENT_SUBSCRIPTIONS:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': f"Au plus {MAX_EVENT_SUBSCRIPTIONS} événements suivis par connexion"
+            }))
+            return
+        
+        for groupe in groupes:
+            if abonner and groupe not in self.event_groups:
+                await self.rejoindre_groupe(groupe)
+                self.event_groups.add(groupe)
+            elif not abonner and groupe in self.event_groups:
+                await self.quitter_groupe(groupe)
+                self.event_groups.discard(groupe)
+        
+        await self.send(text_data=json.dumps({
+            'type': 'subscription_confirmed' if abonner else 'unsubscription_confirmed',
+            'subscription_type': 'events',
+            'event_ids': [str(event_id) for event_id in event_ids]
+        }))
+        
+        if abonner and data.get('resume_from'):
+            await self.rejouer(groupes, data['resume_from'])
+    
+    async def event_updated_notification(self, event):
+        """Notification pour un événement modifié"""
+        logger.info("🔔 event_updated_notification APPELÉE")
+        frame = self.get_frame(
+            event, 'event_updated', frame_evenement, 'event_updated', event.get('event_data')
+        )
+        await self.send_frame(frame, event.get('coalesce_key'))
+    
+    async def event_cancelled_notification(self, event):
+        """Notification pour un événement annulé"""
+        logger.info("🔔 event_cancelled_notification APPELÉE")
+        frame = self.get_frame(
+            event, 'event_cancelled', frame_evenement, 'event_cancelled', event.get('event_data')
+        )
+        await self.send_frame(frame, event.get('coalesce_key'))
+    
+    async def event_review_notification(self, event):
+        """Nouvel avis sur un événement suivi (note et moyenne mise à jour)"""
+        await self.send_frame(event['frame'])
+    
+    async def quitter_groupes_evenements(self):
+        for groupe in getattr(self, 'event_groups', ()):
+            await self.quitter_groupe(groupe)
+
+
+class EventNotificationConsumer(
+    ConnectionGuardMixin, PresenceMixin, ResumeMixin, SubscriptionFilterMixin,
+    EventSubscriptionMixin, FrameSenderMixin, FrameCodecMixin, AsyncWebsocketConsumer
+):
     """Consumer principal pour les notifications d'événements"""
     
     async def connect(self):
         """Connexion WebSocket"""
         logger.info("🔌 NOUVELLE CONNEXION WEBSOCKET")
+        self.client_ip = ip_depuis_scope(self.scope)
+        autorise, _ = await limiteur_connexions_ws.autoriser_async(self.client_ip)
+        if not autorise:
+            logger.warning(f"Connexion WebSocket refusée (limite atteinte): {self.client_ip}")
+            await self.close()
+            return
+        
         # Groupe global pour tous les événements
         self.room_group_name = 'events_notifications'
         
         # Rejoindre le groupe
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.rejoindre_groupe(self.room_group_name)
         print(f"✅ Ajouté au groupe: {self.room_group_name}")
         print(f"✅ Channel layer: {self.channel_layer}")
         await self.accept()
@@ -31,29 +454,48 @@ class EventNotificationConsumer(AsyncWebsocketConsumer):
         # Log de connexion
         logger.info(f"Nouvelle connexion WebSocket: {self.channel_name}")
         
-        # Envoyer un message de bienvenue
+        # Envoyer un message de bienvenue (seq: point de reprise initial)
         await self.send(text_data=json.dumps({
             'type': 'connection_established',
             'message': 'Connexion WebSocket établie avec succès',
+            'seq': await position_courante(),
             'timestamp': timezone.now().isoformat()
         }))
         print("✅ Message de bienvenue envoyé")
+        
+        # Notifications manquées depuis la connexion précédente
+        if self.resume_from:
+            await self.rejouer([self.room_group_name], self.resume_from)
         print("=" * 80)
     
     async def disconnect(self, close_code):
         """Déconnexion WebSocket"""
         logger.info(f"🔌 DÉCONNEXION: {self.channel_name}, code: {close_code}")
-        # Quitter le groupe
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        if not hasattr(self, 'room_group_name'):
+            # Connexion refusée avant d'avoir rejoint un groupe
+            return
+        
+        # Quitter le groupe et ceux des événements suivis
+        await self.quitter_groupe(self.room_group_name)
+        await self.quitter_groupes_evenements()
+        
+        # Retirer l'abonnement géographique éventuel de l'index du processus
+        await location_listener.desabonner(self)
         
         logger.info(f"Déconnexion WebSocket: {self.channel_name}, code: {close_code}")
     
     async def receive(self, text_data):
         """Recevoir des messages du client"""
         logger.info(f"📩 MESSAGE REÇU: {text_data}")
+        autorise, attente = await limiteur_messages_ws.autoriser_async(self.client_ip)
+        if not autorise:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'Trop de messages, réessayez plus tard',
+                'retry_after': round(attente, 1)
+            }))
+            return
+        
         try:
             data = json.loads(text_data)
             message_type = data.get('type')
@@ -66,6 +508,10 @@ class EventNotificationConsumer(AsyncWebsocketConsumer):
                 }))
                 logger.info("📤 PONG ENVOYÉ")
             
+            elif message_type == 'pong':
+                # Réponse au ping serveur
+                self.pong_recu()
+            
             elif message_type == 'subscribe_location':
                 # S'abonner aux événements d'une zone géographique
                 await self.handle_location_subscription(data)
@@ -73,6 +519,14 @@ class EventNotificationConsumer(AsyncWebsocketConsumer):
             elif message_type == 'subscribe_category':
                 # S'abonner aux événements d'une catégorie
                 await self.handle_category_subscription(data)
+            
+            elif message_type in ('subscribe_event', 'unsubscribe_event'):
+                # Suivre les modifications d'événements (écran de détail, participation)
+                await self.handle_event_subscription(data, message_type == 'subscribe_event')
+            
+            elif message_type in ('set_filter', 'clear_filter'):
+                # Ne recevoir que les nouveaux événements qui correspondent au filtre
+                await self.handle_filter(data)
                 
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
@@ -87,18 +541,25 @@ class EventNotificationConsumer(AsyncWebsocketConsumer):
         radius = data.get('radius', 10)  # km par défaut
         
         if latitude and longitude:
+            try:
+                cercle = lire_cercle(latitude, longitude, radius)
+            except ValueError as e:
+                await self.send(text_data=json.dumps({
+                    'type': 'error',
+                    'message': f'Coordonnées invalides: {e}'
+                }))
+                return
+            
             # Stocker les préférences de localisation pour cette connexion
-            self.user_location = {
-                'latitude': float(latitude),
-                'longitude': float(longitude),
-                'radius': float(radius)
-            }
+            self.user_location = dict(zip(('latitude', 'longitude', 'radius'), cercle))
             
-            # Rejoindre un groupe spécifique à la zone
-            location_group = f"location_{int(latitude*100)}_{int(longitude*100)}"
-            await self.channel_layer.group_add(
-                location_group,
-                self.channel_name
+            # Enregistrer le cercle exact dans l'index spatial du processus
+            await location_listener.abonner(
+                self,
+                self.user_location['latitude'],
+                self.user_location['longitude'],
+                self.user_location['radius'],
+                'proximity_event_notification'
             )
             
             await self.send(text_data=json.dumps({
@@ -108,6 +569,11 @@ class EventNotificationConsumer(AsyncWebsocketConsumer):
                 'longitude': longitude,
                 'radius': radius
             }))
+            
+            if data.get('resume_from'):
+                await self.rejouer(
+                    location_listener.groupes_abonnement(self), data['resume_from']
+                )
     
     async def handle_category_subscription(self, data):
         """Gérer l'abonnement par catégorie"""
@@ -117,95 +583,54 @@ class EventNotificationConsumer(AsyncWebsocketConsumer):
             self.user_categories = categories
             
             # Rejoindre les groupes de catégories
+            category_groups = []
             for category in categories:
                 category_group = f"category_{category.lower().replace(' ', '_')}"
-                await self.channel_layer.group_add(
-                    category_group,
-                    self.channel_name
-                )
+                await self.rejoindre_groupe(category_group)
+                category_groups.append(category_group)
             
             await self.send(text_data=json.dumps({
                 'type': 'subscription_confirmed',
                 'subscription_type': 'categories',
                 'categories': categories
             }))
+            
+            if data.get('resume_from'):
+                await self.rejouer(category_groups, data['resume_from'])
     
     # Handlers pour les différents types de notifications
     async def new_event_notification(self, event):
         """Notification pour un nouvel événement"""
-        print("=" * 80)
-        print("🔔 new_event_notification APPELÉE !")
-        print(f"   Event data: {event}")
-        print("=" * 80)
-        
-        logger.info("🔔 new_event_notification APPELÉE !")
-        logger.info(f"   Event: {event}")
-        
-        # Préparer le message pour le client
-        message = {
-            'type': 'new_event',
-            'event': event['event_data'],
-            'message': f"Nouvel événement: {event['event_data']['nom']}",
-            'timestamp': timezone.now().isoformat()
-        }
-        
-        print(f"📤 Envoi au client Flutter: {message}")
-        logger.info(f"📤 Envoi au client Flutter")
-        
-        # Envoyer au client WebSocket
-        await self.send(text_data=json.dumps(message))
-        
-        print("✅ Message envoyé au client !")
-        print("=" * 80)
-        logger.info("✅ Message envoyé au client Flutter")
-    
-    async def event_updated_notification(self, event):
-        """Notification pour un événement modifié"""
-        print("🔔 event_updated_notification APPELÉE")
-        logger.info("🔔 event_updated_notification APPELÉE")
-        await self.send(text_data=json.dumps({
-            'type': 'event_updated',
-            'event': event['event_data'],
-            'message': f"Événement modifié: {event['event_data']['nom']}",
-            'timestamp': timezone.now().isoformat()
-        }))
-    
-    async def event_cancelled_notification(self, event):
-        """Notification pour un événement annulé"""
-        print("🔔 event_cancelled_notification APPELÉE")
-        logger.info("🔔 event_cancelled_notification APPELÉE")
-        await self.send(text_data=json.dumps({
-            'type': 'event_cancelled',
-            'event': event['event_data'],
-            'message': f"Événement annulé: {event['event_data']['nom']}",
-            'timestamp': timezone.now().isoformat()
-        }))
+        logger.info("🔔 new_event_notification APPELÉE")
+        if self.filtre_refuse(event):
+            return
+        frame = self.get_frame(
+            event, 'new_event', frame_evenement, 'new_event', event.get('event_data')
+        )
+        await self.send_frame(frame)
     
     async def new_place_notification(self, event):
         """Notification pour un nouveau lieu"""
-        print("🔔 new_place_notification APPELÉE")
         logger.info("🔔 new_place_notification APPELÉE")
-        await self.send(text_data=json.dumps({
-            'type': 'new_place',
-            'place': event['place_data'],
-            'message': f"Nouveau lieu: {event['place_data']['nom']}",
-            'timestamp': timezone.now().isoformat()
-        }))
+        frame = self.get_frame(event, 'new_place', frame_lieu, event.get('place_data'))
+        await self.send_frame(frame)
     
     async def proximity_event_notification(self, event):
-        """Notification pour un événement à proximité"""
-        print("🔔 proximity_event_notification APPELÉE")
+        """Notification pour un événement à proximité (distance propre à l'abonné)"""
         logger.info("🔔 proximity_event_notification APPELÉE")
-        await self.send(text_data=json.dumps({
-            'type': 'proximity_event',
-            'event': event['event_data'],
-            'distance': event.get('distance'),
-            'message': f"Événement à proximité: {event['event_data']['nom']}",
-            'timestamp': timezone.now().isoformat()
-        }))
+        if self.filtre_refuse(event):
+            return
+        frame = self.get_frame(
+            event, 'proximity_event', frame_evenement, 'proximity_event', event.get('event_data')
+        )
+        await self.send_frame(
+            ajouter_champ(frame, 'distance', event.get('distance')), event.get('coalesce_key')
+        )
 
 
-class PersonalNotificationConsumer(AsyncWebsocketConsumer):
+class PersonalNotificationConsumer(
+    ConnectionGuardMixin, PresenceMixin, FrameSenderMixin, FrameCodecMixin, AsyncWebsocketConsumer
+):
     """Consumer pour les notifications personnelles d'un utilisateur"""
     
     async def connect(self):
@@ -220,14 +645,11 @@ class PersonalNotificationConsumer(AsyncWebsocketConsumer):
         self.room_group_name = f'user_{user.id}'
         
         # Rejoindre le groupe personnel
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.rejoindre_groupe(self.room_group_name)
         
         await self.accept()
         
-        # Envoyer les notifications non lues
+        # Envoyer la première page des notifications non lues
         await self.send_unread_notifications()
         
         logger.info(f"Connexion personnelle pour utilisateur {user.username}")
@@ -235,30 +657,82 @@ class PersonalNotificationConsumer(AsyncWebsocketConsumer):
     async def disconnect(self, close_code):
         """Déconnexion WebSocket"""
         if hasattr(self, 'room_group_name'):
-            await self.channel_layer.group_discard(
-                self.room_group_name,
-                self.channel_name
-            )
+            await self.quitter_groupe(self.room_group_name)
     
-    @database_sync_to_async
-    def get_unread_notifications(self):
-        """Récupérer les notifications non lues"""
+    async def receive(self, text_data):
+        """Pages suivantes des notifications non lues et marquage comme lues"""
         try:
-            utilisateur = Utilisateur.objects.get(id=self.user.id)
-            notifications = utilisateur.notifications.filter(lue=False).order_by('-date_creation')
-            return [notif.to_dict() for notif in notifications]
-        except Utilisateur.DoesNotExist:
-            return []
-    
-    async def send_unread_notifications(self):
-        """Envoyer les notifications non lues"""
-        notifications = await self.get_unread_notifications()
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'Format JSON invalide'
+            }))
+            return
+        
+        message_type = data.get('type')
+        if message_type == 'pong':
+            # Réponse au ping serveur
+            self.pong_recu()
+        
+        elif message_type == 'get_unread_notifications':
+            await self.send_unread_notifications(data.get('cursor'))
         
-        if notifications:
+        elif message_type == 'mark_read':
+            if data.get('all'):
+                ids = None
+            else:
+                ids = data.get('ids', [])
+                # Même validation que la vue marquer_notifications_lues
+                if not isinstance(ids, list):
+                    await self.send(text_data=json.dumps({
+                        'type': 'error',
+                        'message': "Fournir 'ids' (liste) ou 'all': true"
+                    }))
+                    return
+                try:
+                    ids = [int(identifiant) for identifiant in ids]
+                except (TypeError, ValueError):
+                    await self.send(text_data=json.dumps({
+                        'type': 'error',
+                        'message': 'Identifiants invalides'
+                    }))
+                    return
+            count = await self.mark_notifications_read(ids)
             await self.send(text_data=json.dumps({
+                'type': 'notifications_marked_read',
+                'count': count
+            }))
+    
+    @database_sync_to_async
+    def get_unread_notifications(self, cursor=None):
+        """Nombre de notifications non lues et une page (index partiel notif_non_lues_idx)"""
+        notifications, next_cursor = page_non_lues(self.user.id, cursor)
+        return compter_non_lues(self.user.id), notifications, next_cursor
+    
+    @database_sync_to_async
+    def mark_notifications_read(self, ids):
+        return marquer_lues(self.user.id, ids)
+    
+    async def send_unread_notifications(self, cursor=None):
+        """Envoyer une page de notifications non lues (next_cursor: page suivante)"""
+        try:
+            if cursor is not None and not isinstance(cursor, str):
+                raise ValueError(cursor)
+            count, notifications, next_cursor = await self.get_unread_notifications(cursor)
+        except ValueError:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'Curseur invalide'
+            }))
+            return
+        
+        if notifications or cursor:
+            await self.send(text_data=encoder({
                 'type': 'unread_notifications',
-                'count': len(notifications),
-                'notifications': notifications
+                'count': count,
+                'notifications': notifications,
+                'next_cursor': next_cursor
             }))
     
     async def personal_notification(self, event):
@@ -271,20 +745,27 @@ class PersonalNotificationConsumer(AsyncWebsocketConsumer):
     
     async def event_reminder(self, event):
         """Rappel d'événement"""
-        await self.send(text_data=json.dumps({
-            'type': 'event_reminder',
-            'event': event['event_data'],
-            'reminder_time': event['reminder_time'],
-            'message': f"Rappel: {event['event_data']['nom']} dans {event['reminder_time']}",
-            'timestamp': timezone.now().isoformat()
-        }))
+        frame = self.get_frame(
+            event, 'event_reminder', frame_rappel,
+            event.get('event_data'), event.get('reminder_time')
+        )
+        await self.send_frame(frame)
 
 
-class LocationBasedConsumer(AsyncWebsocketConsumer):
-    """Consumer spécialisé pour les notifications basées sur la localisation"""
+class LocationBasedConsumer(
+    ConnectionGuardMixin, PresenceMixin, ResumeMixin, SubscriptionFilterMixin,
+    EventSubscriptionMixin, FrameSenderMixin, FrameCodecMixin, AsyncWebsocketConsumer
+):
+    """
+    Consumer spécialisé pour les notifications basées sur la localisation.
+    Les annulations et modifications des événements de current_events sont
+    publiées sur leurs groupes event_<id>: le client les suit par
+    subscribe_event (event_ids), comme sur /ws/events/.
+    """
     
     async def connect(self):
         """Connexion avec localisation"""
+        self.client_ip = ip_depuis_scope(self.scope)
         # Récupérer les paramètres de localisation depuis l'URL
         self.latitude = self.scope['url_route']['kwargs'].get('latitude')
         self.longitude = self.scope['url_route']['kwargs'].get('longitude')
@@ -294,59 +775,84 @@ class LocationBasedConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        # Créer le nom du groupe basé sur la zone géographique
-        lat_zone = int(float(self.latitude) * 100)
-        lng_zone = int(float(self.longitude) * 100)
-        self.room_group_name = f'location_{lat_zone}_{lng_zone}'
+        try:
+            latitude, longitude, radius = lire_cercle(self.latitude, self.longitude, self.radius)
+        except ValueError:
+            await self.close()
+            return
+        
+        await self.accept()
         
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
+        # Enregistrer le cercle exact dans l'index spatial du processus
+        await location_listener.abonner(
+            self, latitude, longitude, radius, 'location_event_notification'
         )
         
-        await self.accept()
+        # Reconnexion: seulement les événements manqués si le journal couvre l'écart
+        if self.resume_from and await self.rejouer(
+            location_listener.groupes_abonnement(self), self.resume_from
+        ):
+            return
         
         # Envoyer les événements actuels dans la zone
         await self.send_current_events_in_area()
     
     async def disconnect(self, close_code):
         """Déconnexion"""
-        if hasattr(self, 'room_group_name'):
-            await self.channel_layer.group_discard(
-                self.room_group_name,
-                self.channel_name
-            )
+        await location_listener.desabonner(self)
+        await self.quitter_groupes_evenements()
+    
+    async def receive(self, text_data):
+        """Suivi des événements de la zone, filtre d'abonnement et battements de cœur"""
+        autorise, attente = await limiteur_messages_ws.autoriser_async(self.client_ip)
+        if not autorise:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'Trop de messages, réessayez plus tard',
+                'retry_after': round(attente, 1)
+            }))
+            return
+        
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'Format JSON invalide'
+            }))
+            return
+        
+        message_type = data.get('type')
+        if message_type == 'ping':
+            await self.send(text_data=json.dumps({
+                'type': 'pong',
+                'timestamp': timezone.now().isoformat()
+            }))
+        
+        elif message_type == 'pong':
+            # Réponse au ping serveur
+            self.pong_recu()
+        
+        elif message_type in ('subscribe_event', 'unsubscribe_event'):
+            # Annulation et modifications des événements affichés (current_events)
+            await self.handle_event_subscription(data, message_type == 'subscribe_event')
+        
+        elif message_type in ('set_filter', 'clear_filter'):
+            await self.handle_filter(data)
     
     @database_sync_to_async
     def get_events_in_area(self):
-        """Récupérer les événements dans la zone"""
-        from .geolocation_services import GeolocationService
-        
-        geo_service = GeolocationService()
-        nearby_places = geo_service.find_nearby_places(
-            float(self.latitude), 
-            float(self.longitude), 
-            float(self.radius)
+        """Événements à venir de la zone, sérialisés (instantanés par cellule en cache)"""
+        return evenements_zone(
+            float(self.latitude), float(self.longitude), float(self.radius), filtre=self.filtre
         )
-        
-        lieu_ids = [item['lieu'].id for item in nearby_places]
-        evenements = Evenement.objects.filter(
-            lieu__id__in=lieu_ids,
-            date_debut__gt=timezone.now()
-        ).select_related('lieu', 'organisateur')[:10]
-        
-        return list(evenements)
     
     async def send_current_events_in_area(self):
-        """Envoyer les événements actuels dans la zone"""
-        evenements = await self.get_events_in_area()
+        """Envoyer les événements actuels dans la zone (seq: point de reprise de l'instantané)"""
+        position = await position_courante()
+        events_data = await self.get_events_in_area()
         
-        events_data = []
-        for event in evenements:
-            event_data = await self.serialize_event(event)
-            events_data.append(event_data)
-        
-        await self.send(text_data=json.dumps({
+        await self.send_frame(encoder({
             'type': 'current_events',
             'location': {
                 'latitude': float(self.latitude),
@@ -354,20 +860,192 @@ class LocationBasedConsumer(AsyncWebsocketConsumer):
                 'radius': float(self.radius)
             },
             'events': events_data,
-            'count': len(events_data)
+            'count': len(events_data),
+            'seq': position
         }))
     
-    @database_sync_to_async
-    def serialize_event(self, event):
-        """Sérialiser un événement de manière asynchrone"""
-        from .serializers import EvenementListSerializer
-        return EvenementListSerializer(event).data
-    
     async def location_event_notification(self, event):
-        """Notification d'événement dans la zone"""
+        """Notification d'événement dans la zone (distance propre à l'abonné)"""
+        if self.filtre_refuse(event):
+            return
+        frame = self.get_frame(
+            event, 'location_event', frame_localisation,
+            event.get('notification_type'), event.get('event_data')
+        )
+        await self.send_frame(
+            ajouter_champ(frame, 'distance', event.get('distance')), event.get('coalesce_key')
+        )
+
+
+class StreamConsumer(
+    EventNotificationConsumer, PersonalNotificationConsumer, LocationBasedConsumer
+):
+    """
+    Connexion unique multiplexée (/ws/stream/): le client s'abonne et se
+    désabonne par messages aux flux qui l'intéressent, au lieu d'ouvrir
+    /ws/events/, /ws/personal/ et /ws/location/ en parallèle.
+    
+        {"type": "subscribe", "topic": "global"}
+        {"type": "subscribe", "topic": "personal"}            (authentifié)
+        {"type": "subscribe", "topic": "location", "latitude": 6.13, "longitude": 1.22, "radius": 5}
+        {"type": "subscribe", "topic": "category", "category": "Concert"}
+        {"type": "subscribe", "topic": "event", "event_id": "<uuid>"}
+        {"type": "unsubscribe", "topic": ...}                 (mêmes champs)
+        {"type": "set_filter", "filter": {...}}               (voir subscription_filters.py)
+    
+    Un abonnement accepte aussi resume_from (voir ResumeMixin). Les handlers
+    de notification sont ceux des trois consumers spécialisés, hérités tels quels.
+    """
+    
+    max_subscriptions = MAX_STREAM_SUBSCRIPTIONS
+    
+    async def connect(self):
+        """Connexion multiplexée, sans abonnement initial"""
+        self.client_ip = ip_depuis_scope(self.scope)
+        autorise, _ = await limiteur_connexions_ws.autoriser_async(self.client_ip)
+        if not autorise:
+            logger.warning(f"Connexion WebSocket refusée (limite atteinte): {self.client_ip}")
+            await self.close()
+            return
+        
+        self.user = self.scope.get('user')
+        self.subscriptions = {}  # clé du sujet -> groupes rejoints
+        await self.accept()
+        
         await self.send(text_data=json.dumps({
-            'type': 'location_event',
-            'event': event['event_data'],
-            'distance': event.get('distance'),
+            'type': 'connection_established',
+            'message': 'Connexion WebSocket multiplexée établie',
+            'seq': await position_courante(),
             'timestamp': timezone.now().isoformat()
-        }))
\ No newline at end of file
+        }))
+        logger.info(f"Nouvelle connexion multiplexée: {self.channel_name}")
+    
+    async def disconnect(self, close_code):
+        """Quitter tous les groupes et l'index géographique"""
+        for groupes in getattr(self, 'subscriptions', {}).values():
+            for groupe in groupes:
+                await self.quitter_groupe(groupe)
+        await location_listener.desabonner(self)
+        logger.info(f"Déconnexion multiplexée: {self.channel_name}, code: {close_code}")
+    
+    async def receive(self, text_data):
+        """Abonnements, désabonnements, ping et messages du flux personnel"""
+        autorise, attente = await limiteur_messages_ws.autoriser_async(self.client_ip)
+        if not autorise:
+            await self.send_error('Trop de messages, réessayez plus tard', retry_after=round(attente, 1))
+            return
+        
+        try:
+            data = json.loads(text_data)
+        except json.JSONDecodeError:
+            await self.send_error('Format JSON invalide')
+            return
+        
+        message_type = data.get('type')
+        if message_type == 'subscribe':
+            await self.subscribe(data)
+        elif message_type == 'unsubscribe':
+            await self.unsubscribe(data)
+        elif message_type in ('set_filter', 'clear_filter'):
+            await self.handle_filter(data)
+        elif message_type == 'ping':
+            await self.send(text_data=json.dumps({
+                'type': 'pong',
+                'timestamp': timezone.now().isoformat()
+            }))
+        elif message_type == 'pong':
+            # Réponse au ping serveur (l'activité est déjà enregistrée)
+            self.pong_recu()
+        elif message_type in ('get_unread_notifications', 'mark_read'):
+            if 'personal' not in self.subscriptions:
+                await self.send_error("Abonnement 'personal' requis")
+                return
+            await PersonalNotificationConsumer.receive(self, text_data)
+        else:
+            await self.send_error(f'Type de message inconnu: {message_type}')
+    
+    async def send_error(self, message, **champs):
+        await self.send(text_data=json.dumps({'type': 'error', 'message': message, **champs}))
+    
+    def topic_groups(self, data):
+        """(clé, groupes) du sujet d'un message d'abonnement; ValueError si invalide"""
+        topic = data.get('topic')
+        if topic == 'global':
+            return 'global', ['events_notifications']
+        if topic == 'personal':
+            if not getattr(self.user, 'is_authenticated', False):
+                raise ValueError('Authentification requise pour le flux personnel')
+            return 'personal', [f'user_{self.user.id}']
+        if topic == 'category':
+            category = str(data.get('category') or '').strip()
+            if not category:
+                raise ValueError('Catégorie manquante')
+            groupe = f"category_{category.lower().replace(' ', '_')}"
+            return f'category:{groupe}', [groupe]
+        if topic == 'event':
+            groupe = DynamicGroupManager.create_event_group(uuid.UUID(str(data.get('event_id'))))
+            return f'event:{groupe}', [groupe]
+        if topic == 'location':
+            # Cellules rejointes par le canal du processus (subscriber_index.py)
+            return 'location', []
+        raise ValueError(f'Sujet inconnu: {topic}')
+    
+    async def subscribe(self, data):
+        try:
+            cle, groupes = self.topic_groups(data)
+            if cle not in self.subscriptions and len(self.subscriptions) >= self.max_subscriptions:
+                raise ValueError("Nombre maximal d'abonnements atteint")
+            if cle == 'location':
+                self.latitude, self.longitude, self.radius = lire_cercle(
+                    data['latitude'], data['longitude'], data.get('radius', 10)
+                )
+        except (KeyError, TypeError, ValueError) as e:
+            await self.send_error(f'Abonnement invalide: {e}')
+            return
+        
+        if cle == 'location':
+            await location_listener.abonner(
+                self, self.latitude, self.longitude, self.radius, 'location_event_notification'
+            )
+            groupes_reprise = location_listener.groupes_abonnement(self)
+        else:
+            for groupe in groupes:
+                await self.rejoindre_groupe(groupe)
+            groupes_reprise = groupes
+        self.subscriptions[cle] = groupes
+        
+        await self.send(text_data=json.dumps({
+            'type': 'subscribed',
+            'topic': data.get('topic'),
+            'key': cle
+        }))
+        
+        # Contenu initial du flux, ou seulement l'écart si le client reprend
+        if data.get('resume_from') and await self.rejouer(groupes_reprise, data['resume_from']):
+            return
+        if cle == 'personal':
+            await self.send_unread_notifications()
+        elif cle == 'location':
+            await self.send_current_events_in_area()
+    
+    async def unsubscribe(self, data):
+        try:
+            cle, _ = self.topic_groups(data)
+        except (TypeError, ValueError) as e:
+            await self.send_error(f'Désabonnement invalide: {e}')
+            return
+        
+        groupes = self.subscriptions.pop(cle, None)
+        if groupes is None:
+            await self.send_error(f'Aucun abonnement {cle}')
+            return
+        for groupe in groupes:
+            await self.quitter_groupe(groupe)
+        if cle == 'location':
+            await location_listener.desabonner(self)
+        
+        await self.send(text_data=json.dumps({
+            'type': 'unsubscribed',
+            'topic': data.get('topic'),
+            'key': cle
+        }))
@@ -0,0 +1,142 @@
+"""
+Rappels d'événements planifiés à leur heure d'envoi
+Fichier: event_reminders.py
+
+À la création d'un événement, ou quand sa date de début change, un rappel
+par avance (24 h, 1 h) est inscrit dans RappelPlanifie à l'heure exacte où
+il doit partir. Le worker (`python manage.py envoyer_rappels`, service
+worker de render.yaml) prend les rappels dus par lots (index partiel
+rappel_a_envoyer_idx, skip_locked) et, dans une même transaction, les marque
+comme envoyés et met leurs notifications en file dans l'outbox
+(notification_outbox.py): un rappel part une seule fois, quel que soit le
+nombre de workers ou de passages.
+
+Les lignes traitées restent comme registre: la contrainte rappel_unique
+(événement, avance, date de début) empêche de replanifier un rappel déjà
+parti. Un rappel en retard de plus de RAPPEL_RETARD_MAX est marqué expiré
+au lieu d'être envoyé. Supprimer un événement supprime ses rappels.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from .metrics import RegistreMetriques
+from .notification_outbox import enregistrer_notifications
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (minutes avant le début, libellé envoyé aux clients)
+RAPPELS_AVANCES = (
+    (24 * 60, '24 heures'),
+    (60, '1 heure'),
+)
+
+RAPPEL_RETARD_MAX = timedelta(minutes=30)
+RAPPELS_BATCH_SIZE = 200
+
+metriques_rappels = RegistreMetriques('rappels_evenements')
+
+
+def planifier_rappels(evenement):
+    """(Re)planifier les rappels d'un événement d'après sa date de début actuelle"""
+    from .models import RappelPlanifie
+
+    date_debut = evenement.date_debut
+    maintenant = timezone.now()
+
+    # Rappels en attente d'une ancienne date de début
+    RappelPlanifie.objects.filter(
+        evenement=evenement, statut=RappelPlanifie.STATUT_PLANIFIE
+    ).exclude(date_debut_evenement=date_debut).delete()
+
+    rappels = [
+        RappelPlanifie(
+            evenement=evenement,
+            avance=avance,
+            date_debut_evenement=date_debut,
+            date_envoi=date_debut - timedelta(minutes=avance)
+        )
+        for avance, _ in RAPPELS_AVANCES
+        if date_debut - timedelta(minutes=avance) + RAPPEL_RETARD_MAX > maintenant
+    ]
+    # Déjà planifiés ou envoyés pour cette date: écartés par la contrainte rappel_unique
+    RappelPlanifie.objects.bulk_create(rappels, ignore_conflicts=True)
+
+
+def planifier_rappels_a_venir():
+    """Planifier les rappels de tous les événements à venir (mise en service, reprise)"""
+    from .models import Evenement
+
+    evenements = Evenement.objects.filter(date_debut__gt=timezone.now())
+    nombre = 0
+    for evenement in evenements.iterator():
+        planifier_rappels(evenement)
+        nombre += 1
+    return nombre
+
+
+def envoyer_rappels_dus(batch_size=RAPPELS_BATCH_SIZE):
+    """Traiter un lot de rappels dus; retourne le nombre de rappels traités"""
+    from .models import RappelPlanifie
+    from .websocket_utils import EventReminderService
+
+    maintenant = timezone.now()
+    libelles = dict(RAPPELS_AVANCES)
+
+    with transaction.atomic():
+        # skip_locked: plusieurs workers peuvent tourner sans se bloquer
+        lot = list(
+            RappelPlanifie.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(statut=RappelPlanifie.STATUT_PLANIFIE, date_envoi__lte=maintenant)
+            .select_related('evenement__lieu', 'evenement__organisateur')
+            .order_by('date_envoi', 'id')[:batch_size]
+        )
+        if not lot:
+            return 0
+        prefetch_related_objects([rappel.evenement for rappel in lot], 'avis')
+
+        envoyes, expires, envois = [], [], []
+        for rappel in lot:
+            evenement = rappel.evenement
+            if (evenement.date_debut != rappel.date_debut_evenement
+                    or maintenant - rappel.date_envoi > RAPPEL_RETARD_MAX):
+                expires.append(rappel.id)
+                continue
+            envois.extend(EventReminderService.reminder_envois(
+                evenement, libelles.get(rappel.avance, f'{rappel.avance} minutes')
+            ))
+            envoyes.append(rappel.id)
+
+        # Registre et outbox dans la même transaction: envoi unique
+        enregistrer_notifications(envois)
+        RappelPlanifie.objects.filter(id__in=envoyes).update(
+            statut=RappelPlanifie.STATUT_ENVOYE, date_traitement=maintenant
+        )
+        RappelPlanifie.objects.filter(id__in=expires).update(
+            statut=RappelPlanifie.STATUT_EXPIRE, date_traitement=maintenant
+        )
+
+    if expires:
+        logger.warning(f"{len(expires)} rappel(s) expiré(s) sans envoi")
+    metriques_rappels.incrementer('envoyes', len(envoyes))
+    metriques_rappels.incrementer('expires', len(expires))
+    for rappel in lot:
+        if rappel.id in envoyes:
+            metriques_rappels.observer(
+                'retard_s', (maintenant - rappel.date_envoi).total_seconds()
+            )
+    return len(lot)
+
+
+def envoyer_rappels(batch_size=RAPPELS_BATCH_SIZE):
+    """Traiter tous les rappels dus; retourne le nombre de rappels traités"""
+    total = 0
+    while True:
+        traites = envoyer_rappels_dus(batch_size)
+        total += traites
+        if traites < batch_size:
+            return total
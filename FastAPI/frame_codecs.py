@@ -0,0 +1,109 @@
+"""
+Encodage des trames WebSocket négocié à la poignée de main (sous-protocoles)
+Fichier: frame_codecs.py
+
+Le client annonce les sous-protocoles qu'il comprend (Sec-WebSocket-Protocol,
+par ordre de préférence); le serveur retient le premier pris en charge:
+    lome.msgpack       trames binaires MessagePack
+    lome.json.deflate  trames binaires JSON compressé (deflate brut, contexte
+                       conservé d'un message à l'autre comme permessage-deflate)
+    lome.json          trames texte JSON (défaut, aussi sans sous-protocole)
+
+Daphne ne négocie pas l'extension permessage-deflate: la compression est
+portée par le sous-protocole lome.json.deflate. Comme dans la RFC 7692, le
+suffixe 00 00 ff ff de chaque bloc vidé est retiré à l'envoi: le client le
+rajoute avant de décompresser avec un inflater (raw, fenêtre 15) conservé
+pendant toute la connexion.
+
+Les trames restent produites en JSON une seule fois (notification_frames.py);
+la conversion MessagePack est mémorisée par trame dans le processus, si bien
+qu'une diffusion n'est convertie qu'une fois quel que soit le nombre de
+destinataires locaux.
+"""
+
+import json
+import zlib
+from functools import lru_cache
+
+import msgpack
+
+# Fenêtre de 4 Ko et mémoire réduite: ~32 Ko par connexion au lieu de ~256 Ko
+DEFLATE_LEVEL = 6
+DEFLATE_WBITS = 12
+DEFLATE_MEMLEVEL = 5
+
+# Trames converties en MessagePack mémorisées par processus
+MSGPACK_CACHE_SIZE = 256
+
+# Suffixe d'un bloc deflate vidé par Z_SYNC_FLUSH (RFC 7692, section 7.2.1)
+DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+
+@lru_cache(maxsize=MSGPACK_CACHE_SIZE)
+def _msgpack_depuis_json(frame):
+    return msgpack.packb(json.loads(frame), use_bin_type=True)
+
+
+class JsonCodec:
+    """Trames texte JSON, transmises telles quelles"""
+
+    subprotocol = 'lome.json'
+    nom = 'json'
+    binaire = False
+
+    def encoder(self, frame):
+        return frame
+
+    def decoder(self, donnees):
+        return donnees.decode('utf-8')
+
+
+class DeflateJsonCodec(JsonCodec):
+    """JSON compressé avec un contexte deflate propre à la connexion"""
+
+    subprotocol = 'lome.json.deflate'
+    nom = 'deflate'
+    binaire = True
+
+    def __init__(self):
+        self._compresseur = zlib.compressobj(
+            DEFLATE_LEVEL, zlib.DEFLATED, -DEFLATE_WBITS, DEFLATE_MEMLEVEL
+        )
+        self._decompresseur = None
+
+    def encoder(self, frame):
+        donnees = self._compresseur.compress(frame.encode('utf-8'))
+        donnees += self._compresseur.flush(zlib.Z_SYNC_FLUSH)
+        return donnees[:-len(DEFLATE_TAIL)]
+
+    def decoder(self, donnees):
+        # Messages du client compressés de la même façon (contexte conservé)
+        if self._decompresseur is None:
+            self._decompresseur = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decompresseur.decompress(donnees + DEFLATE_TAIL).decode('utf-8')
+
+
+class MsgpackCodec(JsonCodec):
+    """Trames binaires MessagePack (mêmes objets que les trames JSON)"""
+
+    subprotocol = 'lome.msgpack'
+    nom = 'msgpack'
+    binaire = True
+
+    def encoder(self, frame):
+        return _msgpack_depuis_json(frame)
+
+    def decoder(self, donnees):
+        return json.dumps(msgpack.unpackb(donnees, raw=False))
+
+
+CODECS = {codec.subprotocol: codec for codec in (MsgpackCodec, DeflateJsonCodec, JsonCodec)}
+
+
+def negocier(subprotocols):
+    """Codec du premier sous-protocole du client pris en charge (JSON texte sinon)"""
+    for subprotocol in subprotocols or ():
+        codec = CODECS.get(subprotocol)
+        if codec is not None:
+            return codec()
+    return JsonCodec()
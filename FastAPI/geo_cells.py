@@ -0,0 +1,97 @@
+"""
+Cellules géographiques hiérarchiques pour le routage des groupes de localisation
+Fichier: geo_cells.py
+
+Chaque niveau découpe le globe en cellules carrées (en degrés), 4 fois plus
+grandes que celles du niveau précédent. Un abonnement de rayon R rejoint au
+plus 2x2 cellules du plus petit niveau dont la cellule couvre son cercle;
+un événement est publié dans la cellule de son lieu à chaque niveau, soit
+len(CELL_LEVELS) envois quel que soit le rayon des abonnés.
+"""
+
+import math
+
+# Taille des cellules par niveau (degrés): ~1 km, 4 km, 18 km, 71 km, 284 km, 1137 km
+CELL_LEVELS = (0.01, 0.04, 0.16, 0.64, 2.56, 10.24)
+
+CELL_GROUP_PREFIX = 'geo'
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Distance orthodromique (haversine) en kilomètres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Rectangle (lat_min, lat_max, lng_min, lng_max) contenant le cercle"""
+    delta_lat = radius_km / 111.0
+    cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+    delta_lng = radius_km / (111.0 * cos_lat)
+    return (
+        latitude - delta_lat, latitude + delta_lat,
+        longitude - delta_lng, longitude + delta_lng,
+    )
+
+
+def cell_group(level, i, j):
+    """Nom du groupe channel layer d'une cellule (caractères autorisés: a-z, 0-9, _, -, .)"""
+    return f'{CELL_GROUP_PREFIX}_{level}_{i}_{j}'
+
+
+def cell_index(latitude, longitude, level):
+    taille = CELL_LEVELS[level]
+    return math.floor(latitude / taille), math.floor(longitude / taille)
+
+
+def cell_group_for_point(latitude, longitude, level=0):
+    """Groupe de la cellule contenant le point au niveau donné"""
+    i, j = cell_index(latitude, longitude, level)
+    return cell_group(level, i, j)
+
+
+def publish_groups(latitude, longitude):
+    """Groupes auxquels publier un événement: sa cellule à chaque niveau"""
+    return [
+        cell_group_for_point(latitude, longitude, level)
+        for level in range(len(CELL_LEVELS))
+    ]
+
+
+def covering_level(latitude, longitude, radius_km):
+    """Plus petit niveau dont une cellule est au moins aussi large que le cercle"""
+    lat_min, lat_max, lng_min, lng_max = bounding_box(latitude, longitude, radius_km)
+    etendue = max(lat_max - lat_min, lng_max - lng_min)
+    for level, taille in enumerate(CELL_LEVELS):
+        if taille >= etendue:
+            return level
+    return len(CELL_LEVELS) - 1
+
+
+def cell_bounds(level, i, j):
+    """Rectangle (lat_min, lat_max, lng_min, lng_max) d'une cellule"""
+    taille = CELL_LEVELS[level]
+    return i * taille, (i + 1) * taille, j * taille, (j + 1) * taille
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Cellules (niveau, i, j) couvrant le cercle: au plus 2x2 sauf rayon extrême"""
+    level = covering_level(latitude, longitude, radius_km)
+    lat_min, lat_max, lng_min, lng_max = bounding_box(latitude, longitude, radius_km)
+    i_min, j_min = cell_index(lat_min, lng_min, level)
+    i_max, j_max = cell_index(lat_max, lng_max, level)
+    return [
+        (level, i, j)
+        for i in range(i_min, i_max + 1)
+        for j in range(j_min, j_max + 1)
+    ]
+
+
+def covering_groups(latitude, longitude, radius_km):
+    """Ensemble minimal de cellules (au plus 2x2 sauf rayon extrême) couvrant le cercle"""
+    return [cell_group(*cellule) for cellule in covering_cells(latitude, longitude, radius_km)]
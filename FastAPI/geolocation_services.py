@@ -3,12 +3,18 @@ from geopy.geocoders import Nominatim, GoogleV3
 from geopy.distance import geodesic
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 from django.conf import settings
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from .cache_utils import cache_aside
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Durées de cache des fournisseurs externes
+GEOCODE_CACHE_TIMEOUT = 60 * 60 * 24
+IP_LOCATION_CACHE_TIMEOUT = 60 * 60
+# Durée pendant laquelle une réponse expirée reste servie pendant son recalcul
+PROVIDER_STALE_TIMEOUT = 60 * 60
+
 
 class GeolocationService:
     """Service principal de géolocalisation"""
@@ -25,10 +31,15 @@ class GeolocationService:
         Convertir une adresse en coordonnées GPS
         """
         cache_key = f"geocode_{address.lower().replace(' ', '_')}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            return cached_result
-        
+        return cache_aside(
+            cache_key,
+            lambda: self._geocode_address(address, prefer_lome),
+            GEOCODE_CACHE_TIMEOUT,
+            stale_timeout=PROVIDER_STALE_TIMEOUT
+        )
+    
+    def _geocode_address(self, address, prefer_lome):
+        """Appel des fournisseurs de géocodage (sans cache)"""
         try:
             # Ajouter "Lomé, Togo" pour améliorer la précision
             if prefer_lome and "lomé" not in address.lower() and "lome" not in address.lower():
@@ -44,28 +55,23 @@ class GeolocationService:
             )
             
             if location:
-                result = {
+                return {
                     'latitude': location.latitude,
                     'longitude': location.longitude,
                     'address': location.address,
                     'provider': 'nominatim'
                 }
-                # Cache pour 24h
-                cache.set(cache_key, result, 60 * 60 * 24)
-                return result
             
             # Fallback sur Google Maps si disponible
             if self.google_geocoder:
                 location = self.google_geocoder.geocode(search_address, timeout=10)
                 if location:
-                    result = {
+                    return {
                         'latitude': location.latitude,
                         'longitude': location.longitude,
                         'address': location.address,
                         'provider': 'google'
                     }
-                    cache.set(cache_key, result, 60 * 60 * 24)
-                    return result
             
             return None
             
@@ -78,10 +84,15 @@ class GeolocationService:
         Convertir des coordonnées GPS en adresse
         """
         cache_key = f"reverse_{latitude}_{longitude}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            return cached_result
-        
+        return cache_aside(
+            cache_key,
+            lambda: self._reverse_geocode(latitude, longitude),
+            GEOCODE_CACHE_TIMEOUT,
+            stale_timeout=PROVIDER_STALE_TIMEOUT
+        )
+    
+    def _reverse_geocode(self, latitude, longitude):
+        """Appel du fournisseur de géocodage inverse (sans cache)"""
         try:
             location = self.nominatim.reverse(
                 f"{latitude}, {longitude}",
@@ -90,15 +101,12 @@ class GeolocationService:
             )
             
             if location:
-                result = {
+                return {
                     'address': location.address,
                     'latitude': latitude,
                     'longitude': longitude,
                     'provider': 'nominatim'
                 }
-                # Cache pour 24h
-                cache.set(cache_key, result, 60 * 60 * 24)
-                return result
             
             return None
             
@@ -182,10 +190,16 @@ class IPGeolocationService:
         Obtenir la localisation approximative à partir d'une IP
         """
         cache_key = f"ip_location_{ip_address}"
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            return cached_result
-        
+        return cache_aside(
+            cache_key,
+            lambda: IPGeolocationService._get_location_from_ip(ip_address),
+            IP_LOCATION_CACHE_TIMEOUT,
+            stale_timeout=PROVIDER_STALE_TIMEOUT
+        )
+    
+    @staticmethod
+    def _get_location_from_ip(ip_address):
+        """Appel des services de géolocalisation IP (sans cache)"""
         try:
             # Service gratuit ipapi.co
             response = requests.get(
@@ -200,7 +214,7 @@ class IPGeolocationService:
                     logger.warning(f"Erreur API IP: {data.get('reason')}")
                     return None
                 
-                result = {
+                return {
                     'latitude': data.get('latitude'),
                     'longitude': data.get('longitude'),
                     'city': data.get('city'),
@@ -208,10 +222,6 @@ class IPGeolocationService:
                     'region': data.get('region'),
                     'provider': 'ipapi'
                 }
-                
-                # Cache pour 1h
-                cache.set(cache_key, result, 60 * 60)
-                return result
             
         except requests.RequestException as e:
             logger.error(f"Erreur requête géolocalisation IP: {e}")
@@ -227,7 +237,7 @@ class IPGeolocationService:
                 data = response.json()
                 
                 if data.get('status') == 'success':
-                    result = {
+                    return {
                         'latitude': data.get('lat'),
                         'longitude': data.get('lon'),
                         'city': data.get('city'),
@@ -236,9 +246,6 @@ class IPGeolocationService:
                         'provider': 'ip-api'
                     }
                     
-                    cache.set(cache_key, result, 60 * 60)
-                    return result
-                    
         except requests.RequestException as e:
             logger.error(f"Erreur service fallback géolocalisation IP: {e}")
         
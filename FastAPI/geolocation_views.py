@@ -1,4 +1,4 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
@@ -9,10 +9,13 @@ from .geolocation_services import (
 )
 from .models import Lieu, Evenement
 from .serializers import LieuListSerializer, EvenementListSerializer
+from .cache_utils import cached_api_response
+from .rate_limit import GeoProviderThrottle
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes([GeoProviderThrottle])
 def detect_user_location(request):
     """
     Détecter automatiquement la localisation de l'utilisateur
@@ -56,6 +59,7 @@ def detect_user_location(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([GeoProviderThrottle])
 def geocode_address(request):
     """
     Convertir une adresse en coordonnées GPS
@@ -92,6 +96,7 @@ def geocode_address(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([GeoProviderThrottle])
 def reverse_geocode(request):
     """
     Convertir des coordonnées GPS en adresse
@@ -249,6 +254,7 @@ def evenements_proximite(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes([GeoProviderThrottle])
 def suggestions_adresses(request):
     """
     Suggestions d'adresses pour l'autocomplétion
@@ -394,6 +400,7 @@ def validate_lome_location(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes([GeoProviderThrottle])
 def ip_location(request):
     """
     Obtenir la localisation à partir de l'IP du client
@@ -431,6 +438,7 @@ def ip_location(request):
 # Vue pour générer une carte des événements
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cached_api_response('map_data')
 def map_data(request):
     """
     Données pour générer une carte des lieux et événements
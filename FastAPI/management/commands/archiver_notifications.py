@@ -0,0 +1,52 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from FastAPI.user_notifications import ARCHIVE_BATCH_SIZE, archiver_notifications
+
+
+class Command(BaseCommand):
+    """
+    Archivage des notifications personnelles lues anciennes
+    Usage:
+        python manage.py archiver_notifications                       # lues depuis plus de 90 jours (cron)
+        python manage.py archiver_notifications --jours 30 --export notifications.jsonl
+    """
+    help = 'Supprime par lots les notifications lues anciennes (export JSON Lines optionnel)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jours',
+            type=int,
+            default=90,
+            help='Archiver les notifications lues depuis plus de N jours'
+        )
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument(
+            '--export',
+            help='Fichier JSON Lines où ajouter les notifications avant suppression'
+        )
+
+    def handle(self, *args, **options):
+        avant = timezone.now() - timedelta(days=options['jours'])
+        fichier = open(options['export'], 'a', encoding='utf-8') if options['export'] else None
+
+        def exporter(lignes):
+            for ligne in lignes:
+                fichier.write(json.dumps(ligne, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+            fichier.flush()
+
+        try:
+            total = archiver_notifications(
+                avant, options['batch_size'], exporter if fichier else None
+            )
+        finally:
+            if fichier:
+                fichier.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} notification(s) lue(s) avant le {avant:%d/%m/%Y} archivée(s)'
+        ))
@@ -0,0 +1,90 @@
+import json
+import time
+import zlib
+
+import msgpack
+from django.core.management.base import BaseCommand
+
+from FastAPI.frame_codecs import (
+    DEFLATE_TAIL, DeflateJsonCodec, JsonCodec, MsgpackCodec, _msgpack_depuis_json
+)
+from FastAPI.management.commands.bench_notifications import _event_data_exemple
+from FastAPI.notification_frames import ajouter_champ, frame_evenement, frame_localisation
+
+
+def _frames_exemple(nombre):
+    """Flux réaliste: nouveaux événements, modifications et événements localisés"""
+    frames = []
+    for i in range(nombre):
+        event_data = _event_data_exemple()
+        event_data['nom'] = f"{event_data['nom']} #{i}"
+        if i % 3 == 0:
+            frame = frame_evenement('new_event', event_data)
+        elif i % 3 == 1:
+            frame = frame_evenement('event_updated', event_data)
+        else:
+            frame = ajouter_champ(frame_localisation('new_event', event_data), 'distance', 1.25)
+        frames.append(ajouter_champ(frame, 'seq', f'1760000000000-{i}'))
+    return frames
+
+
+class Command(BaseCommand):
+    """
+    Octets sur le réseau et temps d'encodage par message pour chaque sous-protocole
+    Usage:
+        python manage.py bench_frame_codecs --messages 1000
+    """
+    help = 'Compare les encodages de trames WebSocket (JSON, JSON deflate, MessagePack)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=500)
+
+    def handle(self, *args, **options):
+        frames = _frames_exemple(options['messages'])
+        self.stdout.write(
+            f"{len(frames)} messages, JSON moyen: "
+            f"{sum(len(frame.encode('utf-8')) for frame in frames) / len(frames):.0f} octets"
+        )
+
+        for nom, codec_factory, cache_chaud in (
+            ('lome.json', JsonCodec, False),
+            ('lome.json.deflate', DeflateJsonCodec, False),
+            ('lome.msgpack (1er destinataire)', MsgpackCodec, False),
+            ('lome.msgpack (destinataires suivants)', MsgpackCodec, True),
+        ):
+            octets, octets_json, micro_secondes = self._mesurer(codec_factory(), frames, cache_chaud)
+            self.stdout.write(
+                f'{nom:<40} {octets:8.0f} octets/msg ({octets / octets_json:6.1%} du JSON)   '
+                f'{micro_secondes:7.2f} µs/msg'
+            )
+
+    def _mesurer(self, codec, frames, cache_chaud):
+        """(octets moyens, octets JSON moyens, µs d'encodage) par message"""
+        _msgpack_depuis_json.cache_clear()
+        if cache_chaud:
+            # Diffusion: la trame a déjà été convertie pour un autre destinataire du processus
+            frames = frames[-_msgpack_depuis_json.cache_info().maxsize:]
+            for frame in frames:
+                codec.encoder(frame)
+
+        debut = time.process_time()
+        encodees = [codec.encoder(frame) for frame in frames]
+        duree = time.process_time() - debut
+
+        self._verifier(codec, frames, encodees)
+        octets = sum(len(donnees if codec.binaire else donnees.encode('utf-8')) for donnees in encodees)
+        octets_json = sum(len(frame.encode('utf-8')) for frame in frames)
+        return octets / len(frames), octets_json / len(frames), duree / len(frames) * 1e6
+
+    @staticmethod
+    def _verifier(codec, frames, encodees):
+        """Décodage côté client: chaque message doit redonner le même objet"""
+        inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        for frame, donnees in zip(frames, encodees):
+            if isinstance(codec, DeflateJsonCodec):
+                decode = json.loads(inflater.decompress(donnees + DEFLATE_TAIL))
+            elif isinstance(codec, MsgpackCodec):
+                decode = msgpack.unpackb(donnees, raw=False)
+            else:
+                decode = json.loads(donnees)
+            assert decode == json.loads(frame), f'Décodage incorrect ({codec.nom})'
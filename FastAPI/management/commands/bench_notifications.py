@@ -0,0 +1,94 @@
+import asyncio
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from FastAPI.consumers import EventNotificationConsumer, LocationBasedConsumer
+from FastAPI.notification_frames import frame_evenement, frames_localisation
+
+
+def _event_data_exemple():
+    """Données au format EvenementListSerializer (UUID et Decimal compris)"""
+    maintenant = timezone.now()
+    return {
+        'id': str(uuid.uuid4()),
+        'nom': 'Concert de jazz au bord de la lagune',
+        'description': 'Soirée musicale en plein air avec plusieurs groupes locaux. ' * 4,
+        'date_debut': maintenant.isoformat(),
+        'date_fin': maintenant.isoformat(),
+        'lieu': uuid.uuid4(),
+        'lieu_nom': 'Esplanade du Palais',
+        'lieu_latitude': Decimal('6.1319000'),
+        'lieu_longitude': Decimal('1.2228000'),
+        'organisateur_id': str(uuid.uuid4()),
+        'organisateur_nom': 'organisateur',
+        'moyenne_avis': 4.5,
+        'nombre_avis': 12,
+    }
+
+
+class Command(BaseCommand):
+    """
+    Mesure du coût CPU par destinataire des handlers de notification
+    Usage:
+        python manage.py bench_notifications --recipients 5000
+    """
+    help = 'Compare le coût CPU par destinataire: encodage par client vs trame pré-encodée'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        destinataires = options['recipients']
+        event_data = _event_data_exemple()
+
+        resultats = asyncio.run(self._mesurer(destinataires, event_data))
+
+        for nom, (avant, apres) in resultats.items():
+            self.stdout.write(
+                f'{nom:<30} avant: {avant:8.2f} µs/dest.   '
+                f'après: {apres:8.2f} µs/dest.   gain: x{avant / apres:.1f}'
+            )
+
+    async def _mesurer(self, destinataires, event_data):
+        envoyes = []
+
+        async def send(text_data=None, bytes_data=None, close=False):
+            envoyes.append(text_data)
+
+        global_consumer = EventNotificationConsumer()
+        global_consumer.send = send
+        location_consumer = LocationBasedConsumer()
+        location_consumer.send = send
+
+        # Avant: le message transporte event_data, chaque handler encode sa trame
+        # Après: la trame est encodée une fois côté émetteur
+        cas = {
+            'new_event_notification': (
+                global_consumer.new_event_notification,
+                {'type': 'new_event_notification', 'event_data': event_data},
+                {'type': 'new_event_notification', 'frame': frame_evenement('new_event', event_data)},
+            ),
+            'location_event_notification': (
+                location_consumer.location_event_notification,
+                {'type': 'location_event_notification', 'notification_type': 'new_event',
+                 'event_data': event_data, 'distance': 1.25},
+                {'type': 'location_event_notification',
+                 'frames': frames_localisation('new_event', event_data), 'distance': 1.25},
+            ),
+        }
+
+        resultats = {}
+        for nom, (handler, message_avant, message_apres) in cas.items():
+            mesures = []
+            for message in (message_avant, message_apres):
+                debut = time.process_time()
+                for _ in range(destinataires):
+                    await handler(message)
+                mesures.append((time.process_time() - debut) / destinataires * 1e6)
+                envoyes.clear()
+            resultats[nom] = tuple(mesures)
+        return resultats
@@ -0,0 +1,364 @@
+import asyncio
+import json
+import os
+import random
+import resource
+import time
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from FastAPI.consumers import FrameSenderMixin, garde_connexions
+from FastAPI.geo_cells import distance_km
+from FastAPI.metrics import _percentile
+from FastAPI.notification_outbox import relais_inline, relayer
+from FastAPI.routing import http_urlpatterns, websocket_urlpatterns
+from FastAPI.stream_views import SSE_MAX_CONNECTIONS
+
+# Zone des clients et des lieux simulés (Lomé)
+BENCH_LAT_RANGE = (6.10, 6.20)
+BENCH_LNG_RANGE = (1.15, 1.30)
+
+BENCH_PREFIX = 'bench-ws'
+
+SSE_PATH = '/fastapi/stream/events/'
+
+
+def _rss_octets():
+    """Mémoire résidente du processus (/proc si disponible, sinon pic ru_maxrss)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _ip_client(index):
+    """Une adresse par client: le limiteur de connexions est par IP"""
+    return f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}'
+
+
+class ClientSimule:
+    """Connexion WebSocket simulée: note la latence des événements du banc reçus"""
+
+    def __init__(self, chemin, index, latitude=None, longitude=None, radius=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius = radius
+        self.communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), chemin,
+            headers=[(b'x-forwarded-for', _ip_client(index).encode())]
+        )
+        self.connecte = False
+        self.tache = None
+
+    async def connecter(self):
+        connecte, _ = await self.communicator.connect(timeout=30)
+        return connecte
+
+    async def deconnecter(self):
+        await self.communicator.disconnect()
+
+    def noter(self, frame, creations, latences):
+        nom = (frame.get('event') or {}).get('nom', '')
+        debut = creations.get(nom)
+        if debut is not None:
+            latences.append(time.perf_counter() - debut)
+
+    def attend(self, latitude, longitude):
+        """Vrai si l'événement créé à ce point doit parvenir au client"""
+        if self.latitude is None:
+            return True
+        return distance_km(self.latitude, self.longitude, latitude, longitude) <= self.radius
+
+    async def lire(self, creations, latences):
+        while True:
+            sortie = await self.communicator.receive_output(timeout=24 * 60 * 60)
+            if sortie['type'] == 'websocket.close':
+                self.connecte = False
+                return
+            texte = sortie.get('text')
+            if not texte:
+                continue
+            frame = json.loads(texte)
+            if frame.get('type') == 'ping':
+                await self.communicator.send_to(text_data='{"type":"pong"}')
+                continue
+            self.noter(frame, creations, latences)
+
+
+class ClientSSE(ClientSimule):
+    """Connexion Server-Sent Events simulée, par les routes HTTP servies avant Django"""
+
+    def __init__(self, requete, index, latitude=None, longitude=None, radius=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius = radius
+        self.communicator = ApplicationCommunicator(URLRouter(http_urlpatterns), {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': SSE_PATH,
+            'raw_path': SSE_PATH.encode(),
+            'query_string': requete.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'x-forwarded-for', _ip_client(index).encode())],
+            'client': (_ip_client(index), 0),
+            'server': ('localhost', 80),
+        })
+        self.connecte = False
+        self.tache = None
+
+    async def connecter(self):
+        await self.communicator.send_input({'type': 'http.request', 'body': b'', 'more_body': False})
+        # Lecture directe de la file: receive_output annule l'application à l'expiration
+        debut = await asyncio.wait_for(self.communicator.output_queue.get(), 30)
+        return debut.get('status') == 200
+
+    async def deconnecter(self):
+        await self.communicator.send_input({'type': 'http.disconnect'})
+        await self.communicator.wait(timeout=5)
+
+    async def lire(self, creations, latences):
+        while True:
+            sortie = await self.communicator.output_queue.get()
+            if not sortie.get('more_body', False) and sortie['type'] == 'http.response.body':
+                self.connecte = False
+                return
+            for bloc in sortie.get('body', b'').decode().split('\n\n'):
+                for ligne in bloc.split('\n'):
+                    if ligne.startswith('data: '):
+                        self.noter(json.loads(ligne[6:]), creations, latences)
+
+
+class Command(BaseCommand):
+    """
+    Banc de charge WebSocket de bout en bout, dans le processus
+    Usage:
+        python manage.py bench_websocket --clients 2000 --bursts 5 --burst-size 20
+        python manage.py bench_websocket --layer settings     # channel layer configuré (Redis)
+        python manage.py bench_websocket --transport sse      # flux SSE (/fastapi/stream/events/)
+
+    Les clients passent par le routeur WebSocket sans AuthMiddlewareStack
+    (connexions anonymes), ou par les routes HTTP du flux SSE (--transport sse).
+    Les événements sont créés par l'ORM: signaux, outbox, relais, channel
+    layer et consumers sont ceux de production.
+    Les données du banc (utilisateur, lieux, événements) sont supprimées à la fin.
+    """
+    help = 'Mesure la latence de livraison, la mémoire par connexion et le débit WebSocket'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=2000)
+        parser.add_argument(
+            '--location-ratio',
+            type=float,
+            default=0.5,
+            help='Part des clients connectés à /ws/location/ (les autres à /ws/events/)'
+        )
+        parser.add_argument('--radius', type=int, default=5, help='Rayon des clients de localisation (km)')
+        parser.add_argument('--bursts', type=int, default=5)
+        parser.add_argument('--burst-size', type=int, default=20, help='Événements créés par rafale')
+        parser.add_argument('--places', type=int, default=20, help='Lieux simulés')
+        parser.add_argument('--connect-concurrency', type=int, default=200)
+        parser.add_argument(
+            '--drain-timeout',
+            type=float,
+            default=2.0,
+            help='Fin de rafale après N secondes sans nouvelle livraison'
+        )
+        parser.add_argument(
+            '--layer',
+            choices=['memory', 'settings'],
+            default='memory',
+            help='Channel layer en mémoire, ou celui de settings.CHANNEL_LAYERS'
+        )
+        parser.add_argument(
+            '--transport',
+            choices=['websocket', 'sse'],
+            default='websocket',
+            help='Clients WebSocket, ou clients Server-Sent Events (mêmes groupes et trames)'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        if options['layer'] == 'memory':
+            channel_layers.set(DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer(capacity=10000))
+        plafond = (
+            SSE_MAX_CONNECTIONS if options['transport'] == 'sse' else garde_connexions.max_connexions
+        )
+        if options['clients'] > plafond:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ {options['clients']} clients > plafond de {plafond} "
+                "connexions par processus: les connexions en trop seront refusées"
+            ))
+
+        utilisateur, lieux = self._creer_donnees(options['places'])
+        try:
+            asyncio.run(self._banc(options, lieux, utilisateur))
+        finally:
+            # Supprime aussi les lieux et les événements (cascade)
+            utilisateur.delete()
+
+    def _creer_donnees(self, nombre_lieux):
+        from FastAPI.models import Lieu, Utilisateur
+
+        suffixe = uuid.uuid4().hex[:8]
+        utilisateur = Utilisateur.objects.create_user(
+            username=f'{BENCH_PREFIX}-{suffixe}',
+            email=f'{BENCH_PREFIX}-{suffixe}@example.com',
+            password=uuid.uuid4().hex
+        )
+        lieux = [
+            Lieu.objects.create(
+                nom=f'{BENCH_PREFIX} lieu {i}',
+                description='Lieu du banc de charge WebSocket',
+                categorie='Banc',
+                latitude=round(random.uniform(*BENCH_LAT_RANGE), 6),
+                longitude=round(random.uniform(*BENCH_LNG_RANGE), 6),
+                proprietaire=utilisateur
+            )
+            for i in range(nombre_lieux)
+        ]
+        return utilisateur, lieux
+
+    def _creer_rafale(self, rafale, taille, lieux, utilisateur, creations):
+        """Créer une rafale d'événements; retourne les positions de leurs lieux"""
+        from FastAPI.models import Evenement
+
+        positions = []
+        debut = timezone.now() + timedelta(days=2)
+        for k in range(taille):
+            lieu = random.choice(lieux)
+            nom = f'{BENCH_PREFIX}-{rafale}-{k}'
+            creations[nom] = time.perf_counter()
+            Evenement.objects.create(
+                nom=nom,
+                description='Événement du banc de charge WebSocket',
+                date_debut=debut,
+                date_fin=debut + timedelta(hours=2),
+                lieu=lieu,
+                organisateur=utilisateur
+            )
+            if not relais_inline():
+                relayer()
+            positions.append((float(lieu.latitude), float(lieu.longitude)))
+        return positions
+
+    async def _connecter(self, clients, concurrence):
+        for i in range(0, len(clients), concurrence):
+            groupe = clients[i:i + concurrence]
+            resultats = await asyncio.gather(
+                *(client.connecter() for client in groupe),
+                return_exceptions=True
+            )
+            for client, resultat in zip(groupe, resultats):
+                client.connecte = resultat is True
+
+    async def _banc(self, options, lieux, utilisateur):
+        nombre = options['clients']
+        nombre_localisation = int(nombre * options['location_ratio'])
+        clients = []
+        sse = options['transport'] == 'sse'
+        for i in range(nombre):
+            if i < nombre_localisation:
+                latitude = round(random.uniform(*BENCH_LAT_RANGE), 5)
+                longitude = round(random.uniform(*BENCH_LNG_RANGE), 5)
+                if sse:
+                    client = ClientSSE(
+                        f"latitude={latitude}&longitude={longitude}&radius={options['radius']}", i,
+                        latitude, longitude, options['radius']
+                    )
+                else:
+                    client = ClientSimule(
+                        f"/ws/location/{latitude}/{longitude}/{options['radius']}/", i,
+                        latitude, longitude, options['radius']
+                    )
+                clients.append(client)
+            else:
+                clients.append(ClientSSE('', i) if sse else ClientSimule('/ws/events/', i))
+
+        rss_avant = _rss_octets()
+        debut = time.perf_counter()
+        await self._connecter(clients, options['connect_concurrency'])
+        duree_connexion = time.perf_counter() - debut
+        connectes = [client for client in clients if client.connecte]
+        refuses = len(clients) - len(connectes)
+
+        # Messages d'accueil et instantanés avant la mesure
+        creations, latences = {}, []
+        for client in connectes:
+            client.tache = asyncio.ensure_future(client.lire(creations, latences))
+        await asyncio.sleep(options['drain_timeout'])
+        rss_apres = _rss_octets()
+
+        self.stdout.write(
+            f"🔌 {len(connectes)} clients {options['transport']} connectés en {duree_connexion:.1f} s "
+            f"({nombre_localisation} localisation, {nombre - nombre_localisation} globaux), "
+            f"{refuses} refusé(s)"
+        )
+        if connectes:
+            self.stdout.write(
+                f"💾 Mémoire: {(rss_apres - rss_avant) / len(connectes) / 1024:.1f} Ko par connexion "
+                "(RSS, clients simulés compris)"
+            )
+
+        attendus = 0
+        cpu = mur = 0.0
+        for rafale in range(options['bursts']):
+            cpu_debut, mur_debut = time.process_time(), time.perf_counter()
+            recus_debut = len(latences)
+
+            positions = await sync_to_async(self._creer_rafale)(
+                rafale, options['burst_size'], lieux, utilisateur, creations
+            )
+            attendus += sum(
+                client.attend(latitude, longitude)
+                for latitude, longitude in positions
+                for client in connectes
+            )
+
+            # Attendre la fin des livraisons de la rafale
+            recus = -1
+            while recus != len(latences):
+                recus = len(latences)
+                await asyncio.sleep(options['drain_timeout'])
+            cpu += time.process_time() - cpu_debut
+            mur += time.perf_counter() - mur_debut - options['drain_timeout']
+            self.stdout.write(f"📤 Rafale {rafale + 1}: {len(latences) - recus_debut} livraisons")
+
+        for client in connectes:
+            client.tache.cancel()
+        await asyncio.gather(*(client.tache for client in connectes), return_exceptions=True)
+        await asyncio.gather(
+            *(client.deconnecter() for client in connectes), return_exceptions=True
+        )
+
+        triees = sorted(latences)
+        self.stdout.write(
+            f"📨 {len(triees)} livraisons / {attendus} attendues "
+            f"({options['bursts']} rafales de {options['burst_size']} événements)"
+        )
+        if triees:
+            self.stdout.write(
+                'Latence création -> réception: '
+                + '   '.join(
+                    f'p{p}: {_percentile(triees, p) * 1000:.1f} ms' for p in (50, 95, 99)
+                )
+                + f'   max: {triees[-1] * 1000:.1f} ms'
+                + f' (fenêtre d\'envoi de {FrameSenderMixin.flush_window * 1000:.0f} ms comprise)'
+            )
+            self.stdout.write(
+                f"Débit: {len(triees) / max(mur, 1e-9):.0f} messages/s, "
+                f"{len(triees) / max(cpu, 1e-9):.0f} messages/s par cœur "
+                f"(CPU {cpu:.2f} s, processus unique)"
+            )
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from FastAPI.event_reminders import (
+    RAPPELS_BATCH_SIZE, envoyer_rappels, metriques_rappels, planifier_rappels_a_venir
+)
+
+
+class Command(BaseCommand):
+    """
+    Worker des rappels d'événements planifiés (voir event_reminders.py)
+    Usage:
+        python manage.py envoyer_rappels                     # en continu
+        python manage.py envoyer_rappels --once              # un passage (cron)
+        python manage.py envoyer_rappels --planifier --once  # planifier les événements existants
+    """
+    help = "Envoie les rappels d'événements dus (une seule fois chacun)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=15,
+            help="Attente (secondes) quand aucun rappel n'est dû"
+        )
+        parser.add_argument('--batch-size', type=int, default=RAPPELS_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help='Un passage puis quitter')
+        parser.add_argument(
+            '--planifier',
+            action='store_true',
+            help='Planifier au démarrage les rappels des événements à venir'
+        )
+
+    def handle(self, *args, **options):
+        if options['planifier']:
+            nombre = planifier_rappels_a_venir()
+            self.stdout.write(f'🗓️ Rappels planifiés pour {nombre} événement(s)')
+
+        self.stdout.write('🔄 Worker des rappels démarré')
+        while True:
+            close_old_connections()
+            try:
+                traites = envoyer_rappels(options['batch_size'])
+                if traites and options['verbosity'] > 1:
+                    self.stdout.write(f'📤 {traites} rappel(s) traité(s)')
+            except Exception as e:
+                traites = 0
+                self.stdout.write(self.style.ERROR(f'❌ Erreur rappels: {e}'))
+            metriques_rappels.publier()
+
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f'✅ {traites} rappel(s) traité(s)'))
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from FastAPI.statistiques import StatistiquesService
+
+
+class Command(BaseCommand):
+    """
+    Recalcul exact des statistiques globales matérialisées
+    Usage:
+        python manage.py recalculer_statistiques              # une fois (cron)
+        python manage.py recalculer_statistiques --interval 300
+    """
+    help = 'Recalcule exactement les statistiques globales (corrige les dérives des compteurs incrémentaux)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Relancer le recalcul toutes les N secondes (0 = une seule fois)'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            try:
+                stats = StatistiquesService.recalculer()
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ Statistiques recalculées: {stats.nombre_lieux} lieux, '
+                    f'{stats.nombre_evenements} événements, '
+                    f'{stats.nombre_utilisateurs_actifs} utilisateurs actifs'
+                ))
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'❌ Erreur: {e}'))
+
+            if interval <= 0:
+                break
+            time.sleep(interval)
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from FastAPI.notification_outbox import (
+    OUTBOX_BATCH_SIZE, metriques_relais, mesurer_attente, relayer
+)
+
+
+class Command(BaseCommand):
+    """
+    Relais de l'outbox des notifications WebSocket vers le channel layer
+    Usage:
+        python manage.py relay_notifications                 # en continu
+        python manage.py relay_notifications --once          # un passage (cron)
+        python manage.py relay_notifications --interval 0.1 --batch-size 500
+    """
+    help = "Publie par lots les notifications WebSocket de l'outbox (avec réessais)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.25,
+            help="Attente (secondes) quand l'outbox est vide"
+        )
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument('--once', action='store_true', help='Vider une fois puis quitter')
+        parser.add_argument(
+            '--metrics-interval',
+            type=float,
+            default=10,
+            help='Publication des métriques dans le cache toutes les N secondes'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        batch_size = options['batch_size']
+        derniere_publication = 0.0
+
+        self.stdout.write('🔄 Relais des notifications démarré')
+        while True:
+            close_old_connections()
+            try:
+                traitees = relayer(batch_size)
+                if traitees and options['verbosity'] > 1:
+                    self.stdout.write(f'📤 {traitees} notification(s) relayée(s)')
+            except Exception as e:
+                traitees = 0
+                self.stdout.write(self.style.ERROR(f'❌ Erreur relais: {e}'))
+
+            if options['once'] or time.monotonic() - derniere_publication > options['metrics_interval']:
+                try:
+                    mesurer_attente()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f'❌ Erreur mesure outbox: {e}'))
+                metriques_relais.publier()
+                derniere_publication = time.monotonic()
+
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS(f'✅ {traitees} notification(s) relayée(s)'))
+                break
+            if not traitees:
+                time.sleep(interval)
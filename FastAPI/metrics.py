@@ -0,0 +1,119 @@
+"""
+Métriques de fonctionnement par processus, publiées dans le cache
+Fichier: metrics.py
+
+Chaque processus (serveur ASGI, relais de notifications...) tient un registre
+local: compteurs, jauges et distributions (fenêtre glissante). publier()
+écrit un instantané dans le cache partagé, lisible depuis n'importe quel
+processus avec lire_metriques().
+"""
+
+import asyncio
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_CACHE_PREFIX = 'metrics'
+METRICS_CACHE_TIMEOUT = 5 * 60
+
+# Nombre d'observations conservées par distribution
+DISTRIBUTION_WINDOW = 1024
+
+
+def identifiant_processus():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def _percentile(valeurs_triees, p):
+    if not valeurs_triees:
+        return None
+    index = min(int(round(p / 100 * (len(valeurs_triees) - 1))), len(valeurs_triees) - 1)
+    return valeurs_triees[index]
+
+
+class RegistreMetriques:
+    """Compteurs, jauges et distributions d'un composant dans ce processus"""
+
+    def __init__(self, composant):
+        self.composant = composant
+        self._compteurs = {}
+        self._jauges = {}
+        self._distributions = {}
+        self._verrou = threading.Lock()
+        self._derniere_publication = 0.0
+
+    def incrementer(self, nom, valeur=1):
+        with self._verrou:
+            self._compteurs[nom] = self._compteurs.get(nom, 0) + valeur
+
+    def definir(self, nom, valeur):
+        """Fixer la valeur d'une jauge"""
+        with self._verrou:
+            self._jauges[nom] = valeur
+
+    def observer(self, nom, valeur):
+        """Ajouter une observation à une distribution (ex: latence en secondes)"""
+        with self._verrou:
+            distribution = self._distributions.get(nom)
+            if distribution is None:
+                distribution = self._distributions[nom] = deque(maxlen=DISTRIBUTION_WINDOW)
+            distribution.append(valeur)
+
+    def instantane(self):
+        with self._verrou:
+            distributions = {}
+            for nom, valeurs in self._distributions.items():
+                triees = sorted(valeurs)
+                distributions[nom] = {
+                    'count': len(triees),
+                    'p50': _percentile(triees, 50),
+                    'p95': _percentile(triees, 95),
+                    'p99': _percentile(triees, 99),
+                    'max': triees[-1] if triees else None,
+                }
+            return {
+                'processus': identifiant_processus(),
+                'horodatage': time.time(),
+                'compteurs': dict(self._compteurs),
+                'jauges': dict(self._jauges),
+                'distributions': distributions,
+            }
+
+    def publier(self):
+        """Écrire l'instantané du registre dans le cache partagé"""
+        try:
+            cache.set(
+                f'{METRICS_CACHE_PREFIX}_{self.composant}',
+                self.instantane(),
+                METRICS_CACHE_TIMEOUT
+            )
+        except Exception as e:
+            logger.error(f"Erreur publication des métriques {self.composant}: {e}")
+
+    def publier_periodiquement(self, intervalle=10):
+        """
+        Publier au plus toutes les `intervalle` secondes (appelable sur un chemin chaud).
+        Depuis une boucle asyncio, l'écriture dans le cache (E/S bloquante) est
+        confiée à un thread de l'exécuteur au lieu de bloquer la boucle
+        """
+        if time.monotonic() - self._derniere_publication < intervalle:
+            return
+        self._derniere_publication = time.monotonic()
+        try:
+            boucle = asyncio.get_running_loop()
+        except RuntimeError:
+            self.publier()
+        else:
+            boucle.run_in_executor(None, self.publier)
+
+
+def lire_metriques(composant):
+    """Dernier instantané publié pour un composant (None si absent ou expiré)"""
+    return cache.get(f'{METRICS_CACHE_PREFIX}_{composant}')
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:41
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def remplir_categorie_slug(apps, schema_editor):
+    """Calculer le slug de catégorie des lieux existants"""
+    Lieu = apps.get_model('FastAPI', 'Lieu')
+    categories = Lieu.objects.values_list('categorie', flat=True).distinct()
+    for categorie in categories:
+        Lieu.objects.filter(categorie=categorie).update(
+            categorie_slug=slugify(categorie or '')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FastAPI', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lieu',
+            name='categorie_slug',
+            field=models.SlugField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(remplir_categorie_slug, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FastAPI', '0002_lieu_categorie_slug'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiquesGlobales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_lieux', models.IntegerField(default=0)),
+                ('nombre_evenements', models.IntegerField(default=0)),
+                ('nombre_utilisateurs_actifs', models.IntegerField(default=0)),
+                ('nombre_avis_lieux', models.IntegerField(default=0)),
+                ('nombre_avis_evenements', models.IntegerField(default=0)),
+                ('evenements_a_venir', models.IntegerField(default=0)),
+                ('prochain_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('date_recalcul', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Statistiques globales',
+                'verbose_name_plural': 'Statistiques globales',
+            },
+        ),
+        migrations.AlterField(
+            model_name='evenement',
+            name='date_debut',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FastAPI', '0003_statistiquesglobales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('groupes', models.JSONField(help_text='Groupes channel layer restant à notifier')),
+                ('message', models.JSONField(help_text="Message channel layer (avec sa clé 'type')")),
+                ('date_creation', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('prochain_essai', models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True)),
+                ('derniere_erreur', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Notification en attente',
+                'verbose_name_plural': 'Notifications en attente',
+                'indexes': [models.Index(fields=['prochain_essai', 'id'], name='outbox_prochain_essai_idx')],
+            },
+        ),
+    ]
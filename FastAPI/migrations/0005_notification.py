@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FastAPI', '0004_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=50)),
+                ('message', models.CharField(max_length=255)),
+                ('donnees', models.JSONField(blank=True, default=dict, help_text='Champs propres au type (note, identifiants...)')),
+                ('lue', models.BooleanField(default=False)),
+                ('date_creation', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_lecture', models.DateTimeField(blank=True, null=True)),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Notification',
+                'verbose_name_plural': 'Notifications',
+                'indexes': [models.Index(condition=models.Q(('lue', False)), fields=['utilisateur', '-date_creation', '-id'], name='notif_non_lues_idx'), models.Index(condition=models.Q(('lue', True)), fields=['date_lecture'], name='notif_lues_date_idx')],
+            },
+        ),
+    ]
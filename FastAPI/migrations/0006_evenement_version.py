@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FastAPI', '0005_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evenement',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('FastAPI', '0006_evenement_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RappelPlanifie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('avance', models.PositiveIntegerField(help_text="Minutes avant le début de l'événement")),
+                ('date_debut_evenement', models.DateTimeField(help_text="Début de l'événement au moment de la planification")),
+                ('date_envoi', models.DateTimeField()),
+                ('statut', models.CharField(choices=[('planifie', 'Planifié'), ('envoye', 'Envoyé'), ('expire', 'Expiré')], default='planifie', max_length=10)),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+                ('evenement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rappels', to='FastAPI.evenement')),
+            ],
+            options={
+                'verbose_name': 'Rappel planifié',
+                'verbose_name_plural': 'Rappels planifiés',
+                'indexes': [models.Index(condition=models.Q(('statut', 'planifie')), fields=['date_envoi', 'id'], name='rappel_a_envoyer_idx')],
+                'constraints': [models.UniqueConstraint(fields=('evenement', 'avance', 'date_debut_evenement'), name='rappel_unique')],
+            },
+        ),
+    ]
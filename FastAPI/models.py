@@ -1,8 +1,16 @@
-from django.db import models
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.utils import timezone
 import uuid
 
+from .categories import slug_categorie
+
 
 class Utilisateur(AbstractUser):
     """Modèle utilisateur unique pour l'application"""
@@ -28,6 +36,8 @@ class Lieu(models.Model):
     nom = models.CharField(max_length=200)
     description = models.TextField()
     categorie = models.CharField(max_length=100)
+    # Forme normalisée de la catégorie, utilisée pour les filtres exacts indexés
+    categorie_slug = models.SlugField(max_length=100, db_index=True, editable=False, blank=True)
     latitude = models.DecimalField(
         max_digits=10, 
         decimal_places=7,
@@ -53,6 +63,13 @@ class Lieu(models.Model):
     
     def __str__(self):
         return self.nom
+    
+    def save(self, *args, **kwargs):
+        self.categorie_slug = slug_categorie(self.categorie)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'categorie' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'categorie_slug'}
+        super().save(*args, **kwargs)
 
 
 class Evenement(models.Model):
@@ -60,7 +77,7 @@ class Evenement(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     nom = models.CharField(max_length=200)
     description = models.TextField()
-    date_debut = models.DateTimeField()
+    date_debut = models.DateTimeField(db_index=True)
     date_fin = models.DateTimeField()
     
     # Relations
@@ -74,6 +91,9 @@ class Evenement(models.Model):
         on_delete=models.CASCADE, 
         related_name='evenements_organises'
     )
+    # Incrémentée à chaque modification effective: les clients qui appliquent
+    # les deltas event_patch détectent ainsi une notification manquée
+    version = models.PositiveIntegerField(default=1, editable=False)
     
     class Meta:
         verbose_name = "Événement"
@@ -82,6 +102,84 @@ class Evenement(models.Model):
     
     def __str__(self):
         return f"{self.nom} - {self.date_debut.strftime('%d/%m/%Y')}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # État chargé, comparé à la sauvegarde pour connaître les champs modifiés
+        instance._etat_initial = instance._etat_suivi()
+        return instance
+    
+    def _valeur_suivie(self, field):
+        valeur = getattr(self, field.attname)
+        try:
+            # Les vues web assignent les valeurs brutes du formulaire (chaînes)
+            valeur = field.to_python(valeur)
+        except ValidationError:
+            return valeur
+        if isinstance(valeur, datetime) and settings.USE_TZ and timezone.is_naive(valeur):
+            valeur = timezone.make_aware(valeur)
+        return valeur
+    
+    def _etat_suivi(self):
+        charges = self.__dict__
+        return {
+            field.name: self._valeur_suivie(field)
+            for field in self._meta.concrete_fields
+            if field.attname in charges and field.name != 'version'
+        }
+    
+    def champs_modifies(self):
+        """Champs modifiés depuis le chargement (None si l'état chargé est inconnu)"""
+        etat = getattr(self, '_etat_initial', None)
+        if etat is None:
+            return None
+        return [
+            nom for nom, valeur in etat.items()
+            if self._valeur_suivie(self._meta.get_field(nom)) != valeur
+        ]
+    
+    def save(self, *args, **kwargs):
+        """
+        Sauvegarde sans effet si aucun champ n'a changé (ni écriture, ni signal,
+        ni notification). Sinon la version est incrémentée en base (F, sans
+        perte entre sauvegardes concurrentes) et les champs modifiés restent
+        lisibles dans derniers_champs_modifies (signal post_save).
+        """
+        # Les vues web assignent les dates brutes du formulaire (chaînes):
+        # les convertir pour que les signaux post_save reçoivent des datetime
+        for nom in ('date_debut', 'date_fin'):
+            if isinstance(getattr(self, nom), str):
+                setattr(self, nom, self._valeur_suivie(self._meta.get_field(nom)))
+        
+        modifies = None
+        incrementer = False
+        if not self._state.adding:
+            modifies = self.champs_modifies()
+            update_fields = kwargs.get('update_fields')
+            if modifies is not None and update_fields is not None:
+                update_fields = set(update_fields)
+                modifies = [
+                    nom for nom in modifies
+                    if nom in update_fields or self._meta.get_field(nom).attname in update_fields
+                ]
+            if modifies == []:
+                return
+            incrementer = True
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'version'}
+        
+        self.derniers_champs_modifies = modifies
+        if not incrementer:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic():
+                # La ligne reste verrouillée jusqu'au commit: la version relue
+                # est celle de cette sauvegarde, avant les signaux post_save
+                if Evenement.objects.filter(pk=self.pk).update(version=F('version') + 1):
+                    self.refresh_from_db(fields=['version'])
+                super().save(*args, **kwargs)
+        self._etat_initial = self._etat_suivi()
 
 
 class AvisLieu(models.Model):
@@ -145,4 +243,150 @@ class AvisEvenement(models.Model):
         ordering = ['-date']
     
     def __str__(self):
-        return f"Avis de {self.utilisateur.username} sur {self.evenement.nom} - {self.note}★"
\ No newline at end of file
+        return f"Avis de {self.utilisateur.username} sur {self.evenement.nom} - {self.note}★"
+
+
+class StatistiquesGlobales(models.Model):
+    """Compteurs globaux matérialisés (ligne unique, pk=1) mis à jour par les signaux"""
+    nombre_lieux = models.IntegerField(default=0)
+    nombre_evenements = models.IntegerField(default=0)
+    nombre_utilisateurs_actifs = models.IntegerField(default=0)
+    nombre_avis_lieux = models.IntegerField(default=0)
+    nombre_avis_evenements = models.IntegerField(default=0)
+    evenements_a_venir = models.IntegerField(default=0)
+    # Début du prochain événement: au-delà, evenements_a_venir doit être recalculé
+    prochain_debut = models.DateTimeField(null=True, blank=True)
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+    date_recalcul = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Statistiques globales"
+        verbose_name_plural = "Statistiques globales"
+    
+    def __str__(self):
+        return f"Statistiques (mises à jour le {self.date_mise_a_jour:%d/%m/%Y %H:%M})"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Notification WebSocket en attente de publication (outbox transactionnelle).
+    Écrite dans la même transaction que la modification qui la déclenche,
+    publiée puis supprimée par le relais (voir notification_outbox.py).
+    """
+    groupes = models.JSONField(help_text="Groupes channel layer restant à notifier")
+    message = models.JSONField(help_text="Message channel layer (avec sa clé 'type')")
+    date_creation = models.DateTimeField(default=timezone.now)
+    tentatives = models.PositiveIntegerField(default=0)
+    # Null: abandonnée après trop d'échecs
+    prochain_essai = models.DateTimeField(default=timezone.now, null=True, blank=True)
+    derniere_erreur = models.TextField(blank=True)
+    
+    class Meta:
+        verbose_name = "Notification en attente"
+        verbose_name_plural = "Notifications en attente"
+        indexes = [
+            models.Index(fields=['prochain_essai', 'id'], name='outbox_prochain_essai_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.message.get('type')} -> {', '.join(self.groupes)}"
+
+
+class Notification(models.Model):
+    """
+    Notification personnelle d'un utilisateur, conservée jusqu'à sa lecture.
+    Envoyée en direct sur /ws/personal/, puis relue page par page à la
+    connexion tant qu'elle n'est pas marquée comme lue (voir user_notifications.py).
+    """
+    utilisateur = models.ForeignKey(
+        Utilisateur,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    type = models.CharField(max_length=50)
+    message = models.CharField(max_length=255)
+    donnees = models.JSONField(default=dict, blank=True, help_text="Champs propres au type (note, identifiants...)")
+    lue = models.BooleanField(default=False)
+    date_creation = models.DateTimeField(default=timezone.now)
+    date_lecture = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Notification"
+        verbose_name_plural = "Notifications"
+        indexes = [
+            # Index partiel: seules les non lues (une petite fraction) sont parcourues à la connexion
+            models.Index(
+                fields=['utilisateur', '-date_creation', '-id'],
+                condition=models.Q(lue=False),
+                name='notif_non_lues_idx'
+            ),
+            # Archivage des notifications lues anciennes
+            models.Index(
+                fields=['date_lecture'],
+                condition=models.Q(lue=True),
+                name='notif_lues_date_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.type} -> {self.utilisateur_id}"
+    
+    def to_dict(self):
+        """Représentation envoyée aux clients WebSocket et par l'API"""
+        return {
+            **self.donnees,
+            'id': self.id,
+            'type': self.type,
+            'message': self.message,
+            'lue': self.lue,
+            'date_creation': self.date_creation.isoformat(),
+        }
+
+
+class RappelPlanifie(models.Model):
+    """
+    Rappel d'un événement planifié à son heure d'envoi (file ordonnée par
+    date_envoi). Conservé après l'envoi comme registre: un même rappel
+    (événement, avance, date de début) n'est jamais envoyé deux fois
+    (voir event_reminders.py).
+    """
+    STATUT_PLANIFIE = 'planifie'
+    STATUT_ENVOYE = 'envoye'
+    STATUT_EXPIRE = 'expire'
+    STATUTS = [
+        (STATUT_PLANIFIE, 'Planifié'),
+        (STATUT_ENVOYE, 'Envoyé'),
+        (STATUT_EXPIRE, 'Expiré'),
+    ]
+    
+    evenement = models.ForeignKey(
+        Evenement,
+        on_delete=models.CASCADE,
+        related_name='rappels'
+    )
+    avance = models.PositiveIntegerField(help_text="Minutes avant le début de l'événement")
+    date_debut_evenement = models.DateTimeField(help_text="Début de l'événement au moment de la planification")
+    date_envoi = models.DateTimeField()
+    statut = models.CharField(max_length=10, choices=STATUTS, default=STATUT_PLANIFIE)
+    date_traitement = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Rappel planifié"
+        verbose_name_plural = "Rappels planifiés"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['evenement', 'avance', 'date_debut_evenement'],
+                name='rappel_unique'
+            ),
+        ]
+        indexes = [
+            # Index partiel: le worker ne parcourt que les rappels en attente
+            models.Index(
+                fields=['date_envoi', 'id'],
+                condition=models.Q(statut='planifie'),
+                name='rappel_a_envoyer_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.evenement_id} -{self.avance} min ({self.statut})"
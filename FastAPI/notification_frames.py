@@ -0,0 +1,150 @@
+"""
+Trames JSON des notifications WebSocket, encodées une seule fois par changement
+Fichier: notification_frames.py
+
+Les signaux construisent l'enveloppe envoyée au client et l'encodent en JSON
+avant de la publier dans le channel layer (clé 'frame'). Les consumers
+transmettent la chaîne telle quelle: aucun json.dumps par destinataire.
+Seule la distance, propre à chaque abonné géographique, est ajoutée en fin
+d'objet par concaténation (ajouter_champ).
+"""
+
+import json
+
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+# Préfixe du champ 'message' par type de trame client
+MESSAGES = {
+    'new_event': 'Nouvel événement',
+    'event_updated': 'Événement modifié',
+    'event_cancelled': 'Événement annulé',
+    'proximity_event': 'Événement à proximité',
+    'new_place': 'Nouveau lieu',
+    'new_review': 'Nouvel avis',
+}
+
+# Champs d'un événement dans le flux global (events_notifications, catégories):
+# le client charge le détail par l'API REST quand il l'affiche
+CHAMPS_RESUME_EVENEMENT = (
+    'id', 'nom', 'date_debut', 'date_fin', 'lieu', 'lieu_nom',
+    'lieu_latitude', 'lieu_longitude', 'version',
+)
+
+
+def cle_fusion_evenement(evenement_id):
+    """
+    Clé de fusion des notifications d'un événement dans les files sortantes:
+    une modification remplace la précédente, une annulation les remplace
+    """
+    return f'event:{evenement_id}'
+
+
+def encoder(payload):
+    """JSON compact; l'encodeur DRF gère UUID, Decimal et dates des serializers"""
+    return json.dumps(payload, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def construire_frame(type_client, **champs):
+    """Encoder une enveloppe {type, ..., timestamp}"""
+    return encoder({
+        'type': type_client,
+        **champs,
+        'timestamp': timezone.now().isoformat(),
+    })
+
+
+def ajouter_champ(frame, cle, valeur):
+    """
+    Ajouter un champ à la fin d'un objet JSON encodé sans le décoder.
+    `cle` est un identifiant fixe et `valeur` un scalaire JSON natif
+    (distance, numéro de séquence du journal)
+    """
+    return f'{frame[:-1]},"{cle}":{json.dumps(valeur)}}}'
+
+
+def frame_evenement(type_client, event_data, **champs):
+    """Trame new_event / event_updated / event_cancelled / proximity_event"""
+    return construire_frame(
+        type_client,
+        event=event_data,
+        **champs,
+        message=f"{MESSAGES[type_client]}: {event_data['nom']}"
+    )
+
+
+def resume_evenement(event_data):
+    """Événement sérialisé réduit aux champs du flux global"""
+    return {champ: event_data[champ] for champ in CHAMPS_RESUME_EVENEMENT if champ in event_data}
+
+
+def frame_patch_evenement(event_id, version, changed_fields):
+    """
+    Trame event_patch: seuls les champs modifiés. Le client l'applique si sa
+    copie est à la version précédente, sinon il recharge l'événement.
+    """
+    return construire_frame(
+        'event_patch',
+        event_id=event_id,
+        version=version,
+        changed_fields=changed_fields
+    )
+
+
+def frame_avis_evenement(event_id, event_nom, note, moyenne_avis, nombre_avis):
+    """Trame new_review (abonnés de l'événement): note et moyenne mise à jour"""
+    return construire_frame(
+        'new_review',
+        event_id=event_id,
+        rating=note,
+        moyenne_avis=round(moyenne_avis, 1) if moyenne_avis is not None else None,
+        nombre_avis=nombre_avis,
+        message=f"{MESSAGES['new_review']}: {event_nom}"
+    )
+
+
+def frame_lieu(place_data):
+    """Trame new_place"""
+    return construire_frame(
+        'new_place',
+        place=place_data,
+        message=f"{MESSAGES['new_place']}: {place_data['nom']}"
+    )
+
+
+def frame_rappel(event_data, reminder_time, is_organizer=False):
+    """Trame event_reminder (notifications personnelles)"""
+    champs = {'is_organizer': True} if is_organizer else {}
+    return construire_frame(
+        'event_reminder',
+        event=event_data,
+        reminder_time=reminder_time,
+        **champs,
+        message=f"Rappel: {event_data['nom']} dans {reminder_time}"
+    )
+
+
+def frame_localisation(notification_type, event_data, **champs):
+    """
+    Trame location_event (LocationBasedConsumer), sans la distance;
+    `champs`: champs propres à la notification (ex: reminder_time d'un rappel)
+    """
+    return construire_frame(
+        'location_event',
+        notification=notification_type,
+        event=event_data,
+        **champs
+    )
+
+
+def frames_localisation(notification_type, event_data, **champs):
+    """
+    Trames d'un événement géolocalisé pour les deux types d'abonnés:
+    LocationBasedConsumer (location_event) et EventNotificationConsumer
+    abonné par subscribe_location (proximity_event)
+    """
+    return {
+        'location_event': frame_localisation(notification_type, event_data, **champs),
+        'proximity_event': frame_evenement('proximity_event', event_data, **champs),
+    }
+
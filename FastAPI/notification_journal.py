@@ -0,0 +1,219 @@
+"""
+Journal des notifications WebSocket par groupe (Redis Streams) pour la
+reprise après reconnexion
+Fichier: notification_journal.py
+
+Avant publication, chaque notification destinée à un groupe public
+(events_notifications, catégories, cellules géographiques, événements) reçoit un numéro
+de séquence global croissant ('<millisecondes>-<n>') et est ajoutée au flux
+plafonné de chacun de ses groupes (un script Lua par notification, un seul
+pipeline par lot). Le numéro est inséré dans les trames ('seq').
+
+Un client qui se reconnecte avec resume_from=<dernier seq reçu> ne reçoit
+que les notifications manquées. Si l'écart n'est plus couvert par le journal
+(curseur trop ancien, entrées supprimées par le plafond, trop de messages),
+il reçoit une trame 'resync_required' et recharge ses listes par l'API REST.
+
+Clés (base REDIS_DATA_URL, voir redis_client.py):
+    journal:dernier             dernier numéro attribué
+    journal:flux:<groupe>       flux du groupe; champs m (message JSON) et
+                                p (numéro de l'entrée précédente du flux)
+"""
+
+import json
+import time
+
+from django.conf import settings
+
+from .notification_frames import ajouter_champ, encoder
+from .redis_client import get_async_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Groupes journalisés (les groupes personnels user_<id> ont leurs notifications en base)
+JOURNAL_GROUP_PREFIXES = ('events_notifications', 'category_', 'geo_', 'event_')
+
+JOURNAL_LAST_ID_KEY = 'journal:dernier'
+JOURNAL_STREAM_KEY = 'journal:flux:{}'
+
+# Entrées conservées par flux (approximatif: MAXLEN ~) et durée de rétention (secondes)
+JOURNAL_MAXLEN = 1000
+JOURNAL_RETENTION = 6 * 60 * 60
+
+# Au-delà, une reprise coûte plus qu'un rechargement REST (et dépasserait la file sortante)
+JOURNAL_REPLAY_MAX = 100
+
+# Après une erreur Redis, journal ignoré pendant ce délai (secondes)
+JOURNAL_RETRY_DELAY = 5
+
+JOURNAL_APPEND_LUA = """
+local t = redis.call('TIME')
+local ms = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local n = 0
+local dernier = redis.call('GET', KEYS[1])
+if dernier then
+    local d_ms, d_n = string.match(dernier, '^(%d+)-(%d+)$')
+    if tonumber(d_ms) >= ms then
+        ms = tonumber(d_ms)
+        n = tonumber(d_n) + 1
+    end
+end
+local id = string.format('%d-%d', ms, n)
+redis.call('SET', KEYS[1], id)
+for i = 2, #KEYS do
+    local precedent = ''
+    local derniere = redis.call('XREVRANGE', KEYS[i], '+', '-', 'COUNT', 1)
+    if derniere[1] then
+        precedent = derniere[1][1]
+    end
+    redis.call('XADD', KEYS[i], 'MAXLEN', '~', ARGV[1], id, 'm', ARGV[3], 'p', precedent)
+    redis.call('EXPIRE', KEYS[i], ARGV[2])
+end
+return id
+"""
+
+_script = None
+_indisponible_jusqua = 0.0
+
+
+def journal_actif():
+    return (
+        getattr(settings, 'NOTIFICATION_JOURNAL_ENABLED', True)
+        and time.monotonic() >= _indisponible_jusqua
+    )
+
+
+def _erreur_redis(operation, erreur):
+    global _indisponible_jusqua
+    _indisponible_jusqua = time.monotonic() + JOURNAL_RETRY_DELAY
+    logger.error(f"Journal des notifications indisponible ({operation}): {erreur}")
+
+
+def groupe_journalise(groupe):
+    return groupe.startswith(JOURNAL_GROUP_PREFIXES)
+
+
+def cle_flux(groupe):
+    return JOURNAL_STREAM_KEY.format(groupe)
+
+
+def analyser_seq(seq):
+    """'<ms>-<n>' -> (ms, n), comparable; ValueError si le format est invalide"""
+    ms, _, n = str(seq).partition('-')
+    return int(ms), int(n or 0)
+
+
+def marquer(message, seq):
+    """Ajouter le numéro de séquence au message et à ses trames pré-encodées"""
+    message['seq'] = seq
+    if message.get('frame'):
+        message['frame'] = ajouter_champ(message['frame'], 'seq', seq)
+    if message.get('frames'):
+        message['frames'] = {
+            type_client: ajouter_champ(frame, 'seq', seq)
+            for type_client, frame in message['frames'].items()
+        }
+    return message
+
+
+async def journaliser(envois):
+    """
+    Numéroter et journaliser les messages [(groupes, message)] destinés à des
+    groupes journalisés. Les messages sont marqués sur place; ceux qui ont
+    déjà un numéro (nouvel essai du relais) ne sont pas journalisés deux fois.
+    Une erreur Redis n'empêche pas l'envoi: le message part sans numéro.
+    """
+    global _script
+
+    a_journaliser = []
+    for groupes, message in envois:
+        if 'seq' in message:
+            continue
+        cles = [cle_flux(groupe) for groupe in groupes if groupe_journalise(groupe)]
+        if cles:
+            a_journaliser.append((cles, message))
+    if not a_journaliser or not journal_actif():
+        return
+
+    try:
+        client = get_async_redis()
+        if _script is None:
+            _script = client.register_script(JOURNAL_APPEND_LUA)
+        pipe = client.pipeline(transaction=False)
+        for cles, message in a_journaliser:
+            await _script(
+                keys=[JOURNAL_LAST_ID_KEY, *cles],
+                args=[JOURNAL_MAXLEN, JOURNAL_RETENTION, encoder(message)],
+                client=pipe
+            )
+        numeros = await pipe.execute()
+    except Exception as e:
+        _erreur_redis('écriture', e)
+        return
+
+    for (_, message), seq in zip(a_journaliser, numeros):
+        marquer(message, seq)
+
+
+async def position_courante():
+    """Dernier numéro attribué (point de reprise d'un client qui n'a encore rien reçu)"""
+    if not journal_actif():
+        return None
+    try:
+        return await get_async_redis().get(JOURNAL_LAST_ID_KEY)
+    except Exception as e:
+        _erreur_redis('lecture', e)
+        return None
+
+
+async def relire(groupes, depuis, limite=JOURNAL_REPLAY_MAX):
+    """
+    Notifications des `groupes` postérieures au numéro `depuis`, dans l'ordre.
+    Retourne (messages, position courante, raison): une raison non nulle
+    signifie que la reprise est impossible et qu'un rechargement complet est
+    nécessaire.
+    """
+    groupes = [groupe for groupe in groupes if groupe_journalise(groupe)]
+    try:
+        curseur = analyser_seq(depuis)
+    except ValueError:
+        curseur = None
+
+    if not journal_actif():
+        return [], None, 'journal_unavailable'
+    try:
+        pipe = get_async_redis().pipeline(transaction=False)
+        pipe.get(JOURNAL_LAST_ID_KEY)
+        if curseur is not None:
+            debut = f'{curseur[0]}-{curseur[1] + 1}'
+            for groupe in groupes:
+                pipe.xrange(cle_flux(groupe), min=debut, max='+', count=limite + 1)
+        position, *flux = await pipe.execute()
+    except Exception as e:
+        _erreur_redis('lecture', e)
+        return [], None, 'journal_unavailable'
+
+    if curseur is None:
+        return [], position, 'invalid_cursor'
+    if curseur[0] < (time.time() - JOURNAL_RETENTION) * 1000:
+        return [], position, 'cursor_too_old'
+    if position is None or curseur > analyser_seq(position):
+        # Journal réinitialisé depuis la dernière connexion du client
+        return [], position, 'cursor_unknown'
+
+    messages = {}
+    for entrees in flux:
+        if not entrees:
+            continue
+        precedent = entrees[0][1].get('p')
+        if precedent and analyser_seq(precedent) > curseur:
+            # Les entrées entre le curseur et la première conservée ont été supprimées
+            return [], position, 'gap_trimmed'
+        for seq, champs in entrees:
+            if seq not in messages:
+                messages[seq] = marquer(json.loads(champs['m']), seq)
+        if len(messages) > limite:
+            return [], position, 'too_many'
+
+    return [messages[seq] for seq in sorted(messages, key=analyser_seq)], position, None
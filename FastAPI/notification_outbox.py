@@ -0,0 +1,182 @@
+"""
+Outbox transactionnelle des notifications WebSocket
+Fichier: notification_outbox.py
+
+Les signaux n'appellent plus le channel layer pendant post_save: ils écrivent
+une ligne NotificationOutbox dans la transaction en cours. Une notification
+d'une transaction annulée n'est donc jamais publiée, et la requête HTTP ne
+fait plus d'aller-retour Redis.
+
+Le relais publie les lignes par lots:
+- en développement (NOTIFICATION_RELAY_INLINE, DEBUG par défaut), juste
+  après le commit via transaction.on_commit;
+- en production, par la commande `python manage.py relay_notifications`
+  (service worker de render.yaml).
+"""
+
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import RegistreMetriques
+import logging
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 200
+
+# Au-delà, la ligne est conservée avec prochain_essai=NULL pour analyse
+OUTBOX_MAX_TENTATIVES = 8
+OUTBOX_BACKOFF_MAX = 5 * 60
+
+# Réservation d'un lot pendant sa publication (hors transaction)
+OUTBOX_CLAIM_TIMEOUT = timedelta(seconds=60)
+
+metriques_relais = RegistreMetriques('relais_notifications')
+
+
+def relais_inline():
+    return getattr(settings, 'NOTIFICATION_RELAY_INLINE', settings.DEBUG)
+
+
+def enregistrer_notification(groupes, message):
+    """Mettre une notification en file dans la transaction courante"""
+    enregistrer_notifications([(groupes, message)])
+
+
+def enregistrer_notifications(envois):
+    """Mettre plusieurs notifications [(groupes, message)] en file en un seul INSERT"""
+    from .models import NotificationOutbox
+
+    if not envois:
+        return
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(groupes=list(groupes), message=message)
+        for groupes, message in envois
+    ])
+    if relais_inline():
+        transaction.on_commit(_relayer_apres_commit)
+
+
+def _relayer_apres_commit():
+    try:
+        relayer()
+    except Exception as e:
+        logger.error(f"Erreur relais des notifications après commit: {e}")
+
+
+def _delai_avant_essai(tentatives):
+    return timedelta(seconds=min(2 ** tentatives, OUTBOX_BACKOFF_MAX))
+
+
+async def _publier_lot(channel_layer, lot):
+    """
+    Publier toutes les notifications du lot en un seul passage (envois
+    concurrents, voir AsyncWebSocketManager.send_batch).
+    Retourne {id: (groupes en échec, dernière erreur)}.
+    """
+    from .websocket_utils import AsyncWebSocketManager
+
+    resultats = await AsyncWebSocketManager.send_batch(
+        [(notification.groupes, notification.message) for notification in lot],
+        channel_layer
+    )
+    return {
+        notification.id: ([groupe for groupe, _ in echecs], str(echecs[-1][1]))
+        for notification, echecs in zip(lot, resultats)
+        if echecs
+    }
+
+
+def relayer_lot(batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Publier un lot de notifications dues; retourne le nombre de lignes traitées.
+    Les lignes sont réservées dans une première transaction courte (prochain
+    essai repoussé de OUTBOX_CLAIM_TIMEOUT), publiées hors transaction, puis
+    supprimées ou replanifiées dans une seconde: aucun verrou de ligne n'est
+    tenu pendant les appels Redis. Un relais arrêté entre les deux laisse
+    ses lignes réservées, reprises à l'expiration de la réservation.
+    """
+    from .models import NotificationOutbox
+
+    channel_layer = get_channel_layer()
+    maintenant = timezone.now()
+
+    with transaction.atomic():
+        # skip_locked: plusieurs relais peuvent tourner sans se bloquer
+        lot = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(prochain_essai__lte=maintenant)
+            .order_by('id')[:batch_size]
+        )
+        if not lot:
+            return 0
+        NotificationOutbox.objects.filter(id__in=[n.id for n in lot]).update(
+            prochain_essai=maintenant + OUTBOX_CLAIM_TIMEOUT
+        )
+
+    echecs = async_to_sync(_publier_lot)(channel_layer, lot)
+
+    publiees = [notification.id for notification in lot if notification.id not in echecs]
+    with transaction.atomic():
+        NotificationOutbox.objects.filter(id__in=publiees).delete()
+
+        for notification in lot:
+            if notification.id not in echecs:
+                continue
+            groupes, erreur = echecs[notification.id]
+            notification.groupes = groupes
+            notification.tentatives += 1
+            notification.derniere_erreur = erreur
+            if notification.tentatives >= OUTBOX_MAX_TENTATIVES:
+                notification.prochain_essai = None
+                metriques_relais.incrementer('abandonnees')
+                logger.error(f"Notification {notification.id} abandonnée: {erreur}")
+            else:
+                notification.prochain_essai = maintenant + _delai_avant_essai(notification.tentatives)
+            # Le message garde son numéro de journal: un nouvel essai ne le journalise pas deux fois
+            notification.save(update_fields=[
+                'groupes', 'message', 'tentatives', 'derniere_erreur', 'prochain_essai'
+            ])
+
+    fin = timezone.now()
+    for notification in lot:
+        if notification.id not in echecs:
+            metriques_relais.observer(
+                'delai_livraison_s', (fin - notification.date_creation).total_seconds()
+            )
+    metriques_relais.incrementer('publiees', len(publiees))
+    metriques_relais.incrementer('echecs', len(echecs))
+    return len(lot)
+
+
+def relayer(batch_size=OUTBOX_BATCH_SIZE):
+    """Vider l'outbox des notifications dues; retourne le nombre de lignes traitées"""
+    total = 0
+    while True:
+        traitees = relayer_lot(batch_size)
+        total += traitees
+        if traitees < batch_size:
+            return total
+
+
+def mesurer_attente():
+    """Jauges de l'outbox: lignes en attente et âge de la plus ancienne"""
+    from .models import NotificationOutbox
+
+    en_attente = NotificationOutbox.objects.filter(prochain_essai__isnull=False)
+    plus_ancienne = en_attente.order_by('id').values_list('date_creation', flat=True).first()
+
+    metriques_relais.definir('en_attente', en_attente.count())
+    metriques_relais.definir(
+        'age_plus_ancienne_s',
+        (timezone.now() - plus_ancienne).total_seconds() if plus_ancienne else 0
+    )
+    metriques_relais.definir(
+        'abandonnees_en_base',
+        NotificationOutbox.objects.filter(prochain_essai__isnull=True).count()
+    )
@@ -0,0 +1,169 @@
+"""
+Présence WebSocket dans Redis: connexions par processus, membres par groupe
+et utilisateurs uniques (HyperLogLog)
+Fichier: presence.py
+
+Les consumers ne mettent à jour qu'un état en mémoire (aucune écriture Redis
+par connexion ou par message). Toutes les PRESENCE_HEARTBEAT secondes, chaque
+processus écrit son instantané dans un seul pipeline; les clés expirent après
+PRESENCE_TTL, si bien qu'un processus arrêté disparaît des statistiques.
+
+Clés (base REDIS_DATA_URL, voir redis_client.py):
+    presence:nodes                  ensemble des processus
+    presence:node:<processus>       nombre de connexions            (TTL)
+    presence:groups:<processus>     hash groupe -> membres locaux   (TTL)
+    presence:users:day:<AAAAMMJJ>   HyperLogLog des utilisateurs du jour
+    presence:users:hour:<AAAAMMJJHH> HyperLogLog de l'heure
+"""
+
+import asyncio
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+from .metrics import identifiant_processus
+from .redis_client import get_async_redis, get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_HEARTBEAT = 15
+PRESENCE_TTL = 3 * PRESENCE_HEARTBEAT
+
+PRESENCE_NODES_KEY = 'presence:nodes'
+PRESENCE_NODE_KEY = 'presence:node:{}'
+PRESENCE_GROUPS_KEY = 'presence:groups:{}'
+PRESENCE_USERS_DAY_KEY = 'presence:users:day:{:%Y%m%d}'
+PRESENCE_USERS_HOUR_KEY = 'presence:users:hour:{:%Y%m%d%H}'
+
+
+def presence_active():
+    return getattr(settings, 'WEBSOCKET_PRESENCE_ENABLED', True)
+
+
+class PresenceTracker:
+    """État de présence des connexions de ce processus"""
+
+    def __init__(self, sources_groupes=()):
+        self.processus = identifiant_processus()
+        self._connexions = {}  # channel_name -> [user_id, set des groupes]
+        # Fonctions retournant {groupe: membres} d'autres composants (cellules géographiques)
+        self._sources_groupes = list(sources_groupes)
+        self._tache = None
+
+    def __len__(self):
+        return len(self._connexions)
+
+    def connecter(self, channel_name, user_id=None):
+        # Les groupes peuvent avoir été rejoints avant accept()
+        connexion = self._connexions.setdefault(channel_name, [None, set()])
+        connexion[0] = str(user_id) if user_id else None
+        self._demarrer()
+
+    def deconnecter(self, channel_name):
+        self._connexions.pop(channel_name, None)
+
+    def rejoindre(self, channel_name, groupe):
+        self._connexions.setdefault(channel_name, [None, set()])[1].add(groupe)
+
+    def quitter(self, channel_name, groupe):
+        connexion = self._connexions.get(channel_name)
+        if connexion:
+            connexion[1].discard(groupe)
+
+    def ajouter_source_groupes(self, source):
+        self._sources_groupes.append(source)
+
+    def instantane(self):
+        groupes = Counter()
+        utilisateurs = set()
+        for user_id, groupes_connexion in self._connexions.values():
+            groupes.update(groupes_connexion)
+            if user_id:
+                utilisateurs.add(user_id)
+        for source in self._sources_groupes:
+            groupes.update(source())
+        return len(self._connexions), groupes, utilisateurs
+
+    def _demarrer(self):
+        if not presence_active():
+            return
+        if self._tache is not None and not self._tache.done() \
+                and self._tache.get_loop() is asyncio.get_running_loop():
+            return
+        self._tache = asyncio.ensure_future(self._boucle())
+
+    async def _boucle(self):
+        while True:
+            try:
+                await self.publier()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur publication de la présence WebSocket: {e}")
+            await asyncio.sleep(PRESENCE_HEARTBEAT)
+
+    async def publier(self):
+        """Écrire l'instantané du processus en un seul pipeline Redis"""
+        connexions, groupes, utilisateurs = self.instantane()
+        maintenant = datetime.now(dt_timezone.utc)
+        cle_groupes = PRESENCE_GROUPS_KEY.format(self.processus)
+
+        pipe = get_async_redis().pipeline(transaction=True)
+        pipe.sadd(PRESENCE_NODES_KEY, self.processus)
+        pipe.expire(PRESENCE_NODES_KEY, 24 * 60 * 60)
+        pipe.set(PRESENCE_NODE_KEY.format(self.processus), connexions, ex=PRESENCE_TTL)
+        pipe.delete(cle_groupes)
+        if groupes:
+            pipe.hset(cle_groupes, mapping=dict(groupes))
+            pipe.expire(cle_groupes, PRESENCE_TTL)
+        if utilisateurs:
+            for cle, ttl in (
+                (PRESENCE_USERS_DAY_KEY.format(maintenant), 2 * 24 * 60 * 60),
+                (PRESENCE_USERS_HOUR_KEY.format(maintenant), 2 * 60 * 60),
+            ):
+                pipe.pfadd(cle, *utilisateurs)
+                pipe.expire(cle, ttl)
+        await pipe.execute()
+
+
+def lire_presence(top_groupes=20):
+    """Agréger la présence de tous les processus vivants (vues d'administration)"""
+    client = get_redis()
+    maintenant = datetime.now(dt_timezone.utc)
+
+    processus = sorted(client.smembers(PRESENCE_NODES_KEY))
+    comptes = client.mget([PRESENCE_NODE_KEY.format(p) for p in processus]) if processus else []
+
+    noeuds = {}
+    morts = []
+    for nom, compte in zip(processus, comptes):
+        if compte is None:
+            morts.append(nom)
+        else:
+            noeuds[nom] = int(compte)
+    if morts:
+        client.srem(PRESENCE_NODES_KEY, *morts)
+
+    pipe = client.pipeline(transaction=False)
+    for nom in noeuds:
+        pipe.hgetall(PRESENCE_GROUPS_KEY.format(nom))
+    groupes = Counter()
+    for membres in pipe.execute():
+        groupes.update({groupe: int(nombre) for groupe, nombre in membres.items()})
+
+    return {
+        'connexions_totales': sum(noeuds.values()),
+        'connexions_par_processus': noeuds,
+        'groupes': dict(groupes.most_common(top_groupes)),
+        'nombre_groupes': len(groupes),
+        'utilisateurs_uniques': {
+            'jour': client.pfcount(PRESENCE_USERS_DAY_KEY.format(maintenant)),
+            'heure': client.pfcount(PRESENCE_USERS_HOUR_KEY.format(maintenant)),
+        },
+    }
+
+
+# Instance par processus
+presence = PresenceTracker()
@@ -0,0 +1,200 @@
+"""
+Limitation de débit distribuée par seau à jetons (Redis + script Lua)
+Fichier: rate_limit.py
+
+Chaque décision coûte au plus un appel Redis (script atomique, O(1)) et
+souvent aucun:
+- un seau local par identifiant refuse sans Redis quand il est vide (la
+  consommation globale est toujours au moins égale à la consommation locale);
+- après un refus de Redis, l'identifiant est bloqué localement pendant le
+  délai indiqué par le script.
+Si Redis est indisponible, la décision du seau local s'applique.
+"""
+
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .redis_client import get_async_redis, get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (capacité en jetons, jetons regagnés par seconde); surchargeables via settings.RATE_LIMITS
+LIMITES_PAR_DEFAUT = {
+    'ws_connexion': (10, 10 / 60),
+    'ws_message': (60, 1.0),
+    'geo_fournisseur': (30, 0.5),
+}
+
+RATE_LIMIT_KEY_PREFIX = 'ratelimit'
+
+# Nombre maximal d'identifiants suivis localement (les plus anciens sont oubliés)
+LOCAL_BUCKETS_MAX = 10000
+
+# Après une erreur Redis, décisions locales seules pendant ce délai (secondes)
+REDIS_RETRY_DELAY = 5
+
+TOKEN_BUCKET_LUA = """
+local capacite = tonumber(ARGV[1])
+local debit = tonumber(ARGV[2])
+local cout = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local maintenant = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local etat = redis.call('HMGET', KEYS[1], 'jetons', 'ts')
+local jetons = tonumber(etat[1]) or capacite
+local ts = tonumber(etat[2]) or maintenant
+jetons = math.min(capacite, jetons + math.max(0, maintenant - ts) * debit)
+local autorise = 0
+local attente = 0
+if jetons >= cout then
+    jetons = jetons - cout
+    autorise = 1
+else
+    attente = (cout - jetons) / debit
+end
+redis.call('HSET', KEYS[1], 'jetons', tostring(jetons), 'ts', tostring(maintenant))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacite / debit) + 1)
+return {autorise, tostring(attente)}
+"""
+
+
+def get_limite(nom):
+    return getattr(settings, 'RATE_LIMITS', {}).get(nom, LIMITES_PAR_DEFAUT[nom])
+
+
+class TokenBucketLimiter:
+    """Seau à jetons partagé entre les processus, identifié par `nom`"""
+
+    def __init__(self, nom, capacite=None, debit=None):
+        capacite_defaut, debit_defaut = get_limite(nom)
+        self.nom = nom
+        self.capacite = capacite or capacite_defaut
+        self.debit = debit or debit_defaut
+        self._seaux = OrderedDict()    # identifiant -> [jetons, horodatage]
+        self._bloques = {}             # identifiant -> fin du blocage (monotonic)
+        self._script_sync = None
+        self._script_async = None
+        self._redis_indisponible_jusqua = 0.0
+
+    def _cle(self, identifiant):
+        return f'{RATE_LIMIT_KEY_PREFIX}:{self.nom}:{identifiant}'
+
+    def _decision_locale(self, identifiant, cout):
+        """Seau local: (autorisé, attente). Met aussi à jour l'état local."""
+        maintenant = time.monotonic()
+
+        fin_blocage = self._bloques.get(identifiant)
+        if fin_blocage is not None:
+            if fin_blocage > maintenant:
+                return False, fin_blocage - maintenant
+            del self._bloques[identifiant]
+
+        seau = self._seaux.get(identifiant)
+        if seau is None:
+            seau = self._seaux[identifiant] = [self.capacite, maintenant]
+            if len(self._seaux) > LOCAL_BUCKETS_MAX:
+                ancien, _ = self._seaux.popitem(last=False)
+                self._bloques.pop(ancien, None)
+        else:
+            self._seaux.move_to_end(identifiant)
+            seau[0] = min(self.capacite, seau[0] + (maintenant - seau[1]) * self.debit)
+            seau[1] = maintenant
+
+        if seau[0] < cout:
+            return False, (cout - seau[0]) / self.debit
+        seau[0] -= cout
+        return True, 0
+
+    def _redis_disponible(self):
+        return time.monotonic() >= self._redis_indisponible_jusqua
+
+    def _erreur_redis(self, erreur):
+        self._redis_indisponible_jusqua = time.monotonic() + REDIS_RETRY_DELAY
+        logger.error(f"Limiteur {self.nom}: Redis indisponible, décisions locales ({erreur})")
+
+    def _apres_redis(self, identifiant, resultat):
+        autorise, attente = bool(int(resultat[0])), float(resultat[1])
+        if not autorise:
+            self._bloques[identifiant] = time.monotonic() + attente
+        return autorise, attente
+
+    def autoriser(self, identifiant, cout=1):
+        """Consommer `cout` jetons: retourne (autorisé, secondes avant réessai)"""
+        autorise, attente = self._decision_locale(identifiant, cout)
+        if not autorise or not self._redis_disponible():
+            return autorise, attente
+        try:
+            client = get_redis()
+            if self._script_sync is None:
+                self._script_sync = client.register_script(TOKEN_BUCKET_LUA)
+            resultat = self._script_sync(
+                keys=[self._cle(identifiant)], args=[self.capacite, self.debit, cout], client=client
+            )
+        except Exception as e:
+            self._erreur_redis(e)
+            return True, 0
+        return self._apres_redis(identifiant, resultat)
+
+    async def autoriser_async(self, identifiant, cout=1):
+        """Version asynchrone de autoriser() pour les consumers"""
+        autorise, attente = self._decision_locale(identifiant, cout)
+        if not autorise or not self._redis_disponible():
+            return autorise, attente
+        try:
+            # Client lié à la boucle courante: passé explicitement au script
+            client = get_async_redis()
+            if self._script_async is None:
+                self._script_async = client.register_script(TOKEN_BUCKET_LUA)
+            resultat = await self._script_async(
+                keys=[self._cle(identifiant)], args=[self.capacite, self.debit, cout], client=client
+            )
+        except Exception as e:
+            self._erreur_redis(e)
+            return True, 0
+        return self._apres_redis(identifiant, resultat)
+
+
+def ip_depuis_scope(scope):
+    """
+    Adresse IP du client d'une connexion ASGI.
+    Seules les entrées de X-Forwarded-For ajoutées par les proxys de confiance
+    (REST_FRAMEWORK['NUM_PROXIES'], comme les limites DRF) sont retenues: les
+    premières entrées sont fournies par le client et falsifiables
+    """
+    client = scope.get('client')
+    adresse_directe = client[0] if client else 'inconnu'
+    nombre_proxys = api_settings.NUM_PROXIES
+    if nombre_proxys is None:
+        nombre_proxys = 1
+    if not nombre_proxys:
+        return adresse_directe
+    for nom, valeur in scope.get('headers', []):
+        if nom == b'x-forwarded-for':
+            adresses = [a.strip() for a in valeur.decode('latin1').split(',') if a.strip()]
+            if adresses:
+                return adresses[-min(nombre_proxys, len(adresses))]
+    return adresse_directe
+
+
+class GeoProviderThrottle(BaseThrottle):
+    """Limite DRF des vues /geo/* qui appellent des fournisseurs externes (Nominatim, ip-api)"""
+
+    limiter = TokenBucketLimiter('geo_fournisseur')
+
+    def allow_request(self, request, view):
+        user = getattr(request, 'user', None)
+        identifiant = f'user:{user.pk}' if user and user.is_authenticated else self.get_ident(request)
+        autorise, self.attente = self.limiter.autoriser(identifiant)
+        return autorise
+
+    def wait(self):
+        return self.attente
+
+
+# Limiteurs WebSocket (par adresse IP)
+limiteur_connexions_ws = TokenBucketLimiter('ws_connexion')
+limiteur_messages_ws = TokenBucketLimiter('ws_message')
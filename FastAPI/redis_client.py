@@ -0,0 +1,49 @@
+"""
+Clients Redis partagés pour les données temps réel (présence, limites, flux)
+Fichier: redis_client.py
+
+Base séparée de celles du channel layer (0) et du cache (1): REDIS_DATA_URL.
+Le client asynchrone est créé par boucle asyncio (les connexions y sont liées).
+"""
+
+import asyncio
+import threading
+
+from django.conf import settings
+import redis
+import redis.asyncio as redis_async
+
+_client = None
+_clients_async = {}
+_verrou = threading.Lock()
+
+
+def get_redis_url():
+    return getattr(
+        settings, 'REDIS_DATA_URL',
+        f'redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/2'
+    )
+
+
+def get_redis():
+    """Client Redis synchrone (vues, commandes de gestion)"""
+    global _client
+    if _client is None:
+        with _verrou:
+            if _client is None:
+                _client = redis.Redis.from_url(get_redis_url(), decode_responses=True)
+    return _client
+
+
+def get_async_redis():
+    """Client Redis asynchrone de la boucle courante (consumers)"""
+    boucle = asyncio.get_running_loop()
+    client = _clients_async.get(boucle)
+    if client is None:
+        # Oublier les clients des boucles fermées (tests, async_to_sync)
+        for ancienne in [b for b in _clients_async if b.is_closed()]:
+            del _clients_async[ancienne]
+        client = _clients_async[boucle] = redis_async.Redis.from_url(
+            get_redis_url(), decode_responses=True
+        )
+    return client
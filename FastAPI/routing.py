@@ -1,9 +1,16 @@
 from django.urls import path
 from . import consumers
+from . import stream_views
 
 websocket_urlpatterns = [
     path('ws/events/', consumers.EventNotificationConsumer.as_asgi()),
+    path('ws/stream/', consumers.StreamConsumer.as_asgi()),
     path('ws/personal/', consumers.PersonalNotificationConsumer.as_asgi()),
     path('ws/location/<str:latitude>/<str:longitude>/', consumers.LocationBasedConsumer.as_asgi()),
     path('ws/location/<str:latitude>/<str:longitude>/<int:radius>/', consumers.LocationBasedConsumer.as_asgi()),
-]
\ No newline at end of file
+]
+
+# Routes HTTP servies avant l'application Django (voir lome_explorer/asgi.py)
+http_urlpatterns = [
+    path('fastapi/stream/events/', stream_views.application_sse),
+]
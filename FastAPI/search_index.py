@@ -0,0 +1,355 @@
+"""
+Index de préfixes en mémoire pour l'autocomplétion des noms
+Fichier: search_index.py
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import time
+import unicodedata
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Clé partagée entre les processus pour savoir si un autre worker a modifié les données
+GENERATION_CACHE_KEY = 'autocomplete_index_generation'
+
+# Journal partagé: objet modifié à chaque génération, rejoué par les autres processus
+JOURNAL_CACHE_KEY = 'autocomplete_index_modification_{}'
+JOURNAL_TIMEOUT = 3600
+
+# Au-delà de ce retard, reconstruction complète (en arrière-plan) plutôt que rejeu
+JOURNAL_MAX_RATTRAPAGE = 200
+
+# Fréquence maximale de vérification de la génération partagée (secondes)
+GENERATION_CHECK_INTERVAL = 1.0
+
+TYPE_LIEU = 'lieu'
+TYPE_EVENEMENT = 'evenement'
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normaliser(texte):
+    """Normaliser un nom: minuscules, sans accents ni ponctuation"""
+    if not texte:
+        return ''
+    decompose = unicodedata.normalize('NFKD', str(texte))
+    sans_accents = ''.join(c for c in decompose if not unicodedata.combining(c))
+    return _NON_ALNUM.sub(' ', sans_accents.lower()).strip()
+
+
+def _tokens(nom_normalise):
+    """Suffixes du nom commençant à chaque mot ("grand marche" -> "grand marche", "marche")"""
+    mots = nom_normalise.split()
+    return {' '.join(mots[i:]) for i in range(len(mots))}
+
+
+class PrefixIndex:
+    """
+    Tableau trié de clés normalisées interrogé par recherche dichotomique.
+    Chaque entrée est indexée sous tous ses suffixes de mots pour que
+    "tokoin" retrouve "Marché de Tokoin".
+    """
+
+    def __init__(self):
+        self._cles = []       # [(token, type, id)] trié
+        self._entrees = {}    # (type, id) -> {'tokens': set, 'data': dict, 'expire': datetime|None}
+        self._expirations = []  # tas [(date_debut, id)] des événements indexés
+        self._lock = threading.RLock()
+        self._construit = False
+        self._generation = None
+        self._derniere_verification = 0.0
+        self._reconstruction_en_cours = False
+
+    # ------------------------------------------------------------------
+    # Construction et synchronisation
+    # ------------------------------------------------------------------
+
+    def construire(self):
+        """(Re)construire l'index complet depuis la base"""
+        from .models import Lieu, Evenement
+
+        # Lire la génération avant la base pour ne manquer aucune écriture concurrente
+        generation = cache.get(GENERATION_CACHE_KEY)
+        cles = []
+        entrees = {}
+        expirations = []
+
+        for lieu in Lieu.objects.values('id', 'nom', 'categorie'):
+            data = {
+                'type': TYPE_LIEU,
+                'id': str(lieu['id']),
+                'nom': lieu['nom'],
+                'categorie': lieu['categorie'],
+            }
+            self._preparer(cles, entrees, TYPE_LIEU, data, None)
+
+        evenements = Evenement.objects.filter(
+            date_debut__gt=timezone.now()
+        ).values('id', 'nom', 'date_debut', 'lieu__nom')
+        for evt in evenements:
+            data = {
+                'type': TYPE_EVENEMENT,
+                'id': str(evt['id']),
+                'nom': evt['nom'],
+                'date_debut': evt['date_debut'].isoformat(),
+                'lieu_nom': evt['lieu__nom'],
+            }
+            self._preparer(cles, entrees, TYPE_EVENEMENT, data, evt['date_debut'])
+            expirations.append((evt['date_debut'], data['id']))
+
+        cles.sort()
+        heapq.heapify(expirations)
+
+        with self._lock:
+            self._cles = cles
+            self._entrees = entrees
+            self._expirations = expirations
+            self._construit = True
+            self._generation = generation
+            self._derniere_verification = time.monotonic()
+
+        logger.info(f"Index d'autocomplétion construit: {len(entrees)} entrées")
+
+    @staticmethod
+    def _preparer(cles, entrees, type_objet, data, expire):
+        tokens = _tokens(normaliser(data['nom']))
+        entrees[(type_objet, data['id'])] = {'tokens': tokens, 'data': data, 'expire': expire}
+        cles.extend((token, type_objet, data['id']) for token in tokens)
+
+    def _assurer_a_jour(self):
+        """
+        Construire l'index au premier appel, puis rejouer les modifications
+        des autres processus objet par objet. Une reconstruction complète
+        n'a lieu qu'en arrière-plan, si le journal ne suffit plus.
+        """
+        if not self._construit:
+            with self._lock:
+                if not self._construit:
+                    self.construire()
+            return
+
+        maintenant = time.monotonic()
+        if maintenant - self._derniere_verification < GENERATION_CHECK_INTERVAL:
+            return
+        self._derniere_verification = maintenant
+
+        self._purger_expires()
+
+        generation = cache.get(GENERATION_CACHE_KEY) or 0
+        locale = self._generation or 0
+        if generation == locale:
+            return
+        if generation < locale or generation - locale > JOURNAL_MAX_RATTRAPAGE:
+            self._reconstruire_en_arriere_plan()
+            return
+
+        journal = cache.get_many([
+            JOURNAL_CACHE_KEY.format(numero) for numero in range(locale + 1, generation + 1)
+        ])
+        if len(journal) != generation - locale:
+            # Entrées expirées ou pas encore écrites: le rejeu serait incomplet
+            self._reconstruire_en_arriere_plan()
+            return
+
+        self._rejouer(set(journal.values()))
+        with self._lock:
+            if (self._generation or 0) == locale:
+                self._generation = generation
+
+    def _rejouer(self, modifications):
+        """Relire depuis la base les seuls objets modifiés par d'autres processus"""
+        from .models import Lieu, Evenement
+
+        lieux = {objet_id for type_objet, objet_id in modifications if type_objet == TYPE_LIEU}
+        evenements = {objet_id for type_objet, objet_id in modifications if type_objet == TYPE_EVENEMENT}
+
+        lieux_trouves = {
+            str(lieu['id']): lieu
+            for lieu in Lieu.objects.filter(id__in=lieux).values('id', 'nom', 'categorie')
+        } if lieux else {}
+        evenements_trouves = {
+            str(evt['id']): evt
+            for evt in Evenement.objects.filter(
+                id__in=evenements, date_debut__gt=timezone.now()
+            ).values('id', 'nom', 'date_debut', 'lieu__nom')
+        } if evenements else {}
+
+        with self._lock:
+            for objet_id in lieux:
+                lieu = lieux_trouves.get(objet_id)
+                if lieu is None:
+                    self._retirer(TYPE_LIEU, objet_id)
+                else:
+                    self._ajouter(TYPE_LIEU, {
+                        'type': TYPE_LIEU,
+                        'id': objet_id,
+                        'nom': lieu['nom'],
+                        'categorie': lieu['categorie'],
+                    })
+            for objet_id in evenements:
+                evt = evenements_trouves.get(objet_id)
+                if evt is None:
+                    self._retirer(TYPE_EVENEMENT, objet_id)
+                else:
+                    self._ajouter(TYPE_EVENEMENT, {
+                        'type': TYPE_EVENEMENT,
+                        'id': objet_id,
+                        'nom': evt['nom'],
+                        'date_debut': evt['date_debut'].isoformat(),
+                        'lieu_nom': evt['lieu__nom'],
+                    }, expire=evt['date_debut'])
+
+    def _reconstruire_en_arriere_plan(self):
+        """Reconstruire l'index hors du thread de requête; l'ancien reste servi d'ici là"""
+        with self._lock:
+            if self._reconstruction_en_cours:
+                return
+            self._reconstruction_en_cours = True
+
+        def reconstruire():
+            try:
+                self.construire()
+            except Exception as e:
+                logger.error(f"Erreur reconstruction index autocomplétion: {e}")
+            finally:
+                self._reconstruction_en_cours = False
+                connection.close()
+
+        threading.Thread(target=reconstruire, name='autocomplete-index', daemon=True).start()
+
+    def _purger_expires(self):
+        """Retirer de l'index les événements déjà commencés"""
+        maintenant = timezone.now()
+        with self._lock:
+            while self._expirations and self._expirations[0][0] <= maintenant:
+                expire, objet_id = heapq.heappop(self._expirations)
+                entree = self._entrees.get((TYPE_EVENEMENT, objet_id))
+                # Entrée du tas périmée si l'événement a été déplacé depuis
+                if entree is not None and entree['expire'] == expire:
+                    self._retirer(TYPE_EVENEMENT, objet_id)
+
+    def _marquer_modification(self, type_objet, objet_id):
+        """Publier une modification locale dans le journal partagé, après le commit"""
+        def publier():
+            cache.add(GENERATION_CACHE_KEY, 0, None)
+            generation = cache.incr(GENERATION_CACHE_KEY)
+            cache.set(JOURNAL_CACHE_KEY.format(generation), (type_objet, objet_id), JOURNAL_TIMEOUT)
+
+            # Si un autre processus a écrit entre-temps, son entrée sera
+            # rejouée à la prochaine vérification
+            with self._lock:
+                if (self._generation or 0) + 1 == generation:
+                    self._generation = generation
+
+        transaction.on_commit(publier)
+
+    # ------------------------------------------------------------------
+    # Mises à jour incrémentales (appelées par les signaux)
+    # ------------------------------------------------------------------
+
+    def _retirer(self, type_objet, objet_id):
+        entree = self._entrees.pop((type_objet, objet_id), None)
+        if not entree:
+            return
+        for token in entree['tokens']:
+            cle = (token, type_objet, objet_id)
+            position = bisect.bisect_left(self._cles, cle)
+            if position < len(self._cles) and self._cles[position] == cle:
+                del self._cles[position]
+
+    def _ajouter(self, type_objet, data, expire=None):
+        self._retirer(type_objet, data['id'])
+        tokens = _tokens(normaliser(data['nom']))
+        self._entrees[(type_objet, data['id'])] = {'tokens': tokens, 'data': data, 'expire': expire}
+        for token in tokens:
+            bisect.insort(self._cles, (token, type_objet, data['id']))
+        if expire is not None:
+            heapq.heappush(self._expirations, (expire, data['id']))
+
+    def mettre_a_jour_lieu(self, lieu):
+        if self._construit:
+            with self._lock:
+                self._ajouter(TYPE_LIEU, {
+                    'type': TYPE_LIEU,
+                    'id': str(lieu.id),
+                    'nom': lieu.nom,
+                    'categorie': lieu.categorie,
+                })
+        self._marquer_modification(TYPE_LIEU, str(lieu.id))
+
+    def supprimer_lieu(self, lieu_id):
+        if self._construit:
+            with self._lock:
+                self._retirer(TYPE_LIEU, str(lieu_id))
+        self._marquer_modification(TYPE_LIEU, str(lieu_id))
+
+    def mettre_a_jour_evenement(self, evenement):
+        if self._construit:
+            with self._lock:
+                if evenement.date_debut > timezone.now():
+                    self._ajouter(TYPE_EVENEMENT, {
+                        'type': TYPE_EVENEMENT,
+                        'id': str(evenement.id),
+                        'nom': evenement.nom,
+                        'date_debut': evenement.date_debut.isoformat(),
+                        'lieu_nom': evenement.lieu.nom,
+                    }, expire=evenement.date_debut)
+                else:
+                    self._retirer(TYPE_EVENEMENT, str(evenement.id))
+        self._marquer_modification(TYPE_EVENEMENT, str(evenement.id))
+
+    def supprimer_evenement(self, evenement_id):
+        if self._construit:
+            with self._lock:
+                self._retirer(TYPE_EVENEMENT, str(evenement_id))
+        self._marquer_modification(TYPE_EVENEMENT, str(evenement_id))
+
+    # ------------------------------------------------------------------
+    # Recherche
+    # ------------------------------------------------------------------
+
+    def rechercher(self, query, limit=10, types=None):
+        """Retourner les entrées dont un mot du nom commence par `query`"""
+        prefixe = normaliser(query)
+        if not prefixe:
+            return []
+
+        self._assurer_a_jour()
+
+        maintenant = timezone.now()
+        resultats = []
+        vus = set()
+
+        with self._lock:
+            position = bisect.bisect_left(self._cles, (prefixe,))
+            while position < len(self._cles) and len(resultats) < limit:
+                token, type_objet, objet_id = self._cles[position]
+                position += 1
+
+                if not token.startswith(prefixe):
+                    break
+                if types and type_objet not in types:
+                    continue
+                if (type_objet, objet_id) in vus:
+                    continue
+                vus.add((type_objet, objet_id))
+
+                entree = self._entrees[(type_objet, objet_id)]
+                # Entre deux purges, les événements déjà commencés sont ignorés
+                if entree['expire'] is not None and entree['expire'] <= maintenant:
+                    continue
+                resultats.append(entree['data'])
+
+        return resultats
+
+
+# Instance par processus
+autocomplete_index = PrefixIndex()
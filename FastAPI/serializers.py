@@ -190,9 +190,9 @@ class EvenementSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'nom', 'description', 'date_debut', 'date_fin', 'lieu',
             'lieu_nom', 'lieu_latitude', 'lieu_longitude', 'organisateur_id', 'organisateur', 'organisateur_nom', 'moyenne_avis',
-            'nombre_avis'
+            'nombre_avis', 'version'
         ]
-        read_only_fields = ['id', 'organisateur']
+        read_only_fields = ['id', 'organisateur', 'version']
 
     def get_organisateur_id(self, obj):
         """Retourne l'UUID de l'organisateur en string"""
@@ -225,7 +225,7 @@ class EvenementDetailSerializer(serializers.ModelSerializer):
 
     class Meta(EvenementSerializer.Meta):
         fields = EvenementSerializer.Meta.fields + ['lieu_details', 'avis']
-        read_only_fields = ['id', 'organisateur']
+        read_only_fields = ['id', 'organisateur', 'version']
 
     def get_organisateur_id(self, obj):
         """Retourne l'UUID de l'organisateur en string"""
@@ -436,17 +436,31 @@ class EvenementListSerializer(serializers.ModelSerializer):
             'id', 'nom', 'description', 'date_debut', 'date_fin',
             'lieu', 'lieu_nom', 'lieu_latitude', 'lieu_longitude',
             'organisateur_id', 'organisateur_nom',
-            'moyenne_avis', 'nombre_avis'
+            'moyenne_avis', 'nombre_avis', 'version'
         ]
 
     def get_organisateur_id(self, obj):
         """Retourne l'UUID de l'organisateur en string"""
         return str(obj.organisateur.id)
+    
+    def to_delta(self, champs_modele):
+        """
+        Représentation des seuls champs qui dépendent des champs de modèle
+        `champs_modele` (deltas event_patch, voir signals.py)
+        """
+        delta = {}
+        for nom, field in self.fields.items():
+            if field.source_attrs and field.source_attrs[0] in champs_modele:
+                delta[nom] = field.to_representation(field.get_attribute(self.instance))
+        if 'organisateur' in champs_modele:
+            delta['organisateur_id'] = self.get_organisateur_id(self.instance)
+        return delta
 
     def get_moyenne_avis(self, obj):
-        avis = obj.avis.all()
-        if avis.exists():
-            return round(sum(avis.values_list('note', flat=True)) / avis.count(), 1)
+        # Notes lues depuis les avis préchargés (prefetch_related('avis')) sans requête
+        notes = [avis.note for avis in obj.avis.all()]
+        if notes:
+            return round(sum(notes) / len(notes), 1)
         return None
     
     def get_nombre_avis(self, obj):
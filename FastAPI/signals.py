@@ -1,10 +1,25 @@
+from django.db.models import Avg, Count, prefetch_related_objects
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from .models import Evenement, Lieu, AvisEvenement, AvisLieu
+from .models import Evenement, Lieu, AvisEvenement, AvisLieu, Utilisateur
 from .serializers import EvenementListSerializer, LieuListSerializer
-from .geolocation_services import GeolocationService
+from .subscriber_index import message_localisation
+from .geo_cells import publish_groups
+from .notification_outbox import enregistrer_notification
+from .websocket_utils import DynamicGroupManager
+from .user_notifications import creer_notifications
+from .notification_frames import (
+    cle_fusion_evenement, frame_avis_evenement, frame_evenement, frame_lieu,
+    frame_patch_evenement, frames_localisation, resume_evenement
+)
+from .search_index import autocomplete_index
+from .categories import invalider_categories
+from .cache_utils import bump_generation
+from .zone_snapshots import invalider_zone
+from .subscription_filters import attributs_evenement
+from .event_reminders import envoyer_rappels, planifier_rappels
+from .statistiques import StatistiquesService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,38 +27,29 @@ channel_layer = get_channel_layer()
 
 
 def send_to_websocket(group_name, message_type, data):
-    """Fonction utilitaire pour envoyer des messages WebSocket"""
-    print(f"🔧 send_to_websocket appelée:")
-    print(f"   Groupe: {group_name}")
-    print(f"   Type: {message_type}")
-    print(f"   Data keys: {data.keys()}")
+    """
+    Mettre un message WebSocket en file dans l'outbox de la transaction courante.
+    Il est publié après le commit par le relais (voir notification_outbox.py).
+    `group_name` peut être une liste: un seul message (un seul seq) pour tous
+    les groupes, qu'un client abonné à plusieurs d'entre eux ne reçoit qu'une fois.
+    """
+    groupes = [group_name] if isinstance(group_name, str) else list(group_name)
     try:
-        print(f"   Channel layer: {channel_layer}")
-        print(f"   Préparation du message...")
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': message_type,
-                **data
-            }
-        )
-        print(f"✅ Message envoyé au groupe {group_name}")
-        logger.info(f"✅ Message envoyé au groupe {group_name}")
+        enregistrer_notification(groupes, {'type': message_type, **data})
+        logger.info(f"📥 Notification mise en file pour le groupe {group_name}")
     except Exception as e:
-        print(f"❌ ERREUR dans send_to_websocket: {e}")
-        import traceback
-        traceback.print_exc()
-        logger.error(f"Erreur envoi WebSocket vers {group_name}: {e}")
+        logger.error(f"Erreur mise en file WebSocket vers {group_name}: {e}")
 
 
 @receiver(post_save, sender=Evenement)
 def evenement_created_or_updated(sender, instance, created, **kwargs):
     """Signal déclenché lors de la création/modification d'un événement"""
     
-    # Sérialiser l'événement
-    event_data = EvenementListSerializer(instance).data
-    
     if created:
+        # Sérialiser l'événement une seule fois (avis préchargés: une requête)
+        prefetch_related_objects([instance], 'avis')
+        event_data = EvenementListSerializer(instance).data
+        
         # Nouvel événement créé
         print("=" * 80)
         print(f"🔔 SIGNAL POST_SAVE DÉCLENCHÉ: {instance.nom}")
@@ -60,12 +66,14 @@ def evenement_created_or_updated(sender, instance, created, **kwargs):
             return
         
         print(f"✅ Channel layer: {channel_layer}")
-        
-        # Sérialiser l'événement
-        event_data = EvenementListSerializer(instance).data
-        
         print(f"📦 Event data sérialisé: {event_data}")
         
+        # Trame client encodée une fois pour tous les groupes et destinataires;
+        # flux global et catégories: résumé (détail chargé par l'API REST)
+        frame = frame_evenement('new_event', resume_evenement(event_data))
+        # Évalués par les filtres d'abonnement des consumers sans décoder la trame
+        attributs = attributs_evenement(instance, event_data['moyenne_avis'])
+        
         # Notification globale
         try:
             print(f"📤 Envoi vers groupe: events_notifications")
@@ -74,7 +82,7 @@ def evenement_created_or_updated(sender, instance, created, **kwargs):
             send_to_websocket(
                 'events_notifications',
                 'new_event_notification',
-                {'event_data': event_data}
+                {'frame': frame, 'attributs': attributs}
             )
             
             print("✅ send_to_websocket exécuté sans erreur")
@@ -97,65 +105,65 @@ def evenement_created_or_updated(sender, instance, created, **kwargs):
             send_to_websocket(
                 category_group,
                 'new_event_notification',
-                {'event_data': event_data}
+                {'frame': frame, 'attributs': attributs}
             )
     
     else:
-        # Événement modifié
+        # Événement modifié (les sauvegardes sans changement n'arrivent pas ici):
+        # seuls les abonnés de l'événement (écran de détail, participants) sont notifiés
         logger.info(f"Événement modifié: {instance.nom}")
+        champs = getattr(instance, 'derniers_champs_modifies', None)
+        groupe_evenement = DynamicGroupManager.create_event_group(instance.id)
         
+        if champs is None or 'lieu' in champs:
+            # Champs modifiés inconnus, ou événement déplacé: événement complet
+            prefetch_related_objects([instance], 'avis')
+            event_data = EvenementListSerializer(instance).data
+            send_to_websocket(
+                groupe_evenement,
+                'event_updated_notification',
+                {
+                    'frame': frame_evenement('event_updated', event_data),
+                    'coalesce_key': cle_fusion_evenement(instance.id)
+                }
+            )
+            if champs is not None:
+                # Déplacé: l'événement apparaît aux abonnés de sa nouvelle zone
+                send_location_based_notifications(instance, event_data, 'event_updated')
+            return
+        
+        # Delta: seuls les champs modifiés, sans fusion dans les files sortantes
+        # (chaque version doit parvenir au client pour être appliquée)
+        delta = EvenementListSerializer(instance).to_delta(champs)
         send_to_websocket(
-            'events_notifications',
+            groupe_evenement,
             'event_updated_notification',
-            {'event_data': event_data}
+            {'frame': frame_patch_evenement(str(instance.id), instance.version, delta)}
         )
-        
-        send_location_based_notifications(instance, event_data, 'event_updated')
 
 
 def send_location_based_notifications(evenement, event_data, notification_type):
-    """Envoyer des notifications basées sur la localisation"""
+    """
+    Mettre en file (outbox) un événement géolocalisé pour les cellules de son
+    lieu, une par niveau. Chaque processus ASGI le remet à ses abonnés dont
+    le cercle contient le lieu (voir geo_cells.py et subscriber_index.py).
+    """
     try:
-        # Calculer les zones géographiques concernées
         lieu = evenement.lieu
-        lat_zone = int(float(lieu.latitude) * 100)
-        lng_zone = int(float(lieu.longitude) * 100)
-        
-        # Envoyer à la zone principale
-        location_group = f'location_{lat_zone}_{lng_zone}'
-        send_to_websocket(
-            location_group,
-            f'{notification_type}_notification',
-            {'event_data': event_data}
+        enregistrer_notification(
+            publish_groups(float(lieu.latitude), float(lieu.longitude)),
+            message_localisation(
+                lieu.latitude,
+                lieu.longitude,
+                frames_localisation(notification_type, event_data),
+                # Les modifications successives d'un événement se remplacent
+                coalesce_key=(
+                    cle_fusion_evenement(evenement.id)
+                    if notification_type == 'event_updated' else None
+                ),
+                attributs=attributs_evenement(evenement, event_data.get('moyenne_avis'))
+            )
         )
-        
-        # Envoyer aux zones adjacentes (rayon élargi)
-        for lat_offset in [-1, 0, 1]:
-            for lng_offset in [-1, 0, 1]:
-                if lat_offset == 0 and lng_offset == 0:
-                    continue  # Zone principale déjà traitée
-                
-                adjacent_group = f'location_{lat_zone + lat_offset}_{lng_zone + lng_offset}'
-                
-                # Calculer la distance pour les zones adjacentes
-                geo_service = GeolocationService()
-                center_lat = (lat_zone + lat_offset) / 100.0
-                center_lng = (lng_zone + lng_offset) / 100.0
-                
-                distance = geo_service.calculate_distance(
-                    (float(lieu.latitude), float(lieu.longitude)),
-                    (center_lat, center_lng)
-                )
-                
-                if distance and distance <= 15:  # 15km de rayon
-                    send_to_websocket(
-                        adjacent_group,
-                        'proximity_event_notification',
-                        {
-                            'event_data': event_data,
-                            'distance': distance
-                        }
-                    )
     
     except Exception as e:
         logger.error(f"Erreur notifications basées localisation: {e}")
@@ -175,9 +183,12 @@ def evenement_deleted(sender, instance, **kwargs):
     }
     
     send_to_websocket(
-        'events_notifications',
+        DynamicGroupManager.create_event_group(instance.id),
         'event_cancelled_notification',
-        {'event_data': event_data}
+        {
+            'frame': frame_evenement('event_cancelled', event_data),
+            'coalesce_key': cle_fusion_evenement(instance.id)
+        }
     )
 
 
@@ -188,14 +199,15 @@ def lieu_created_or_updated(sender, instance, created, **kwargs):
     if created:
         logger.info(f"Nouveau lieu créé: {instance.nom}")
         
-        # Sérialiser le lieu
+        # Sérialiser le lieu et encoder la trame une seule fois
         place_data = LieuListSerializer(instance).data
+        frame = frame_lieu(place_data)
         
         # Notification globale
         send_to_websocket(
             'events_notifications',
             'new_place_notification',
-            {'place_data': place_data}
+            {'frame': frame}
         )
         
         # Notification par catégorie
@@ -204,7 +216,7 @@ def lieu_created_or_updated(sender, instance, created, **kwargs):
             send_to_websocket(
                 category_group,
                 'new_place_notification',
-                {'place_data': place_data}
+                {'frame': frame}
             )
 
 
@@ -215,19 +227,29 @@ def avis_evenement_created(sender, instance, created, **kwargs):
     if created:
         logger.info(f"Nouvel avis pour événement: {instance.evenement.nom}")
         
-        # Notifier le propriétaire de l'événement
-        organisateur = instance.evenement.organisateur
+        # Notifier le propriétaire de l'événement (notification conservée jusqu'à lecture)
+        try:
+            creer_notifications(
+                [instance.evenement.organisateur_id],
+                'new_review',
+                f"Nouvel avis sur votre événement '{instance.evenement.nom}'",
+                rating=instance.note,
+                event_id=str(instance.evenement.id)
+            )
+        except Exception as e:
+            logger.error(f"Erreur création de la notification d'avis: {e}")
+        
+        # Abonnés de l'événement: note et moyenne mise à jour
+        avis = AvisEvenement.objects.filter(evenement_id=instance.evenement_id).aggregate(
+            moyenne=Avg('note'), nombre=Count('id')
+        )
         send_to_websocket(
-            f'user_{organisateur.id}',
-            'personal_notification',
-            {
-                'notification_data': {
-                    'type': 'new_review',
-                    'message': f"Nouvel avis sur votre événement '{instance.evenement.nom}'",
-                    'rating': instance.note,
-                    'event_id': str(instance.evenement.id)
-                }
-            }
+            DynamicGroupManager.create_event_group(instance.evenement_id),
+            'event_review_notification',
+            {'frame': frame_avis_evenement(
+                str(instance.evenement_id), instance.evenement.nom,
+                instance.note, avis['moyenne'], avis['nombre']
+            )}
         )
 
 
@@ -238,53 +260,38 @@ def avis_lieu_created(sender, instance, created, **kwargs):
     if created:
         logger.info(f"Nouvel avis pour lieu: {instance.lieu.nom}")
         
-        # Notifier le propriétaire du lieu
-        proprietaire = instance.lieu.proprietaire
-        send_to_websocket(
-            f'user_{proprietaire.id}',
-            'personal_notification',
-            {
-                'notification_data': {
-                    'type': 'new_place_review',
-                    'message': f"Nouvel avis sur votre lieu '{instance.lieu.nom}'",
-                    'rating': instance.note,
-                    'place_id': str(instance.lieu.id)
-                }
-            }
-        )
+        # Notifier le propriétaire du lieu (notification conservée jusqu'à lecture)
+        try:
+            creer_notifications(
+                [instance.lieu.proprietaire_id],
+                'new_place_review',
+                f"Nouvel avis sur votre lieu '{instance.lieu.nom}'",
+                rating=instance.note,
+                place_id=str(instance.lieu.id)
+            )
+        except Exception as e:
+            logger.error(f"Erreur création de la notification d'avis: {e}")
 
 
 # Tâche périodique pour les rappels d'événements
 def send_event_reminders():
     """
-    Fonction à appeler périodiquement (avec Celery ou cron)
-    pour envoyer des rappels d'événements
+    Fonction à appeler périodiquement (avec Celery ou cron) pour envoyer les
+    rappels dus; préférer le worker `python manage.py envoyer_rappels`
     """
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    # Événements qui commencent dans 1 heure
-    one_hour_later = timezone.now() + timedelta(hours=1)
-    upcoming_events = Evenement.objects.filter(
-        date_debut__lte=one_hour_later,
-        date_debut__gt=timezone.now()
-    ).select_related('organisateur', 'lieu')
-    
-    for event in upcoming_events:
-        event_data = EvenementListSerializer(event).data
-        
-        # Rappel à l'organisateur
-        send_to_websocket(
-            f'user_{event.organisateur.id}',
-            'event_reminder',
-            {
-                'event_data': event_data,
-                'reminder_time': '1 heure'
-            }
-        )
-        
-        # Rappel global (pour les utilisateurs intéressés par la zone)
-        send_location_based_notifications(event, event_data, 'reminder')
+    return envoyer_rappels()
+
+
+@receiver(post_save, sender=Evenement)
+def planifier_rappels_evenement(sender, instance, created, **kwargs):
+    """Planifier les rappels à la création et quand la date de début change"""
+    champs = getattr(instance, 'derniers_champs_modifies', None)
+    if not created and champs is not None and 'date_debut' not in champs:
+        return
+    try:
+        planifier_rappels(instance)
+    except Exception as e:
+        logger.error(f"Erreur planification des rappels de {instance.id}: {e}")
 
 
 # Signal personnalisé pour les événements à venir
@@ -304,4 +311,222 @@ def handle_event_starting_soon(sender, event, **kwargs):
             'event_data': event_data,
             'message': f"L'événement '{event.nom}' commence dans peu de temps"
         }
-    )
\ No newline at end of file
+    )
+
+
+# Maintenance incrémentale de l'index d'autocomplétion
+@receiver(post_save, sender=Lieu)
+def lieu_index_autocomplete(sender, instance, **kwargs):
+    """Mettre à jour l'index d'autocomplétion après l'écriture d'un lieu"""
+    try:
+        autocomplete_index.mettre_a_jour_lieu(instance)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour index autocomplétion (lieu): {e}")
+
+
+@receiver(post_delete, sender=Lieu)
+def lieu_retrait_index_autocomplete(sender, instance, **kwargs):
+    """Retirer un lieu supprimé de l'index d'autocomplétion"""
+    try:
+        autocomplete_index.supprimer_lieu(instance.id)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour index autocomplétion (lieu): {e}")
+
+
+@receiver(post_save, sender=Evenement)
+def evenement_index_autocomplete(sender, instance, **kwargs):
+    """Mettre à jour l'index d'autocomplétion après l'écriture d'un événement"""
+    try:
+        autocomplete_index.mettre_a_jour_evenement(instance)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour index autocomplétion (événement): {e}")
+
+
+@receiver(post_delete, sender=Evenement)
+def evenement_retrait_index_autocomplete(sender, instance, **kwargs):
+    """Retirer un événement supprimé de l'index d'autocomplétion"""
+    try:
+        autocomplete_index.supprimer_evenement(instance.id)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour index autocomplétion (événement): {e}")
+
+
+# Invalidation des comptes de catégories
+@receiver(post_save, sender=Lieu)
+@receiver(post_delete, sender=Lieu)
+def lieu_invalider_categories(sender, instance, **kwargs):
+    """Invalider les facettes de catégories après une écriture sur Lieu"""
+    try:
+        invalider_categories()
+    except Exception as e:
+        logger.error(f"Erreur invalidation cache catégories: {e}")
+
+
+# Invalidation du cache des réponses publiques (statistiques, tendances...)
+@receiver(post_save, sender=Lieu)
+@receiver(post_delete, sender=Lieu)
+@receiver(post_save, sender=Evenement)
+@receiver(post_delete, sender=Evenement)
+@receiver(post_save, sender=AvisLieu)
+@receiver(post_delete, sender=AvisLieu)
+@receiver(post_save, sender=AvisEvenement)
+@receiver(post_delete, sender=AvisEvenement)
+@receiver(post_save, sender=Utilisateur)
+@receiver(post_delete, sender=Utilisateur)
+def invalider_cache_reponses(sender, instance, **kwargs):
+    """Incrémenter la génération du cache des réponses après une écriture"""
+    # La mise à jour de last_login à chaque connexion ne change aucune statistique
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    try:
+        bump_generation()
+    except Exception as e:
+        logger.error(f"Erreur invalidation cache des réponses: {e}")
+
+
+# Invalidation des instantanés de zone des connexions de localisation (zone_snapshots.py)
+def _invalider_zones_lieux(lieux):
+    try:
+        for latitude, longitude in Lieu.objects.filter(pk__in=lieux).values_list('latitude', 'longitude'):
+            invalider_zone(latitude, longitude)
+    except Exception as e:
+        logger.error(f"Erreur invalidation des instantanés de zone: {e}")
+
+
+@receiver(pre_save, sender=Evenement)
+def instantanes_lieu_precedent(sender, instance, **kwargs):
+    """Mémoriser le lieu chargé: un événement déplacé quitte aussi l'ancienne zone"""
+    instance._lieu_precedent = getattr(instance, '_etat_initial', {}).get('lieu')
+
+
+@receiver(post_save, sender=Evenement)
+@receiver(post_delete, sender=Evenement)
+def invalider_instantanes_evenement(sender, instance, **kwargs):
+    _invalider_zones_lieux({instance.lieu_id, getattr(instance, '_lieu_precedent', None)} - {None})
+
+
+@receiver(post_save, sender=AvisEvenement)
+@receiver(post_delete, sender=AvisEvenement)
+def invalider_instantanes_avis(sender, instance, **kwargs):
+    """La moyenne et le nombre d'avis font partie des instantanés"""
+    _invalider_zones_lieux(
+        Evenement.objects.filter(pk=instance.evenement_id).values('lieu_id')
+    )
+
+
+@receiver(pre_save, sender=Lieu)
+def instantanes_position_precedente(sender, instance, **kwargs):
+    """Mémoriser la position enregistrée pour invalider l'ancienne zone d'un lieu déplacé"""
+    instance._position_precedente = None if instance._state.adding else Lieu.objects.filter(
+        pk=instance.pk
+    ).values_list('latitude', 'longitude').first()
+
+
+@receiver(post_save, sender=Lieu)
+@receiver(post_delete, sender=Lieu)
+def invalider_instantanes_lieu(sender, instance, created=False, **kwargs):
+    if created:
+        # Aucun événement dans un nouveau lieu
+        return
+    try:
+        invalider_zone(instance.latitude, instance.longitude)
+        precedente = getattr(instance, '_position_precedente', None)
+        if precedente and precedente != (instance.latitude, instance.longitude):
+            invalider_zone(*precedente)
+    except Exception as e:
+        logger.error(f"Erreur invalidation des instantanés de zone: {e}")
+
+
+# Maintenance incrémentale des statistiques globales
+def _incrementer_statistique(champ, delta):
+    try:
+        StatistiquesService.incrementer(champ, delta)
+    except Exception as e:
+        logger.error(f"Erreur mise à jour statistique {champ}: {e}")
+
+
+@receiver(post_save, sender=Lieu)
+def statistiques_lieu_cree(sender, instance, created, **kwargs):
+    if created:
+        _incrementer_statistique('nombre_lieux', 1)
+
+
+@receiver(post_delete, sender=Lieu)
+def statistiques_lieu_supprime(sender, instance, **kwargs):
+    _incrementer_statistique('nombre_lieux', -1)
+
+
+@receiver(post_save, sender=Evenement)
+def statistiques_evenement_enregistre(sender, instance, created, **kwargs):
+    if created:
+        _incrementer_statistique('nombre_evenements', 1)
+    # Les événements à venir ne dépendent que des dates de début
+    champs = getattr(instance, 'derniers_champs_modifies', None)
+    if not created and champs is not None and 'date_debut' not in champs:
+        return
+    try:
+        StatistiquesService.rafraichir_a_venir()
+    except Exception as e:
+        logger.error(f"Erreur mise à jour statistique evenements_a_venir: {e}")
+
+
+@receiver(post_delete, sender=Evenement)
+def statistiques_evenement_supprime(sender, instance, **kwargs):
+    _incrementer_statistique('nombre_evenements', -1)
+    try:
+        StatistiquesService.rafraichir_a_venir()
+    except Exception as e:
+        logger.error(f"Erreur mise à jour statistique evenements_a_venir: {e}")
+
+
+@receiver(post_save, sender=AvisLieu)
+def statistiques_avis_lieu_cree(sender, instance, created, **kwargs):
+    if created:
+        _incrementer_statistique('nombre_avis_lieux', 1)
+
+
+@receiver(post_delete, sender=AvisLieu)
+def statistiques_avis_lieu_supprime(sender, instance, **kwargs):
+    _incrementer_statistique('nombre_avis_lieux', -1)
+
+
+@receiver(post_save, sender=AvisEvenement)
+def statistiques_avis_evenement_cree(sender, instance, created, **kwargs):
+    if created:
+        _incrementer_statistique('nombre_avis_evenements', 1)
+
+
+@receiver(post_delete, sender=AvisEvenement)
+def statistiques_avis_evenement_supprime(sender, instance, **kwargs):
+    _incrementer_statistique('nombre_avis_evenements', -1)
+
+
+@receiver(pre_save, sender=Utilisateur)
+def statistiques_utilisateur_etat_precedent(sender, instance, **kwargs):
+    """Mémoriser is_active avant l'écriture pour détecter les (dés)activations"""
+    update_fields = kwargs.get('update_fields')
+    if instance._state.adding or (update_fields is not None and 'is_active' not in update_fields):
+        instance._etait_actif = None
+        return
+    instance._etait_actif = Utilisateur.objects.filter(pk=instance.pk).values_list(
+        'is_active', flat=True
+    ).first()
+
+
+@receiver(post_save, sender=Utilisateur)
+def statistiques_utilisateur_enregistre(sender, instance, created, **kwargs):
+    if created:
+        if instance.is_active:
+            _incrementer_statistique('nombre_utilisateurs_actifs', 1)
+        return
+    
+    etait_actif = getattr(instance, '_etait_actif', None)
+    if etait_actif is not None and etait_actif != instance.is_active:
+        _incrementer_statistique('nombre_utilisateurs_actifs', 1 if instance.is_active else -1)
+
+
+@receiver(post_delete, sender=Utilisateur)
+def statistiques_utilisateur_supprime(sender, instance, **kwargs):
+    if instance.is_active:
+        _incrementer_statistique('nombre_utilisateurs_actifs', -1)
@@ -0,0 +1,103 @@
+"""
+Statistiques globales matérialisées
+Fichier: statistiques.py
+
+Les compteurs sont stockés dans une ligne unique (StatistiquesGlobales, pk=1),
+incrémentés par les signaux (voir signals.py) et recalculés exactement par la
+commande `python manage.py recalculer_statistiques` (cron ou --interval).
+"""
+
+from django.db.models import F, Min
+from django.utils import timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATISTIQUES_PK = 1
+
+COMPTEURS = (
+    'nombre_lieux',
+    'nombre_evenements',
+    'nombre_utilisateurs_actifs',
+    'nombre_avis_lieux',
+    'nombre_avis_evenements',
+)
+
+
+class StatistiquesService:
+    """Lecture et maintenance incrémentale de la ligne de statistiques"""
+
+    @staticmethod
+    def _valeurs_a_venir():
+        from .models import Evenement
+
+        a_venir = Evenement.objects.filter(date_debut__gt=timezone.now())
+        return {
+            'evenements_a_venir': a_venir.count(),
+            'prochain_debut': a_venir.aggregate(prochain=Min('date_debut'))['prochain'],
+        }
+
+    @staticmethod
+    def recalculer():
+        """Recalcul exact de tous les compteurs"""
+        from .models import (
+            StatistiquesGlobales, Utilisateur, Lieu, Evenement, AvisLieu, AvisEvenement
+        )
+
+        valeurs = {
+            'nombre_lieux': Lieu.objects.count(),
+            'nombre_evenements': Evenement.objects.count(),
+            'nombre_utilisateurs_actifs': Utilisateur.objects.filter(is_active=True).count(),
+            'nombre_avis_lieux': AvisLieu.objects.count(),
+            'nombre_avis_evenements': AvisEvenement.objects.count(),
+            'date_recalcul': timezone.now(),
+            **StatistiquesService._valeurs_a_venir(),
+        }
+        stats, _ = StatistiquesGlobales.objects.update_or_create(
+            pk=STATISTIQUES_PK, defaults=valeurs
+        )
+        logger.info("Statistiques globales recalculées")
+        return stats
+
+    @staticmethod
+    def get():
+        """Lire la ligne de statistiques (une seule requête dans le cas courant)"""
+        from .models import StatistiquesGlobales
+
+        stats = StatistiquesGlobales.objects.filter(pk=STATISTIQUES_PK).first()
+        if stats is None:
+            return StatistiquesService.recalculer()
+
+        # Un événement a commencé depuis le dernier calcul
+        if stats.prochain_debut and stats.prochain_debut <= timezone.now():
+            StatistiquesService.rafraichir_a_venir()
+            stats.refresh_from_db()
+
+        return stats
+
+    @staticmethod
+    def incrementer(champ, delta=1):
+        """Incrémenter un compteur de manière atomique"""
+        from .models import StatistiquesGlobales
+
+        if champ not in COMPTEURS:
+            raise ValueError(f"Compteur inconnu: {champ}")
+
+        modifies = StatistiquesGlobales.objects.filter(pk=STATISTIQUES_PK).update(
+            **{champ: F(champ) + delta, 'date_mise_a_jour': timezone.now()}
+        )
+        if not modifies:
+            # Ligne absente: le recalcul initial inclut déjà cette écriture
+            StatistiquesService.recalculer()
+
+    @staticmethod
+    def rafraichir_a_venir():
+        """Recalculer le nombre d'événements à venir (requêtes indexées sur date_debut)"""
+        from .models import StatistiquesGlobales
+
+        modifies = StatistiquesGlobales.objects.filter(pk=STATISTIQUES_PK).update(
+            date_mise_a_jour=timezone.now(),
+            **StatistiquesService._valeurs_a_venir()
+        )
+        if not modifies:
+            StatistiquesService.recalculer()
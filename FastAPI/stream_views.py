@@ -0,0 +1,411 @@
+"""
+Flux Server-Sent Events des notifications d'événements
+Fichier: stream_views.py
+
+Alternative légère à /ws/events/ pour les tableaux de bord et les bornes
+qui ne font que recevoir (EventSource côté navigateur):
+
+    GET /fastapi/stream/events/                              flux global
+    GET /fastapi/stream/events/?category=Concert&category=Bar
+    GET /fastapi/stream/events/?event=<uuid>                 (répétable)
+    GET /fastapi/stream/events/?latitude=6.13&longitude=1.22&radius=5
+
+Une connexion est une réponse HTTP servie par un générateur asynchrone: un
+canal du channel layer, les mêmes groupes et les mêmes trames pré-encodées
+que les consumers (notification_frames.py), sans instance de consumer, ni
+suivi de présence, ni file sortante. Les paramètres se combinent; sans
+paramètre, le flux global (events_notifications) est servi. Sous Daphne,
+le flux est routé avant Django (application_sse), sans thread par connexion;
+l'hôte y est validé (ALLOWED_HOSTS) et les en-têtes CORS ajoutés avec les
+réglages CORS_* de corsheaders, comme par les middlewares des vues Django.
+
+Chaque trame part sur une ligne 'data:' avec son numéro de séquence du
+journal en 'id:'. À la reconnexion, le navigateur renvoie le dernier id
+reçu dans l'en-tête Last-Event-ID (ou ?resume_from=): seules les
+notifications manquées sont rejouées, sinon une trame 'resync_required'
+est envoyée (voir notification_journal.py). Un commentaire ': ping' part
+après SSE_HEARTBEAT_INTERVAL secondes sans trame pour que les proxys
+gardent la connexion ouverte.
+"""
+
+import asyncio
+import io
+import uuid
+from collections import OrderedDict
+
+from channels.layers import get_channel_layer
+from corsheaders.middleware import CorsMiddleware
+from django.conf import settings
+from django.core.exceptions import DisallowedHost
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .consumers import (
+    MAX_STREAM_SUBSCRIPTIONS, RESUME_DEDUP_WINDOW, FrameSenderMixin, garde_connexions,
+    metriques_websocket
+)
+from .notification_frames import (
+    ajouter_champ, construire_frame, encoder, frame_evenement, frame_lieu, frame_localisation
+)
+from .notification_journal import position_courante, relire
+from .rate_limit import ip_depuis_scope, limiteur_connexions_ws
+from .subscriber_index import LOCATION_TOPIC_MESSAGE_TYPE, location_listener
+from .subscription_filters import lire_cercle
+from .websocket_utils import DynamicGroupManager, ProductionWebSocketConfig
+import logging
+
+logger = logging.getLogger(__name__)
+
+SSE_MAX_CONNECTIONS = getattr(
+    settings, 'SSE_MAX_CONNECTIONS', ProductionWebSocketConfig.MAX_CONNECTIONS
+)
+SSE_HEARTBEAT_INTERVAL = getattr(
+    settings, 'SSE_HEARTBEAT_INTERVAL', ProductionWebSocketConfig.HEARTBEAT_INTERVAL.total_seconds()
+)
+
+# Délai de reconnexion proposé au navigateur (millisecondes)
+SSE_RETRY_MS = 5000
+
+# Noms en minuscules, comme l'exige ASGI (http.response.start);
+# x-accel-buffering: pas de mise en tampon par nginx
+ENTETES_SSE = {
+    'content-type': 'text/event-stream; charset=utf-8',
+    'cache-control': 'no-cache',
+    'x-accel-buffering': 'no',
+}
+
+get_frame = FrameSenderMixin.get_frame
+
+# Type du message channel layer -> trame envoyée au client (mêmes trames que les consumers)
+TRAMES_SSE = {
+    'new_event_notification': lambda event: get_frame(
+        event, 'new_event', frame_evenement, 'new_event', event.get('event_data')
+    ),
+    'event_updated_notification': lambda event: get_frame(
+        event, 'event_updated', frame_evenement, 'event_updated', event.get('event_data')
+    ),
+    'event_cancelled_notification': lambda event: get_frame(
+        event, 'event_cancelled', frame_evenement, 'event_cancelled', event.get('event_data')
+    ),
+    'event_review_notification': lambda event: event['frame'],
+    'new_place_notification': lambda event: get_frame(
+        event, 'new_place', frame_lieu, event.get('place_data')
+    ),
+    'location_event_notification': lambda event: ajouter_champ(
+        get_frame(
+            event, 'location_event', frame_localisation,
+            event.get('notification_type'), event.get('event_data')
+        ),
+        'distance', event.get('distance')
+    ),
+}
+
+# Canaux des connexions SSE ouvertes dans le processus
+connexions_sse = set()
+
+
+def evenement_sse(frame, seq=None):
+    """Bloc SSE d'une trame JSON encodée (sans saut de ligne: encodage compact)"""
+    if seq:
+        return f'id: {seq}\ndata: {frame}\n\n'
+    return f'data: {frame}\n\n'
+
+
+class AbonneSSE:
+    """
+    Connexion SSE vue par location_listener, qui lui remet les événements
+    de son cercle comme à un consumer (handler location_event_notification)
+    """
+
+    def __init__(self, channel_layer, channel_name, localisation=False):
+        self.channel_layer = channel_layer
+        self.channel_name = channel_name
+        # Événements remis par location_listener (abonnement géographique seulement)
+        self.file = asyncio.Queue() if localisation else None
+        self._seqs_remis = OrderedDict()
+
+    def deja_remis(self, message):
+        """Vrai si cette notification numérotée a déjà été envoyée (reprise puis direct)"""
+        seq = message.get('seq')
+        if not seq:
+            return False
+        if seq in self._seqs_remis:
+            return True
+        self._seqs_remis[seq] = True
+        if len(self._seqs_remis) > RESUME_DEDUP_WINDOW:
+            self._seqs_remis.popitem(last=False)
+        return False
+
+    async def location_event_notification(self, event):
+        self.file.put_nowait(event)
+
+    def trame(self, message):
+        """Bloc SSE d'un message channel layer, None s'il ne concerne pas le client"""
+        construire = TRAMES_SSE.get(message.get('type'))
+        if construire is None:
+            return None
+        return evenement_sse(construire(message), message.get('seq'))
+
+    def vider_file(self):
+        blocs = []
+        while self.file is not None and not self.file.empty():
+            bloc = self.trame(self.file.get_nowait())
+            if bloc:
+                blocs.append(bloc)
+        return blocs
+
+
+def _groupes_demandes(parametres):
+    """(groupes, cercle ou None) des paramètres de la requête; ValueError si invalides"""
+    groupes = [
+        f"category_{categorie.strip().lower().replace(' ', '_')}"
+        for categorie in parametres.getlist('category') if categorie.strip()
+    ]
+    groupes += [
+        DynamicGroupManager.create_event_group(uuid.UUID(event_id))
+        for event_id in parametres.getlist('event')
+    ]
+    if len(groupes) > MAX_STREAM_SUBSCRIPTIONS:
+        raise ValueError(f'Au plus {MAX_STREAM_SUBSCRIPTIONS} catégories et événements')
+
+    cercle = None
+    if parametres.get('latitude') or parametres.get('longitude'):
+        cercle = lire_cercle(
+            parametres.get('latitude'), parametres.get('longitude'), parametres.get('radius', 10)
+        )
+    if not groupes and cercle is None:
+        groupes = ['events_notifications']
+    return list(dict.fromkeys(groupes)), cercle
+
+
+async def _flux(groupes, cercle, depuis):
+    """Générateur du flux: abonnements, reprise éventuelle puis notifications en direct"""
+    channel_layer = get_channel_layer()
+    abonne = AbonneSSE(
+        channel_layer, await channel_layer.new_channel('sse.'), localisation=cercle is not None
+    )
+    connexions_sse.add(abonne.channel_name)
+    metriques_websocket.definir('connexions_sse', len(connexions_sse))
+    reception = lecture_file = None
+    try:
+        for groupe in groupes:
+            await channel_layer.group_add(groupe, abonne.channel_name)
+        if cercle is not None:
+            await location_listener.abonner(abonne, *cercle, 'location_event_notification')
+
+        position = await position_courante()
+        yield f'retry: {SSE_RETRY_MS}\n' + evenement_sse(construire_frame(
+            'connection_established',
+            message='Flux SSE établi',
+            seq=position
+        ), None if depuis else position)
+
+        if depuis:
+            groupes_reprise = groupes + list(location_listener.groupes_abonnement(abonne))
+            messages, position, raison = await relire(groupes_reprise, depuis)
+            if raison:
+                logger.info(f"Reprise SSE impossible pour {abonne.channel_name} ({raison})")
+                yield evenement_sse(construire_frame(
+                    'resync_required', reason=raison, resume_from=depuis, seq=position
+                ), position)
+            else:
+                blocs = []
+                for message in messages:
+                    if message.get('type') == LOCATION_TOPIC_MESSAGE_TYPE:
+                        await location_listener.remettre(abonne, message)
+                        blocs.extend(abonne.vider_file())
+                    elif not abonne.deja_remis(message):
+                        bloc = abonne.trame(message)
+                        if bloc:
+                            blocs.append(bloc)
+                metriques_websocket.incrementer('notifications_rejouees', len(blocs))
+                blocs.append(evenement_sse(
+                    construire_frame('resume_complete', count=len(blocs), seq=position), position
+                ))
+                yield ''.join(blocs)
+
+        while True:
+            if reception is None:
+                reception = asyncio.ensure_future(channel_layer.receive(abonne.channel_name))
+            if lecture_file is None and cercle is not None:
+                lecture_file = asyncio.ensure_future(abonne.file.get())
+            attentes = {reception} if lecture_file is None else {reception, lecture_file}
+            terminees, _ = await asyncio.wait(
+                attentes, timeout=SSE_HEARTBEAT_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not terminees:
+                yield ': ping\n\n'
+                continue
+
+            blocs = []
+            if reception in terminees:
+                message, reception = reception.result(), None
+                if not abonne.deja_remis(message):
+                    bloc = abonne.trame(message)
+                    if bloc:
+                        blocs.append(bloc)
+            if lecture_file is not None and lecture_file in terminees:
+                bloc = abonne.trame(lecture_file.result())
+                lecture_file = None
+                if bloc:
+                    blocs.append(bloc)
+                blocs.extend(abonne.vider_file())
+            if blocs:
+                metriques_websocket.incrementer('trames_sse', len(blocs))
+                metriques_websocket.publier_periodiquement()
+                yield ''.join(blocs)
+    finally:
+        # Client parti (envoi annulé) ou arrêt du serveur
+        for tache in (reception, lecture_file):
+            if tache is not None:
+                tache.cancel()
+        for groupe in groupes:
+            try:
+                await channel_layer.group_discard(groupe, abonne.channel_name)
+            except Exception as e:
+                logger.error(f"Erreur sortie du groupe {groupe} (SSE): {e}")
+        await location_listener.desabonner(abonne)
+        connexions_sse.discard(abonne.channel_name)
+        metriques_websocket.definir('connexions_sse', len(connexions_sse))
+
+
+class RefusSSE(Exception):
+    """Connexion SSE refusée: statut HTTP, message et délai de réessai éventuel"""
+
+    def __init__(self, status, message, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+async def _admettre(parametres, ip):
+    """(groupes, cercle) d'une connexion admise; RefusSSE sinon"""
+    try:
+        groupes, cercle = _groupes_demandes(parametres)
+    except (KeyError, TypeError, ValueError) as e:
+        raise RefusSSE(400, f'Paramètres invalides: {e}')
+
+    if len(connexions_sse) >= SSE_MAX_CONNECTIONS:
+        metriques_websocket.incrementer('connexions_sse_refusees')
+        raise RefusSSE(503, 'Serveur saturé, réessayez plus tard', garde_connexions.delai_reessai())
+
+    autorise, attente = await limiteur_connexions_ws.autoriser_async(ip)
+    if not autorise:
+        raise RefusSSE(429, 'Trop de connexions, réessayez plus tard', max(1, round(attente)))
+    return groupes, cercle
+
+
+# Logique CORS de corsheaders, appliquée hors de la pile de middlewares Django
+cors = CorsMiddleware(lambda requete: None)
+
+
+def _entetes_cors(requete, reponse):
+    """En-têtes CORS et Vary ajoutés par CorsMiddleware à `reponse`, au format ASGI"""
+    cors.add_response_headers(requete, reponse)
+    return [
+        (nom.lower().encode('latin1'), valeur.encode('latin1'))
+        for nom, valeur in reponse.items()
+        if nom.lower().startswith('access-control-') or nom.lower() == 'vary'
+    ]
+
+
+async def application_sse(scope, receive, send):
+    """
+    Flux SSE en application ASGI, routé avant Django (routing.http_urlpatterns):
+    le gestionnaire de requêtes de Django garde un thread d'exécution par
+    requête jusqu'à la fin de la réponse, soit un thread par connexion ouverte.
+    Hors des middlewares, l'hôte et CORS sont traités ici
+    """
+    requete = ASGIRequest(scope, io.BytesIO())
+    try:
+        requete.get_host()
+    except DisallowedHost as e:
+        logger.warning(f"Flux SSE refusé: {e}")
+        await _envoyer_refus(send, RefusSSE(400, 'Hôte non autorisé'))
+        return
+
+    preflight = cors.check_preflight(requete)
+    entetes_cors = _entetes_cors(requete, preflight or HttpResponse())
+    if preflight is not None:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': entetes_cors})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    async def send_cors(message):
+        if message['type'] == 'http.response.start':
+            message = {**message, 'headers': [*message['headers'], *entetes_cors]}
+        await send(message)
+
+    await _servir_flux(scope, receive, send_cors)
+
+
+async def _servir_flux(scope, receive, send):
+    """Admission de la connexion SSE puis envoi du flux jusqu'à la déconnexion du client"""
+    if scope['method'] != 'GET':
+        await _envoyer_refus(send, RefusSSE(405, 'Méthode non autorisée'))
+        return
+    entetes = dict(scope.get('headers', ()))
+    parametres = QueryDict(scope.get('query_string', b''))
+    try:
+        groupes, cercle = await _admettre(parametres, ip_depuis_scope(scope))
+    except RefusSSE as refus:
+        await _envoyer_refus(send, refus)
+        return
+
+    depuis = entetes.get(b'last-event-id', b'').decode('latin1') or parametres.get('resume_from')
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(nom.encode(), valeur.encode()) for nom, valeur in ENTETES_SSE.items()],
+    })
+
+    async def envoyer():
+        async for bloc in _flux(groupes, cercle, depuis):
+            await send({'type': 'http.response.body', 'body': bloc.encode(), 'more_body': True})
+
+    async def attendre_deconnexion():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # La déconnexion du client annule l'envoi: le générateur se désabonne (finally)
+    taches = {asyncio.ensure_future(envoyer()), asyncio.ensure_future(attendre_deconnexion())}
+    try:
+        terminees, _ = await asyncio.wait(taches, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for tache in taches:
+            tache.cancel()
+        await asyncio.gather(*taches, return_exceptions=True)
+    for tache in terminees:
+        if not tache.cancelled() and tache.exception():
+            logger.error(f"Erreur du flux SSE: {tache.exception()}")
+
+
+async def _envoyer_refus(send, refus):
+    entetes = [(b'content-type', b'application/json')]
+    if refus.retry_after:
+        entetes.append((b'retry-after', str(refus.retry_after).encode()))
+    await send({'type': 'http.response.start', 'status': refus.status, 'headers': entetes})
+    await send({'type': 'http.response.body', 'body': encoder({'error': str(refus)}).encode()})
+
+
+@require_GET
+async def flux_evenements(request):
+    """
+    Flux SSE des notifications d'événements (voir l'en-tête du module).
+    Servi par application_sse sous Daphne; cette vue sert le même flux quand
+    l'application ASGI de Django est utilisée seule
+    """
+    try:
+        groupes, cercle = await _admettre(request.GET, ip_depuis_scope(request.scope))
+    except RefusSSE as refus:
+        reponse = JsonResponse({'error': str(refus)}, status=refus.status)
+        if refus.retry_after:
+            reponse['Retry-After'] = refus.retry_after
+        return reponse
+
+    depuis = request.headers.get('Last-Event-ID') or request.GET.get('resume_from')
+    reponse = StreamingHttpResponse(_flux(groupes, cercle, depuis))
+    for nom, valeur in ENTETES_SSE.items():
+        reponse[nom] = valeur
+    return reponse
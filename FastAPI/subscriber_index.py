@@ -0,0 +1,312 @@
+"""
+Index spatial des abonnés WebSocket connectés à ce processus ASGI
+Fichier: subscriber_index.py
+
+Un événement géolocalisé est publié dans la cellule de son lieu à chaque
+niveau de la hiérarchie (voir geo_cells.py). Chaque processus rejoint, avec
+un canal unique, les seules cellules couvrant les cercles de ses abonnés
+locaux, puis ne remet l'événement qu'aux consumers dont le cercle (centre +
+rayon exacts) contient le lieu.
+"""
+
+import asyncio
+import math
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+import logging
+
+from .geo_cells import bounding_box, covering_groups, distance_km
+from .subscription_filters import lire_cercle
+
+logger = logging.getLogger(__name__)
+
+# Type des messages publiés dans les groupes de cellules
+LOCATION_TOPIC_MESSAGE_TYPE = 'location.event'
+
+# Taille des cellules de la grille locale (degrés, ~11 km)
+GRID_CELL_SIZE = 0.1
+
+# Fréquence de renouvellement des appartenances aux groupes (expiration côté Redis)
+GROUP_REFRESH_INTERVAL = 60 * 60
+
+# Un même événement peut arriver par plusieurs cellules rejointes
+DEDUP_WINDOW = 1024
+
+
+def message_localisation(latitude, longitude, frames, coalesce_key=None, attributs=None):
+    """
+    Message channel layer d'un événement géolocalisé.
+    `frames`: trames déjà encodées par type client (voir notification_frames.py);
+    `coalesce_key`: clé de fusion dans les files sortantes des consumers;
+    `attributs`: champs évalués par les filtres d'abonnement (subscription_filters.py)
+    """
+    message = {
+        'type': LOCATION_TOPIC_MESSAGE_TYPE,
+        'frames': frames,
+        'notification_id': uuid.uuid4().hex,
+        'latitude': float(latitude),
+        'longitude': float(longitude),
+    }
+    if coalesce_key:
+        message['coalesce_key'] = coalesce_key
+    if attributs:
+        message['attributs'] = attributs
+    return message
+
+
+class Abonnement:
+    """Cercle d'intérêt d'un consumer et méthode à appeler pour lui remettre un événement"""
+
+    __slots__ = ('consumer', 'latitude', 'longitude', 'radius_km', 'handler', 'cellules', 'groupes')
+
+    def __init__(self, consumer, latitude, longitude, radius_km, handler):
+        self.consumer = consumer
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+        self.handler = handler
+        self.cellules = ()
+        self.groupes = ()
+
+
+class SubscriberSpatialIndex:
+    """
+    Grille régulière: chaque abonné est enregistré dans toutes les cellules
+    que couvre son cercle. Une recherche ne lit que la cellule du lieu puis
+    vérifie la distance exacte.
+    """
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cellules = defaultdict(set)
+        self._abonnements = {}  # channel_name -> Abonnement
+
+    def __len__(self):
+        return len(self._abonnements)
+
+    def _cellule(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size))
+
+    def ajouter(self, consumer, latitude, longitude, radius_km, handler):
+        # Le nombre de cellules croît avec le carré du rayon: rayon borné
+        latitude, longitude, radius_km = lire_cercle(latitude, longitude, radius_km)
+        self.retirer(consumer)
+
+        abonnement = Abonnement(consumer, latitude, longitude, radius_km, handler)
+        lat_min, lat_max, lng_min, lng_max = bounding_box(latitude, longitude, radius_km)
+        i_min, j_min = self._cellule(lat_min, lng_min)
+        i_max, j_max = self._cellule(lat_max, lng_max)
+        abonnement.cellules = tuple(
+            (i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1)
+        )
+
+        for cellule in abonnement.cellules:
+            self._cellules[cellule].add(consumer.channel_name)
+        self._abonnements[consumer.channel_name] = abonnement
+        return abonnement
+
+    def retirer(self, consumer):
+        abonnement = self._abonnements.pop(consumer.channel_name, None)
+        if not abonnement:
+            return None
+        for cellule in abonnement.cellules:
+            membres = self._cellules.get(cellule)
+            if membres is not None:
+                membres.discard(consumer.channel_name)
+                if not membres:
+                    del self._cellules[cellule]
+        return abonnement
+
+    def abonnement(self, consumer):
+        return self._abonnements.get(consumer.channel_name)
+
+    def rechercher(self, latitude, longitude):
+        """Abonnés dont le cercle contient le point, avec leur distance"""
+        resultats = []
+        for channel_name in self._cellules.get(self._cellule(latitude, longitude), ()):
+            abonnement = self._abonnements[channel_name]
+            distance = distance_km(abonnement.latitude, abonnement.longitude, latitude, longitude)
+            if distance <= abonnement.radius_km:
+                resultats.append((abonnement, round(distance, 2)))
+        return resultats
+
+
+class LocationTopicListener:
+    """
+    Canal du processus, membre (avec comptage de références) des cellules
+    couvrant les abonnés locaux, qui distribue aux abonnés locaux
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._tache = None
+        self._channel_layer = None
+        self._channel_name = None
+        self._groupes = Counter()
+        self._dernier_group_add = 0.0
+        self._deja_vus = OrderedDict()
+        self._verrou = None
+
+    def _get_verrou(self):
+        boucle = asyncio.get_running_loop()
+        if self._verrou is None or self._verrou[0] is not boucle:
+            self._verrou = (boucle, asyncio.Lock())
+        return self._verrou[1]
+
+    def _actif(self):
+        if self._tache is None or self._tache.done():
+            return False
+        # Les tests créent une boucle par cas: ne pas réutiliser une tâche d'une autre boucle
+        return self._tache.get_loop() is asyncio.get_running_loop()
+
+    def compteurs_groupes(self):
+        """Abonnés locaux par cellule rejointe (suivi de présence)"""
+        return dict(self._groupes)
+
+    async def abonner(self, consumer, latitude, longitude, radius_km, handler):
+        """Enregistrer un consumer et rejoindre les cellules couvrant son cercle"""
+        await self.desabonner(consumer)
+
+        abonnement = self.index.ajouter(consumer, latitude, longitude, radius_km, handler)
+        abonnement.groupes = tuple(covering_groups(latitude, longitude, radius_km))
+
+        async with self._get_verrou():
+            await self._demarrer(consumer.channel_layer)
+            for groupe in abonnement.groupes:
+                self._groupes[groupe] += 1
+                if self._groupes[groupe] == 1:
+                    await self._channel_layer.group_add(groupe, self._channel_name)
+
+    async def desabonner(self, consumer):
+        abonnement = self.index.retirer(consumer)
+        if abonnement is None:
+            return
+
+        async with self._get_verrou():
+            if not self._actif():
+                return
+            for groupe in abonnement.groupes:
+                self._groupes[groupe] -= 1
+                if self._groupes[groupe] <= 0:
+                    del self._groupes[groupe]
+                    await self._quitter(groupe)
+            if not len(self.index):
+                await self._arreter()
+
+    async def _quitter(self, groupe):
+        try:
+            await self._channel_layer.group_discard(groupe, self._channel_name)
+        except Exception as e:
+            logger.error(f"Erreur sortie de la cellule {groupe}: {e}")
+
+    async def _demarrer(self, channel_layer):
+        if self._actif():
+            if time.monotonic() - self._dernier_group_add > GROUP_REFRESH_INTERVAL:
+                for groupe in list(self._groupes):
+                    await self._channel_layer.group_add(groupe, self._channel_name)
+                self._dernier_group_add = time.monotonic()
+            return
+
+        self._channel_layer = channel_layer
+        self._channel_name = await channel_layer.new_channel('location-listener.')
+        self._groupes = Counter()
+        self._dernier_group_add = time.monotonic()
+        self._tache = asyncio.ensure_future(self._boucle(channel_layer, self._channel_name))
+        logger.info(f"Écoute des cellules de localisation démarrée: {self._channel_name}")
+
+    async def _arreter(self):
+        if not self._actif():
+            return
+        self._tache.cancel()
+        for groupe in list(self._groupes):
+            await self._quitter(groupe)
+        self._groupes = Counter()
+        self._tache = None
+
+    async def _boucle(self, channel_layer, channel_name):
+        while True:
+            try:
+                message = await channel_layer.receive(channel_name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur réception des cellules de localisation: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            if message.get('type') == LOCATION_TOPIC_MESSAGE_TYPE:
+                await self.distribuer(message)
+
+    def _deja_distribue(self, notification_id):
+        if not notification_id:
+            return False
+        if notification_id in self._deja_vus:
+            return True
+        self._deja_vus[notification_id] = True
+        if len(self._deja_vus) > DEDUP_WINDOW:
+            self._deja_vus.popitem(last=False)
+        return False
+
+    async def distribuer(self, message):
+        """Remettre un événement aux abonnés locaux dont le cercle contient le lieu"""
+        if self._deja_distribue(message.get('notification_id')):
+            return
+
+        try:
+            latitude = float(message['latitude'])
+            longitude = float(message['longitude'])
+        except (KeyError, TypeError, ValueError):
+            logger.error("Message de localisation sans coordonnées valides")
+            return
+
+        for abonnement, distance in self.index.rechercher(latitude, longitude):
+            await self._remettre(abonnement, distance, message)
+
+    async def _remettre(self, abonnement, distance, message):
+        consumer = abonnement.consumer
+        handler = getattr(consumer, abonnement.handler, None)
+        if handler is None:
+            return False
+        # Une notification rejouée après reconnexion peut aussi arriver en direct
+        deja_remis = getattr(consumer, 'deja_remis', None)
+        if deja_remis is not None and deja_remis(message):
+            return False
+        try:
+            await handler({
+                **message,
+                'type': abonnement.handler,
+                'distance': distance,
+            })
+        except Exception as e:
+            logger.error(f"Erreur remise événement localisé à {consumer.channel_name}: {e}")
+            return False
+        return True
+
+    def groupes_abonnement(self, consumer):
+        """Cellules rejointes pour l'abonnement du consumer (reprise depuis le journal)"""
+        abonnement = self.index.abonnement(consumer)
+        return abonnement.groupes if abonnement else ()
+
+    async def remettre(self, consumer, message):
+        """
+        Remettre un événement rejoué au seul consumer, s'il est dans son cercle.
+        Retourne True si l'événement lui a été remis.
+        """
+        abonnement = self.index.abonnement(consumer)
+        if abonnement is None:
+            return False
+        try:
+            latitude = float(message['latitude'])
+            longitude = float(message['longitude'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        distance = distance_km(abonnement.latitude, abonnement.longitude, latitude, longitude)
+        if distance > abonnement.radius_km:
+            return False
+        return await self._remettre(abonnement, round(distance, 2), message)
+
+
+# Instances par processus
+subscriber_index = SubscriberSpatialIndex()
+location_listener = LocationTopicListener(subscriber_index)
@@ -0,0 +1,170 @@
+"""
+Filtres d'abonnement évalués par les consumers avant l'envoi
+Fichier: subscription_filters.py
+
+Un client enregistre sur sa connexion un filtre (catégories, cercle, fenêtre
+de dates, note minimale) au lieu de trier lui-même tout le flux global:
+
+    {"type": "set_filter", "filter": {
+        "categories": ["Concert"],
+        "latitude": 6.13, "longitude": 1.22, "radius": 5,
+        "date_from": "2026-10-24", "date_to": "2026-10-26T23:59:59+00:00",
+        "min_rating": 4
+    }}
+    {"type": "clear_filter"}
+
+Tous les critères sont facultatifs et se combinent (ET). Les signaux joignent
+aux messages d'événements un petit dict 'attributs' (attributs_evenement):
+le consumer l'évalue sans décoder la trame déjà encodée, et les événements
+écartés ne sont pas envoyés. Un message sans attributs (émis avant la mise
+en service) passe le filtre. La note minimale ne s'applique qu'aux
+événements déjà notés: un nouvel événement n'a pas encore d'avis.
+
+Le filtre porte sur les nouveaux événements (flux global, catégories,
+proximité et zone, instantané compris), pas sur les groupes event_<id>
+suivis explicitement par le client.
+"""
+
+from datetime import datetime, time as heure
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .categories import slug_categorie
+from .geo_cells import distance_km
+
+# Bornes des filtres acceptés (le rayon borne aussi les abonnements par localisation)
+FILTER_MAX_CATEGORIES = 20
+FILTER_MAX_RADIUS_KM = 100
+
+
+def lire_cercle(latitude, longitude, radius):
+    """
+    Cercle (latitude, longitude, rayon en km) d'un abonnement, converti en
+    float. ValueError si une valeur manque, n'est pas finie, ou si le rayon
+    sort de ]0, FILTER_MAX_RADIUS_KM]: chaque cellule couverte est indexée.
+    """
+    try:
+        latitude, longitude, radius = float(latitude), float(longitude), float(radius)
+    except (TypeError, ValueError):
+        raise ValueError('latitude, longitude et radius doivent être des nombres')
+    # NaN échoue à toutes les comparaisons
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('coordonnées hors limites')
+    if not 0 < radius <= FILTER_MAX_RADIUS_KM:
+        raise ValueError(f'radius entre 0 et {FILTER_MAX_RADIUS_KM} km')
+    return latitude, longitude, radius
+
+
+def attributs_evenement(evenement, moyenne_avis=None):
+    """Champs d'un événement évalués par les filtres, joints au message channel layer"""
+    lieu = evenement.lieu
+    return {
+        'categorie': slug_categorie(lieu.categorie),
+        'latitude': float(lieu.latitude),
+        'longitude': float(lieu.longitude),
+        'debut': evenement.date_debut.timestamp(),
+        'moyenne_avis': moyenne_avis,
+    }
+
+
+def _instant(valeur, fin_de_journee=False):
+    """Timestamp d'une date ou date-heure ISO 8601 (heure locale si sans fuseau)"""
+    texte = str(valeur)
+    try:
+        # Date seule d'abord: parse_datetime lirait '2026-10-26' comme minuit
+        jour = parse_date(texte)
+        if jour is not None:
+            date_heure = datetime.combine(jour, heure.max if fin_de_journee else heure.min)
+        else:
+            date_heure = parse_datetime(texte)
+    except ValueError:
+        date_heure = None
+    if date_heure is None:
+        raise ValueError(f'date invalide: {texte}')
+    if timezone.is_naive(date_heure):
+        date_heure = timezone.make_aware(date_heure)
+    return date_heure.timestamp()
+
+
+class FiltreAbonnement:
+    """Critères d'une connexion, évalués sur les attributs d'un événement"""
+
+    __slots__ = ('categories', 'latitude', 'longitude', 'radius_km', 'debut_min', 'debut_max',
+                 'note_min', 'definition')
+
+    def __init__(self, categories=None, latitude=None, longitude=None, radius_km=None,
+                 debut_min=None, debut_max=None, note_min=None, definition=None):
+        self.categories = categories
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+        self.debut_min = debut_min
+        self.debut_max = debut_max
+        self.note_min = note_min
+        self.definition = definition or {}
+
+    @classmethod
+    def depuis_message(cls, definition):
+        """Construire le filtre d'un message set_filter; ValueError si invalide"""
+        if not isinstance(definition, dict):
+            raise ValueError("'filter' doit être un objet")
+        valeurs = {}
+
+        categories = definition.get('categories')
+        if categories:
+            if isinstance(categories, str):
+                categories = [categories]
+            if not isinstance(categories, list):
+                raise ValueError("'categories' doit être une chaîne ou une liste")
+            if len(categories) > FILTER_MAX_CATEGORIES:
+                raise ValueError(f'au plus {FILTER_MAX_CATEGORIES} catégories')
+            valeurs['categories'] = frozenset(slug_categorie(str(c)) for c in categories)
+
+        position = [definition.get(champ) for champ in ('latitude', 'longitude', 'radius')]
+        if any(valeur is not None for valeur in position):
+            if any(valeur is None for valeur in position):
+                raise ValueError('latitude, longitude et radius requis ensemble')
+            latitude, longitude, radius = lire_cercle(*position)
+            valeurs.update(latitude=latitude, longitude=longitude, radius_km=radius)
+
+        if definition.get('date_from'):
+            valeurs['debut_min'] = _instant(definition['date_from'])
+        if definition.get('date_to'):
+            valeurs['debut_max'] = _instant(definition['date_to'], fin_de_journee=True)
+        if valeurs.get('debut_min') and valeurs.get('debut_max') \
+                and valeurs['debut_min'] > valeurs['debut_max']:
+            raise ValueError('date_from postérieure à date_to')
+
+        if definition.get('min_rating') is not None:
+            try:
+                valeurs['note_min'] = float(definition['min_rating'])
+            except (TypeError, ValueError):
+                raise ValueError('min_rating doit être un nombre')
+
+        if not valeurs:
+            raise ValueError('aucun critère')
+        return cls(definition=definition, **valeurs)
+
+    def accepte(self, attributs):
+        """Vrai si l'événement décrit par `attributs` passe le filtre"""
+        if not attributs:
+            return True
+        if self.categories is not None and attributs.get('categorie') not in self.categories:
+            return False
+        debut = attributs.get('debut')
+        if debut is not None:
+            if self.debut_min is not None and debut < self.debut_min:
+                return False
+            if self.debut_max is not None and debut > self.debut_max:
+                return False
+        note = attributs.get('moyenne_avis')
+        if self.note_min is not None and note is not None and note < self.note_min:
+            return False
+        if self.radius_km is not None and attributs.get('latitude') is not None:
+            distance = distance_km(
+                self.latitude, self.longitude, attributs['latitude'], attributs['longitude']
+            )
+            if distance > self.radius_km:
+                return False
+        return True
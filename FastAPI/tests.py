@@ -1,3 +1,813 @@
-from django.test import TestCase
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import connections
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .cache_utils import cache_aside
+from .categories import slug_categorie
+from .consumers import MAX_STREAM_SUBSCRIPTIONS
+from .event_reminders import envoyer_rappels_dus
+from .models import Evenement, Lieu, NotificationOutbox, RappelPlanifie, Utilisateur
+from .notification_outbox import OUTBOX_MAX_TENTATIVES, relayer_lot
+from .rate_limit import TokenBucketLimiter, ip_depuis_scope
+from .routing import websocket_urlpatterns
+from .search_index import TYPE_EVENEMENT, PrefixIndex
+from .stream_views import _groupes_demandes, application_sse
+from .subscriber_index import LOCATION_TOPIC_MESSAGE_TYPE, SubscriberSpatialIndex
+from .subscription_filters import (
+    FILTER_MAX_CATEGORIES, FILTER_MAX_RADIUS_KM, FiltreAbonnement, lire_cercle
+)
+from .zone_snapshots import _incrementer_generations, cles_instantanes, evenements_zone
+
+
+class FiltreAbonnementTests(TestCase):
+    """Analyse des messages set_filter et évaluation des attributs d'événements"""
+
+    def attributs(self, **champs):
+        attributs = {
+            'categorie': 'concert',
+            'latitude': 6.13,
+            'longitude': 1.22,
+            'debut': timezone.now().timestamp() + 3600,
+            'moyenne_avis': None,
+        }
+        attributs.update(champs)
+        return attributs
+
+    def test_categories_chaine_ou_liste(self):
+        self.assertEqual(FiltreAbonnement.depuis_message({'categories': 'Concert'}).categories,
+                         {'concert'})
+        filtre = FiltreAbonnement.depuis_message({'categories': ['Concert', 'Bar Lounge']})
+        self.assertEqual(filtre.categories, {'concert', 'bar-lounge'})
+
+    def test_definitions_invalides(self):
+        invalides = [
+            None,
+            [],
+            {},
+            {'categories': 5},
+            {'categories': {'nom': 'Concert'}},
+            {'categories': ['c'] * (FILTER_MAX_CATEGORIES + 1)},
+            {'latitude': 6.13, 'longitude': 1.22},
+            {'latitude': 95, 'longitude': 1.22, 'radius': 5},
+            {'latitude': 6.13, 'longitude': 1.22, 'radius': 0},
+            {'latitude': 6.13, 'longitude': 1.22, 'radius': 500},
+            {'date_from': 'demain'},
+            {'date_from': '2026-10-26', 'date_to': '2026-10-24'},
+            {'min_rating': 'bien'},
+        ]
+        for definition in invalides:
+            with self.subTest(definition=definition):
+                with self.assertRaises(ValueError):
+                    FiltreAbonnement.depuis_message(definition)
+
+    def test_accepte_categorie(self):
+        filtre = FiltreAbonnement.depuis_message({'categories': ['Concert']})
+        self.assertTrue(filtre.accepte(self.attributs()))
+        self.assertFalse(filtre.accepte(self.attributs(categorie='bar')))
+
+    def test_accepte_cercle(self):
+        filtre = FiltreAbonnement.depuis_message({'latitude': 6.13, 'longitude': 1.22, 'radius': 5})
+        self.assertTrue(filtre.accepte(self.attributs(latitude=6.14, longitude=1.23)))
+        self.assertFalse(filtre.accepte(self.attributs(latitude=6.5, longitude=1.22)))
+
+    def test_accepte_fenetre_de_dates(self):
+        filtre = FiltreAbonnement.depuis_message({
+            'date_from': '2026-10-24', 'date_to': '2026-10-26'
+        })
+        debut = timezone.make_aware(datetime(2026, 10, 26, 22, 0)).timestamp()
+        self.assertTrue(filtre.accepte(self.attributs(debut=debut)))
+        self.assertFalse(filtre.accepte(self.attributs(debut=debut + 86400)))
+        self.assertFalse(filtre.accepte(self.attributs(debut=debut - 4 * 86400)))
+
+    def test_accepte_note_minimale(self):
+        filtre = FiltreAbonnement.depuis_message({'min_rating': 4})
+        self.assertTrue(filtre.accepte(self.attributs(moyenne_avis=4.5)))
+        self.assertFalse(filtre.accepte(self.attributs(moyenne_avis=3)))
+        # Événement sans avis: pas encore noté, accepté
+        self.assertTrue(filtre.accepte(self.attributs()))
+
+    def test_message_sans_attributs_accepte(self):
+        filtre = FiltreAbonnement.depuis_message({'categories': ['Concert']})
+        self.assertTrue(filtre.accepte(None))
+
+
+class CercleAbonnementTests(TestCase):
+    """Bornes du cercle des abonnements par localisation (WebSocket et SSE)"""
+
+    class Consumer:
+        channel_name = 'specific.test!1'
+
+    def test_cercle_valide(self):
+        self.assertEqual(lire_cercle('6.13', 1.22, 5), (6.13, 1.22, 5.0))
+
+    def test_cercles_invalides(self):
+        invalides = [
+            (6.13, 1.22, FILTER_MAX_RADIUS_KM + 1),
+            (6.13, 1.22, 1e9),
+            (6.13, 1.22, 'nan'),
+            (6.13, 1.22, float('inf')),
+            (6.13, 1.22, 0),
+            (6.13, 1.22, -5),
+            ('nan', 1.22, 5),
+            (6.13, None, 5),
+            (6.13, 1.22, 'loin'),
+        ]
+        for cercle in invalides:
+            with self.subTest(cercle=cercle):
+                with self.assertRaises(ValueError):
+                    lire_cercle(*cercle)
+
+    def test_index_refuse_un_rayon_demesure(self):
+        index = SubscriberSpatialIndex()
+        with self.assertRaises(ValueError):
+            index.ajouter(self.Consumer(), 6.13, 1.22, 20000, 'location_event_notification')
+        with self.assertRaises(ValueError):
+            index.ajouter(self.Consumer(), 6.13, 1.22, float('nan'), 'location_event_notification')
+        self.assertEqual(len(index), 0)
+
+        abonnement = index.ajouter(self.Consumer(), 6.13, 1.22, 5, 'location_event_notification')
+        self.assertLessEqual(len(abonnement.cellules), 4)
+
+    def test_parametres_sse(self):
+        _, cercle = _groupes_demandes(QueryDict('latitude=6.13&longitude=1.22&radius=5'))
+        self.assertEqual(cercle, (6.13, 1.22, 5.0))
+        for radius in ('100000', 'nan', 'inf'):
+            with self.subTest(radius=radius):
+                with self.assertRaises(ValueError):
+                    _groupes_demandes(QueryDict(f'latitude=6.13&longitude=1.22&radius={radius}'))
+
+
+class CacheAsideTests(TestCase):
+    """Lecture/recalcul de cache_aside: XFetch, verrou de recalcul, valeurs périmées"""
+
+    def setUp(self):
+        cache.clear()
+        self.appels = 0
+
+    def calculer(self):
+        self.appels += 1
+        return f'valeur {self.appels}'
+
+    def entree(self, valeur, restant, delta):
+        cache.set('cle', {
+            'valeur': valeur,
+            'delta': delta,
+            'expire_douce': time.time() + restant,
+        }, 300)
+
+    def test_valeur_calculee_une_fois(self):
+        self.assertEqual(cache_aside('cle', self.calculer, 60), 'valeur 1')
+        with mock.patch('FastAPI.cache_utils.random.random', return_value=0.0):
+            self.assertEqual(cache_aside('cle', self.calculer, 60), 'valeur 1')
+        self.assertEqual(self.appels, 1)
+
+    def test_recalcul_anticipe_avant_expiration(self):
+        # Calcul long (10 s) à 1 s de l'expiration: le tirage déclenche le recalcul
+        self.entree('ancienne', restant=1, delta=10)
+        with mock.patch('FastAPI.cache_utils.random.random', return_value=0.99):
+            self.assertEqual(cache_aside('cle', self.calculer, 60), 'valeur 1')
+        self.assertEqual(cache.get('cle')['valeur'], 'valeur 1')
+
+    def test_pas_de_recalcul_loin_de_l_expiration(self):
+        self.entree('actuelle', restant=50, delta=0.01)
+        with mock.patch('FastAPI.cache_utils.random.random', return_value=0.99):
+            self.assertEqual(cache_aside('cle', self.calculer, 60), 'actuelle')
+        self.assertEqual(self.appels, 0)
+
+    def test_valeur_perimee_servie_pendant_un_recalcul(self):
+        self.entree('perimee', restant=-5, delta=0.01)
+        cache.add('cle_recalcul', 1, 30)
+        self.assertEqual(cache_aside('cle', self.calculer, 60), 'perimee')
+        self.assertEqual(self.appels, 0)
+
+    def test_valeur_perimee_servie_si_le_recalcul_echoue(self):
+        self.entree('perimee', restant=-5, delta=0.01)
+
+        def echouer():
+            raise RuntimeError('base indisponible')
+
+        with self.assertLogs('FastAPI.cache_utils', 'ERROR'):
+            self.assertEqual(cache_aside('cle', echouer, 60), 'perimee')
+        self.assertIsNone(cache.get('cle_recalcul'))
+
+    def test_none_non_mis_en_cache(self):
+        self.assertIsNone(cache_aside('cle', lambda: None, 60))
+        self.assertIsNone(cache.get('cle'))
+        cache_aside('cle', lambda: None, 60, cache_none=True)
+        self.assertIsNone(cache.get('cle')['valeur'])
+
+
+class LieuCategorieTests(TestCase):
+    """Slug de catégorie calculé à la sauvegarde d'un lieu"""
+
+    def test_slug_identique_aux_filtres(self):
+        proprietaire = Utilisateur.objects.create_user(
+            username='proprietaire', email='proprietaire@example.com', password='secret'
+        )
+        lieu = Lieu.objects.create(
+            nom='Chez Tante Ama', description='Maquis', categorie='Bar Lounge',
+            latitude=6.13, longitude=1.22, proprietaire=proprietaire
+        )
+        self.assertEqual(lieu.categorie_slug, slug_categorie('Bar Lounge'))
+
+        lieu.categorie = 'Maquis & Grillades'
+        lieu.save(update_fields=['categorie'])
+        lieu.refresh_from_db()
+        self.assertEqual(lieu.categorie_slug, 'maquis-grillades')
+
+
+class IndexAutocompletionTests(TestCase):
+    """Synchronisation de l'index d'autocomplétion entre processus et expiration"""
+
+    def setUp(self):
+        cache.clear()
+        self.organisateur = Utilisateur.objects.create_user(
+            username='organisateur', email='organisateur@example.com', password='secret'
+        )
+        self.lieu = Lieu.objects.create(
+            nom='Palais des Congrès', description='Salle', categorie='Concert',
+            latitude=6.13, longitude=1.22, proprietaire=self.organisateur
+        )
+
+    def evenement(self, nom, debut):
+        return Evenement.objects.create(
+            nom=nom, description='Description', date_debut=debut,
+            date_fin=debut + timedelta(hours=3), lieu=self.lieu, organisateur=self.organisateur
+        )
+
+    def test_dates_brutes_converties_a_la_sauvegarde(self):
+        evenement = self.evenement('Concert', timezone.now() + timedelta(days=2))
+        evenement.date_debut = '2026-12-01 20:00'
+        evenement.date_fin = '2026-12-01 23:00'
+        evenement.save()
+        self.assertIsInstance(evenement.date_debut, datetime)
+        self.assertTrue(timezone.is_aware(evenement.date_fin))
+        self.assertEqual(evenement.derniers_champs_modifies, ['date_debut', 'date_fin'])
+
+    def test_modification_rejouee_par_un_autre_processus(self):
+        ecrivain, lecteur = PrefixIndex(), PrefixIndex()
+        ecrivain.construire()
+        lecteur.construire()
+
+        evenement = self.evenement('Festival Agbadja', timezone.now() + timedelta(days=2))
+        with self.captureOnCommitCallbacks(execute=True):
+            ecrivain.mettre_a_jour_evenement(evenement)
+
+        lecteur._derniere_verification = 0.0
+        with mock.patch.object(lecteur, '_reconstruire_en_arriere_plan') as reconstruire:
+            resultats = lecteur.rechercher('agbadja')
+        reconstruire.assert_not_called()
+        self.assertEqual([r['id'] for r in resultats], [str(evenement.id)])
+        self.assertEqual(lecteur._generation, ecrivain._generation)
+
+    def test_journal_incomplet_reconstruit_hors_requete(self):
+        lecteur = PrefixIndex()
+        lecteur.construire()
+        cache.set('autocomplete_index_generation', 5, None)
+
+        lecteur._derniere_verification = 0.0
+        with mock.patch.object(lecteur, '_reconstruire_en_arriere_plan') as reconstruire:
+            lecteur.rechercher('palais')
+        reconstruire.assert_called_once()
+
+    def test_evenements_commences_retires(self):
+        evenement = self.evenement('Concert du soir', timezone.now() + timedelta(hours=1))
+        index = PrefixIndex()
+        index.construire()
+        self.assertIn((TYPE_EVENEMENT, str(evenement.id)), index._entrees)
+
+        plus_tard = timezone.now() + timedelta(hours=2)
+        with mock.patch('FastAPI.search_index.timezone.now', return_value=plus_tard):
+            index._purger_expires()
+        self.assertNotIn((TYPE_EVENEMENT, str(evenement.id)), index._entrees)
+        self.assertFalse([cle for cle in index._cles if cle[2] == str(evenement.id)])
+
+
+@override_settings(NOTIFICATION_RELAY_INLINE=False)
+class RelaisOutboxTests(TestCase):
+    """Publication des lignes NotificationOutbox par relayer_lot (channel layer simulé)"""
+
+    def setUp(self):
+        # Connexion du thread du test (la publication s'exécute dans un autre thread)
+        self.connexion = connections['default']
+        self.publiees = []
+        self.echecs = {}
+        self.profondeur_transaction = None
+
+    async def publier(self, channel_layer, lot):
+        self.publiees.extend(notification.id for notification in lot)
+        self.profondeur_transaction = len(self.connexion.atomic_blocks)
+        return {
+            notification.id: echec
+            for notification, echec in ((n, self.echecs.get(n.id)) for n in lot)
+            if echec
+        }
+
+    def relayer(self):
+        with mock.patch('FastAPI.notification_outbox._publier_lot', self.publier):
+            return relayer_lot()
+
+    def ligne(self, **champs):
+        return NotificationOutbox.objects.create(
+            groupes=['events_notifications', 'category_bar'],
+            message={'type': 'new_event_notification', 'frame': '{}'},
+            **champs
+        )
+
+    def test_lignes_publiees_supprimees(self):
+        lignes = [self.ligne(), self.ligne()]
+        self.assertEqual(self.relayer(), 2)
+        self.assertEqual(self.publiees, [ligne.id for ligne in lignes])
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_publication_hors_transaction(self):
+        self.ligne()
+        profondeur = len(self.connexion.atomic_blocks)
+        self.relayer()
+        self.assertEqual(self.profondeur_transaction, profondeur)
+
+    def test_lignes_futures_ignorees(self):
+        self.ligne(prochain_essai=timezone.now() + timedelta(minutes=5))
+        self.ligne(prochain_essai=None)
+        self.assertEqual(self.relayer(), 0)
+        self.assertEqual(self.publiees, [])
+
+    def test_echec_replanifie_les_groupes_restants(self):
+        ligne = self.ligne()
+        self.echecs[ligne.id] = (['category_bar'], 'Redis indisponible')
+        self.assertEqual(self.relayer(), 1)
+
+        ligne.refresh_from_db()
+        self.assertEqual(ligne.groupes, ['category_bar'])
+        self.assertEqual(ligne.tentatives, 1)
+        self.assertEqual(ligne.derniere_erreur, 'Redis indisponible')
+        self.assertGreater(ligne.prochain_essai, timezone.now())
+
+    def test_abandon_apres_trop_d_echecs(self):
+        ligne = self.ligne(tentatives=OUTBOX_MAX_TENTATIVES - 1)
+        self.echecs[ligne.id] = (['category_bar'], 'Redis indisponible')
+        self.relayer()
+
+        ligne.refresh_from_db()
+        self.assertEqual(ligne.tentatives, OUTBOX_MAX_TENTATIVES)
+        self.assertIsNone(ligne.prochain_essai)
+
+
+class TokenBucketLimiterTests(TestCase):
+    """Décisions du seau local et du script Redis (client Redis simulé)"""
+
+    def client_redis(self, *resultats):
+        client = mock.Mock()
+        client.register_script.return_value = mock.Mock(side_effect=list(resultats))
+        return client
+
+    def test_seau_local_refuse_sans_redis(self):
+        limiteur = TokenBucketLimiter('ws_message', capacite=2, debit=0.001)
+        client = self.client_redis([1, b'0'], [1, b'0'])
+        with mock.patch('FastAPI.rate_limit.get_redis', return_value=client):
+            self.assertTrue(limiteur.autoriser('1.2.3.4')[0])
+            self.assertTrue(limiteur.autoriser('1.2.3.4')[0])
+            autorise, attente = limiteur.autoriser('1.2.3.4')
+        self.assertFalse(autorise)
+        self.assertGreater(attente, 0)
+        self.assertEqual(client.register_script.return_value.call_count, 2)
+        client.register_script.assert_called_once()
+
+    def test_refus_redis_bloque_localement(self):
+        limiteur = TokenBucketLimiter('ws_message', capacite=10, debit=1)
+        client = self.client_redis([0, b'2.5'])
+        with mock.patch('FastAPI.rate_limit.get_redis', return_value=client):
+            self.assertEqual(limiteur.autoriser('1.2.3.4'), (False, 2.5))
+            autorise, attente = limiteur.autoriser('1.2.3.4')
+        self.assertFalse(autorise)
+        self.assertLessEqual(attente, 2.5)
+        # Le second refus est local: un seul appel du script
+        self.assertEqual(client.register_script.return_value.call_count, 1)
+
+    def test_redis_indisponible_decisions_locales(self):
+        limiteur = TokenBucketLimiter('ws_message', capacite=1, debit=0.001)
+        with mock.patch('FastAPI.rate_limit.get_redis', side_effect=ConnectionError('refusé')) as get_redis, \
+                self.assertLogs('FastAPI.rate_limit', 'ERROR'):
+            self.assertEqual(limiteur.autoriser('1.2.3.4'), (True, 0))
+            self.assertTrue(limiteur.autoriser('5.6.7.8')[0])
+            self.assertFalse(limiteur.autoriser('1.2.3.4')[0])
+        # Pendant REDIS_RETRY_DELAY, Redis n'est plus sollicité
+        get_redis.assert_called_once()
+
+    def test_chemin_asynchrone(self):
+        limiteur = TokenBucketLimiter('ws_connexion', capacite=5, debit=1)
+        client = mock.Mock()
+        client.register_script.return_value = mock.AsyncMock(side_effect=[[1, b'0'], [0, b'1.5']])
+        with mock.patch('FastAPI.rate_limit.get_async_redis', return_value=client):
+            self.assertEqual(asyncio.run(limiteur.autoriser_async('1.2.3.4')), (True, 0.0))
+            self.assertEqual(asyncio.run(limiteur.autoriser_async('1.2.3.4')), (False, 1.5))
+        script = client.register_script.return_value
+        self.assertEqual(script.await_args.kwargs['keys'], ['ratelimit:ws_connexion:1.2.3.4'])
+        self.assertEqual(script.await_args.kwargs['args'], [5, 1, 1])
+
+
+class IpDepuisScopeTests(TestCase):
+    """Adresse du client derrière REST_FRAMEWORK['NUM_PROXIES'] proxys de confiance"""
+
+    def scope(self, transmise=None):
+        headers = [(b'x-forwarded-for', transmise.encode())] if transmise else []
+        return {'client': ('10.0.0.9', 51000), 'headers': headers}
+
+    def test_nombre_de_proxys(self):
+        transmise = 'falsifiee, 203.0.113.7, 10.0.0.1'
+        cas = [
+            (None, '10.0.0.1'),
+            (0, '10.0.0.9'),
+            (1, '10.0.0.1'),
+            (2, '203.0.113.7'),
+            (5, 'falsifiee'),
+        ]
+        for nombre, attendue in cas:
+            with self.subTest(num_proxies=nombre):
+                with override_settings(REST_FRAMEWORK={'NUM_PROXIES': nombre}):
+                    self.assertEqual(ip_depuis_scope(self.scope(transmise)), attendue)
+
+    def test_sans_en_tete(self):
+        with override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1}):
+            self.assertEqual(ip_depuis_scope(self.scope()), '10.0.0.9')
+            self.assertEqual(ip_depuis_scope({'headers': []}), 'inconnu')
+
+
+@override_settings(NOTIFICATION_RELAY_INLINE=False)
+class EvenementPatchTests(TestCase):
+    """Deltas event_patch des modifications et sauvegardes sans changement"""
+
+    def setUp(self):
+        organisateur = Utilisateur.objects.create_user(
+            username='organisateur', email='organisateur@example.com', password='secret'
+        )
+        self.lieu = Lieu.objects.create(
+            nom='Palais des Congrès', description='Salle', categorie='Concert',
+            latitude=6.13, longitude=1.22, proprietaire=organisateur
+        )
+        debut = timezone.now() + timedelta(days=3)
+        self.evenement = Evenement.objects.create(
+            nom='Concert', description='Concert du soir', date_debut=debut,
+            date_fin=debut + timedelta(hours=3), lieu=self.lieu, organisateur=organisateur
+        )
+        self.evenement = Evenement.objects.get(pk=self.evenement.pk)
+        NotificationOutbox.objects.all().delete()
+
+    def trames_evenement(self):
+        groupe = f'event_{self.evenement.id}'
+        return [
+            json.loads(ligne.message['frame'])
+            for ligne in NotificationOutbox.objects.all()
+            if ligne.groupes == [groupe]
+        ]
+
+    def test_delta_des_champs_modifies(self):
+        self.evenement.nom = 'Concert de gala'
+        self.evenement.save()
+
+        trames = self.trames_evenement()
+        self.assertEqual(len(trames), 1)
+        self.assertEqual(trames[0]['type'], 'event_patch')
+        self.assertEqual(trames[0]['version'], 2)
+        self.assertEqual(trames[0]['changed_fields'], {'nom': 'Concert de gala'})
+
+    def test_delta_de_l_organisateur(self):
+        autre = Utilisateur.objects.create_user(
+            username='autre', email='autre@example.com', password='secret'
+        )
+        self.evenement.organisateur = autre
+        self.evenement.save()
+
+        changements = self.trames_evenement()[0]['changed_fields']
+        self.assertEqual(changements['organisateur_id'], str(autre.id))
+        self.assertEqual(changements['organisateur_nom'], autre.username)
+
+    def test_sauvegarde_sans_changement_ignoree(self):
+        # Même valeur assignée sous forme brute (formulaire web)
+        self.evenement.date_debut = self.evenement.date_debut.isoformat()
+        with self.assertNumQueries(0):
+            self.evenement.save()
+        self.evenement.refresh_from_db()
+        self.assertEqual(self.evenement.version, 1)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_champs_hors_update_fields_ignores(self):
+        self.evenement.nom = 'Concert de gala'
+        self.evenement.save(update_fields=['description'])
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+
+@override_settings(NOTIFICATION_RELAY_INLINE=False)
+class InstantanesZoneTests(TestCase):
+    """Événements à venir d'une zone: filtrage au rayon et à l'heure, invalidation"""
+
+    def setUp(self):
+        cache.clear()
+        self.organisateur = Utilisateur.objects.create_user(
+            username='organisateur', email='organisateur@example.com', password='secret'
+        )
+        self.proche = self.lieu('Palais des Congrès', 6.13, 1.22)
+        # ~19 km au nord
+        self.eloigne = self.lieu('Marché de Tsévié', 6.30, 1.22)
+
+    def lieu(self, nom, latitude, longitude):
+        return Lieu.objects.create(
+            nom=nom, description='Lieu', categorie='Concert',
+            latitude=latitude, longitude=longitude, proprietaire=self.organisateur
+        )
+
+    def evenement(self, nom, lieu, debut):
+        return Evenement.objects.create(
+            nom=nom, description='Description', date_debut=debut,
+            date_fin=debut + timedelta(hours=3), lieu=lieu, organisateur=self.organisateur
+        )
+
+    def noms(self, radius_km=5):
+        return [event['nom'] for event in evenements_zone(6.13, 1.22, radius_km)]
+
+    def test_filtre_au_rayon_exact(self):
+        self.evenement('Concert', self.proche, timezone.now() + timedelta(days=1))
+        self.evenement('Foire', self.eloigne, timezone.now() + timedelta(days=2))
+        self.assertEqual(self.noms(5), ['Concert'])
+        self.assertEqual(self.noms(25), ['Concert', 'Foire'])
+
+    def test_evenements_commences_ecartes_de_l_instantane(self):
+        self.evenement('Concert', self.proche, timezone.now() + timedelta(hours=1))
+        self.evenement('Festival', self.proche, timezone.now() + timedelta(days=1))
+        self.assertEqual(self.noms(), ['Concert', 'Festival'])
+
+        # Instantané en cache: le premier événement a commencé depuis
+        plus_tard = time.time() + 2 * 3600
+        with mock.patch('FastAPI.zone_snapshots.time.time', return_value=plus_tard):
+            self.assertEqual(self.noms(), ['Festival'])
+
+    def test_ecriture_invalide_la_zone(self):
+        self.assertEqual(self.noms(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.evenement('Concert', self.proche, timezone.now() + timedelta(days=1))
+        self.assertEqual(self.noms(), ['Concert'])
+
+    def test_generation_absente_incrementee(self):
+        cellules = [(0, 613, 122)]
+        avant = cles_instantanes(cellules)
+        cle_generation = 'instantane_zone_generation_geo_0_613_122'
+        _incrementer_generations([cle_generation])
+        self.assertEqual(cache.get(cle_generation), 2)
+        _incrementer_generations([cle_generation])
+        self.assertEqual(cache.get(cle_generation), 3)
+        self.assertNotEqual(cles_instantanes(cellules), avant)
+
+
+@override_settings(NOTIFICATION_RELAY_INLINE=False)
+class RappelsEvenementsTests(TestCase):
+    """Envoi unique des rappels planifiés (envoyer_rappels_dus)"""
+
+    def setUp(self):
+        self.organisateur = Utilisateur.objects.create_user(
+            username='organisateur', email='organisateur@example.com', password='secret'
+        )
+        self.lieu = Lieu.objects.create(
+            nom='Palais des Congrès', description='Salle', categorie='Concert',
+            latitude=6.13, longitude=1.22, proprietaire=self.organisateur
+        )
+        # Début dans 50 minutes: seul le rappel d'une heure est planifié, et il est dû
+        debut = timezone.now() + timedelta(minutes=50)
+        self.evenement = Evenement.objects.create(
+            nom='Concert', description='Concert du soir', date_debut=debut,
+            date_fin=debut + timedelta(hours=3), lieu=self.lieu, organisateur=self.organisateur
+        )
+        NotificationOutbox.objects.all().delete()
+
+    def messages_outbox(self, type_message):
+        messages = NotificationOutbox.objects.values_list('message', flat=True)
+        return [message for message in messages if message.get('type') == type_message]
+
+    def test_rappel_du_envoye_une_seule_fois(self):
+        rappel = RappelPlanifie.objects.get(evenement=self.evenement)
+        self.assertEqual(rappel.avance, 60)
+
+        self.assertEqual(envoyer_rappels_dus(), 1)
+        rappel.refresh_from_db()
+        self.assertEqual(rappel.statut, RappelPlanifie.STATUT_ENVOYE)
+        self.assertIsNotNone(rappel.date_traitement)
+
+        rappels = self.messages_outbox('event_reminder')
+        self.assertEqual(len(rappels), 1)
+        frame = json.loads(rappels[0]['frame'])
+        self.assertEqual(frame['reminder_time'], '1 heure')
+        self.assertTrue(frame['is_organizer'])
+        # Rappel géographique: trames de localisation avec le délai
+        localisation = self.messages_outbox(LOCATION_TOPIC_MESSAGE_TYPE)
+        self.assertEqual(len(localisation), 1)
+        frame = json.loads(localisation[0]['frames']['location_event'])
+        self.assertEqual(frame['notification'], 'proximity_event_reminder')
+        self.assertEqual(frame['reminder_time'], '1 heure')
+
+        # Deuxième passage: rien n'est dû
+        self.assertEqual(envoyer_rappels_dus(), 0)
+        self.assertEqual(len(self.messages_outbox('event_reminder')), 1)
+
+    def test_rappel_d_une_ancienne_date_expire(self):
+        # Date modifiée sans signal: le rappel planifié ne correspond plus
+        Evenement.objects.filter(pk=self.evenement.pk).update(
+            date_debut=self.evenement.date_debut + timedelta(days=1)
+        )
+        self.assertEqual(envoyer_rappels_dus(), 1)
+        rappel = RappelPlanifie.objects.get(evenement=self.evenement)
+        self.assertEqual(rappel.statut, RappelPlanifie.STATUT_EXPIRE)
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_rappel_trop_en_retard_expire(self):
+        RappelPlanifie.objects.filter(evenement=self.evenement).update(
+            date_envoi=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(envoyer_rappels_dus(), 1)
+        self.assertEqual(
+            RappelPlanifie.objects.get(evenement=self.evenement).statut,
+            RappelPlanifie.STATUT_EXPIRE
+        )
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_rappel_futur_non_envoye(self):
+        RappelPlanifie.objects.filter(evenement=self.evenement).update(
+            date_envoi=timezone.now() + timedelta(minutes=10)
+        )
+        self.assertEqual(envoyer_rappels_dus(), 0)
+        self.assertEqual(
+            RappelPlanifie.objects.get(evenement=self.evenement).statut,
+            RappelPlanifie.STATUT_PLANIFIE
+        )
+
+
+@override_settings(
+    NOTIFICATION_RELAY_INLINE=False,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class AnnulationLocalisationTests(TestCase):
+    """Annulation d'un événement affiché remise à un client /ws/location/"""
+
+    def setUp(self):
+        cache.clear()
+        organisateur = Utilisateur.objects.create_user(
+            username='organisateur', email='organisateur@example.com', password='secret'
+        )
+        lieu = Lieu.objects.create(
+            nom='Palais des Congrès', description='Salle', categorie='Concert',
+            latitude=6.13, longitude=1.22, proprietaire=organisateur
+        )
+        debut = timezone.now() + timedelta(days=1)
+        self.evenement = Evenement.objects.create(
+            nom='Concert', description='Concert du soir', date_debut=debut,
+            date_fin=debut + timedelta(hours=3), lieu=lieu, organisateur=organisateur
+        )
+        NotificationOutbox.objects.all().delete()
+
+    async def connecter(self):
+        client = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/location/6.13/1.22/5/')
+        connecte, _ = await client.connect()
+        self.assertTrue(connecte)
+        instantane = await client.receive_json_from()
+        self.assertEqual(instantane['type'], 'current_events')
+        self.assertEqual([event['id'] for event in instantane['events']], [str(self.evenement.id)])
+        return client
+
+    async def annuler(self):
+        """Supprimer l'événement puis publier l'outbox sur la boucle du test"""
+        await database_sync_to_async(self.evenement.delete)()
+        lignes = await database_sync_to_async(list)(NotificationOutbox.objects.all())
+        channel_layer = get_channel_layer()
+        for ligne in lignes:
+            for groupe in ligne.groupes:
+                await channel_layer.group_send(groupe, ligne.message)
+
+    def test_annulation_remise_apres_subscribe_event(self):
+        async def scenario():
+            client = await self.connecter()
+            await client.send_json_to({'type': 'subscribe_event', 'event_ids': [str(self.evenement.id)]})
+            self.assertEqual((await client.receive_json_from())['type'], 'subscription_confirmed')
+
+            event_id = str(self.evenement.id)
+            await self.annuler()
+            trame = await client.receive_json_from(timeout=2)
+            self.assertEqual(trame['type'], 'event_cancelled')
+            self.assertEqual(trame['event']['id'], event_id)
+            await client.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_pas_d_annulation_sans_abonnement(self):
+        async def scenario():
+            client = await self.connecter()
+            await self.annuler()
+            self.assertTrue(await client.receive_nothing(timeout=0.5))
+            await client.disconnect()
+
+        async_to_sync(scenario)()
+
+
+class ParametresSSETests(TestCase):
+    """Groupes et cercle demandés par les paramètres du flux SSE"""
+
+    def test_flux_global_par_defaut(self):
+        self.assertEqual(_groupes_demandes(QueryDict('')), (['events_notifications'], None))
+
+    def test_categories_et_evenements(self):
+        event_id = '8c3f0e7a-3d4b-4a9e-9a57-1c2d3e4f5a6b'
+        groupes, cercle = _groupes_demandes(
+            QueryDict(f'category=Bar Lounge&category=Bar Lounge&event={event_id}')
+        )
+        self.assertEqual(groupes, ['category_bar_lounge', f'event_{event_id}'])
+        self.assertIsNone(cercle)
+
+    def test_parametres_invalides(self):
+        trop = '&'.join(f'category=c{n}' for n in range(MAX_STREAM_SUBSCRIPTIONS + 1))
+        for requete in ('event=inconnu', trop, 'latitude=6.13', 'latitude=6.13&longitude=est'):
+            with self.subTest(requete=requete):
+                with self.assertRaises(ValueError):
+                    _groupes_demandes(QueryDict(requete))
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class ApplicationSSETests(TestCase):
+    """Flux SSE servi avant Django: hôte, CORS et reprise par Last-Event-ID"""
+
+    def scope(self, method='GET', host=b'testserver', **entetes):
+        headers = [(b'host', host)]
+        headers += [(nom.replace('_', '-').encode(), valeur.encode()) for nom, valeur in entetes.items()]
+        return {
+            'type': 'http', 'method': method, 'path': '/fastapi/stream/events/',
+            'query_string': b'', 'headers': headers, 'client': ('127.0.0.1', 50000),
+        }
+
+    async def reponse(self, scope):
+        communicator = ApplicationCommunicator(application_sse, scope)
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        debut = await communicator.receive_output(2)
+        corps = await communicator.receive_output(2)
+        return debut['status'], dict(debut['headers']), json.loads(corps['body'])
+
+    @override_settings(ALLOWED_HOSTS=['lome.example'])
+    def test_hote_non_autorise(self):
+        with self.assertLogs('FastAPI.stream_views', 'WARNING'):
+            statut, _, corps = async_to_sync(self.reponse)(self.scope(host=b'ailleurs.example'))
+        self.assertEqual(statut, 400)
+        self.assertEqual(corps['error'], 'Hôte non autorisé')
+
+    @override_settings(CORS_ALLOW_ALL_ORIGINS=False, CORS_ALLOWED_ORIGINS=['https://app.lome.example'])
+    def test_en_tetes_cors_de_l_origine_autorisee(self):
+        statut, entetes, _ = async_to_sync(self.reponse)(
+            self.scope(method='POST', origin='https://app.lome.example')
+        )
+        self.assertEqual(statut, 405)
+        self.assertEqual(entetes[b'access-control-allow-origin'], b'https://app.lome.example')
+
+        statut, entetes, _ = async_to_sync(self.reponse)(
+            self.scope(method='POST', origin='https://ailleurs.example')
+        )
+        self.assertEqual(statut, 405)
+        self.assertNotIn(b'access-control-allow-origin', entetes)
+
+    def test_reprise_depuis_last_event_id(self):
+        manquee = {'type': 'new_event_notification', 'frame': '{"type":"new_event"}', 'seq': 6}
+        relire = mock.AsyncMock(return_value=([manquee], 7, None))
+        limiteur = mock.Mock(autoriser_async=mock.AsyncMock(return_value=(True, 0)))
+
+        async def scenario():
+            communicator = ApplicationCommunicator(application_sse, self.scope(last_event_id='5'))
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            debut = await asyncio.wait_for(communicator.output_queue.get(), 2)
+            blocs = [
+                (await asyncio.wait_for(communicator.output_queue.get(), 2))['body'].decode()
+                for _ in range(2)
+            ]
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(2)
+            return debut, blocs
+
+        with mock.patch('FastAPI.stream_views.relire', relire), \
+                mock.patch('FastAPI.stream_views.position_courante', mock.AsyncMock(return_value=7)), \
+                mock.patch('FastAPI.stream_views.limiteur_connexions_ws', limiteur):
+            debut, (etabli, reprise) = async_to_sync(scenario)()
+
+        self.assertEqual(debut['status'], 200)
+        self.assertEqual(dict(debut['headers'])[b'content-type'], b'text/event-stream; charset=utf-8')
+        relire.assert_awaited_once_with(['events_notifications'], '5')
+        # Connexion établie sans id: le navigateur garde le Last-Event-ID de reprise
+        self.assertTrue(etabli.startswith('retry: 5000\ndata: '))
+        self.assertIn('id: 6\ndata: {"type":"new_event"}\n\n', reprise)
+        self.assertIn('resume_complete', reprise)
+        self.assertIn('id: 7\n', reprise)
@@ -4,6 +4,7 @@ from rest_framework.authtoken.views import obtain_auth_token
 from . import views
 from . import geolocation_views
 from . import web_views
+from . import stream_views
 
 # Configuration du routeur pour les ViewSets
 router = DefaultRouter()
@@ -55,6 +56,20 @@ urlpatterns = [
     path('auth/profile/', views.profile, name='profile'),
     path('auth/token/', obtain_auth_token, name='api_token_auth'),
     
+    # Autocomplétion (index de préfixes en mémoire)
+    path('api/autocomplete/', views.autocomplete, name='autocomplete'),
+    
+    # Catégories de lieux avec comptes (cache invalidé à chaque écriture sur Lieu)
+    path('api/categories/', views.categories, name='categories'),
+    
+    # Notifications personnelles persistées (utilisateur authentifié)
+    path('api/notifications/', views.notifications_non_lues, name='notifications_non_lues'),
+    path('api/notifications/mark-read/', views.marquer_notifications_lues, name='marquer_notifications_lues'),
+    
+    # Flux Server-Sent Events des notifications (Last-Event-ID pour la reprise);
+    # sous Daphne, la même URL est servie avant Django (routing.http_urlpatterns)
+    path('stream/events/', stream_views.flux_evenements, name='flux_evenements'),
+    
     # ViewSets automatiques via le routeur
     path('api/', include(router.urls)),
     
@@ -76,6 +91,9 @@ urlpatterns = [
     path('geo/validate-lome/', geolocation_views.validate_lome_location, name='validate_lome_location'),
     path('geo/ip-location/', geolocation_views.ip_location, name='ip_location'),
     path('geo/map-data/', geolocation_views.map_data, name='map_data'),
+    
+    # Supervision WebSocket (administrateurs)
+    path('admin-api/websocket-stats/', views.websocket_stats, name='websocket_stats'),
 ]
 
 
@@ -83,6 +101,11 @@ urlpatterns = [
 websocket_urlpatterns = [
     # WebSocket général pour les notifications d'événements
     # ws://localhost:8000/ws/events/
+    # Nouveaux événements (résumé); modifications, annulations et avis d'un événement
+    # seulement après {"type": "subscribe_event", "event_ids": [...]} (unsubscribe_event)
+    # Filtre côté serveur des nouveaux événements (aussi sur /ws/stream/):
+    # {"type": "set_filter", "filter": {"categories", "latitude", "longitude", "radius",
+    #  "date_from", "date_to", "min_rating"}} ou {"type": "clear_filter"}
     
     # WebSocket pour les notifications personnelles (utilisateur authentifié)  
     # ws://localhost:8000/ws/personal/
@@ -90,10 +113,32 @@ websocket_urlpatterns = [
     # WebSocket basé sur la localisation
     # ws://localhost:8000/ws/location/<lat>/<lng>/
     # ws://localhost:8000/ws/location/<lat>/<lng>/<radius>/
+    # Annulations et modifications des événements de current_events après
+    # {"type": "subscribe_event", "event_ids": [...]}; set_filter / clear_filter acceptés
+    
+    # WebSocket multiplexé: une connexion, abonnements par messages
+    # ws://localhost:8000/ws/stream/
+    # {"type": "subscribe"|"unsubscribe", "topic": "global"|"personal"|"location"|"category"|"event", ...}
+    
+    # Encodage négocié par sous-protocole (voir frame_codecs.py):
+    # lome.msgpack, lome.json.deflate ou lome.json (défaut)
+    
+    # Battements de cœur (voir connection_guard.py): un client qui répond {"type": "pong"}
+    # aux {"type": "ping"} du serveur est fermé (code 4408) sans trame reçue pendant 90 s.
+    # Serveur saturé: trame 'server_busy' avec retry_after, puis fermeture (code 1013)
 ]
 
 # URLs générées automatiquement par le routeur :
 # 
+# AUTOCOMPLETION:
+# GET    /api/autocomplete/?q=<préfixe>        - Noms de lieux et d'événements à venir
+#                                                (paramètres: type=lieu|evenement, limit)
+# GET    /api/categories/                      - Catégories et nombre de lieux par catégorie
+# 
+# NOTIFICATIONS PERSONNELLES:
+# GET    /api/notifications/?cursor=<curseur>  - Notifications non lues par pages (limit, next_cursor)
+# POST   /api/notifications/mark-read/         - Marquer comme lues: {"ids": [...]} ou {"all": true}
+# 
 # LIEUX:
 # GET    /api/lieux/                           - Liste des lieux
 # POST   /api/lieux/                           - Créer un lieu
@@ -126,4 +171,8 @@ websocket_urlpatterns = [
 # POST   /api/avis-evenements/                 - Créer un avis d'événement
 # GET    /api/avis-evenements/{id}/            - Détails d'un avis d'événement
 # PUT    /api/avis-evenements/{id}/            - Modifier un avis d'événement
-# DELETE /api/avis-evenements/{id}/            - Supprimer un avis d'événement
\ No newline at end of file
+# DELETE /api/avis-evenements/{id}/            - Supprimer un avis d'événement
+#
+# SUPERVISION (administrateurs):
+# GET    /admin-api/websocket-stats/           - Connexions par processus, groupes, utilisateurs
+#                                                uniques (présence Redis) et métriques
@@ -0,0 +1,120 @@
+"""
+Notifications personnelles persistées (modèle Notification)
+Fichier: user_notifications.py
+
+Une notification est écrite en base puis mise en file dans l'outbox pour le
+groupe user_<id>, dans la même transaction. Les non lues sont relues par
+pages (pagination par curseur sur l'index partiel notif_non_lues_idx): à la
+connexion à /ws/personal/, puis à la demande du client.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification
+from .notification_outbox import enregistrer_notifications
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_PAGE_SIZE = 20
+NOTIFICATIONS_PAGE_MAX = 100
+
+# Lignes supprimées par requête lors de l'archivage
+ARCHIVE_BATCH_SIZE = 1000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECONDE = timedelta(microseconds=1)
+
+
+def creer_notifications(destinataires, type_notification, message, **donnees):
+    """
+    Créer la même notification pour plusieurs utilisateurs (un INSERT groupé
+    pour les notifications, un pour l'outbox) et la publier après le commit
+    """
+    maintenant = timezone.now()
+    notifications = Notification.objects.bulk_create([
+        Notification(
+            utilisateur_id=utilisateur_id,
+            type=type_notification,
+            message=message[:255],
+            donnees=donnees,
+            date_creation=maintenant,
+        )
+        for utilisateur_id in set(destinataires)
+    ])
+    enregistrer_notifications([
+        (
+            [f'user_{notification.utilisateur_id}'],
+            {'type': 'personal_notification', 'notification_data': notification.to_dict()}
+        )
+        for notification in notifications
+    ])
+    return notifications
+
+
+def _curseur(notification):
+    """Position d'une notification dans l'ordre (date_creation, id) décroissant"""
+    return f'{(notification.date_creation - _EPOCH) // _MICROSECONDE}_{notification.id}'
+
+
+def _lire_curseur(curseur):
+    """Curseur -> (date_creation, id); ValueError si le format est invalide"""
+    microsecondes, _, identifiant = curseur.partition('_')
+    return _EPOCH + timedelta(microseconds=int(microsecondes)), int(identifiant)
+
+
+def compter_non_lues(utilisateur_id):
+    return Notification.objects.filter(utilisateur_id=utilisateur_id, lue=False).count()
+
+
+def page_non_lues(utilisateur_id, curseur=None, taille=NOTIFICATIONS_PAGE_SIZE):
+    """
+    Notifications non lues, des plus récentes aux plus anciennes, après `curseur`.
+    Retourne (notifications sérialisées, curseur de la page suivante ou None).
+    Lève ValueError si le curseur est invalide.
+    """
+    taille = max(1, min(int(taille), NOTIFICATIONS_PAGE_MAX))
+    notifications = Notification.objects.filter(
+        utilisateur_id=utilisateur_id, lue=False
+    ).order_by('-date_creation', '-id')
+
+    if curseur:
+        date_creation, identifiant = _lire_curseur(curseur)
+        notifications = notifications.filter(
+            Q(date_creation__lt=date_creation) | Q(date_creation=date_creation, id__lt=identifiant)
+        )
+
+    page = list(notifications[:taille + 1])
+    suivant = _curseur(page[taille - 1]) if len(page) > taille else None
+    return [notification.to_dict() for notification in page[:taille]], suivant
+
+
+def marquer_lues(utilisateur_id, ids=None):
+    """Marquer comme lues les notifications `ids` (toutes si None); retourne le nombre modifié"""
+    notifications = Notification.objects.filter(utilisateur_id=utilisateur_id, lue=False)
+    if ids is not None:
+        notifications = notifications.filter(id__in=ids)
+    return notifications.update(lue=True, date_lecture=timezone.now())
+
+
+def archiver_notifications(avant, batch_size=ARCHIVE_BATCH_SIZE, exporter=None):
+    """
+    Supprimer par lots les notifications lues avant `avant`.
+    `exporter(lignes)` reçoit chaque lot (dictionnaires) avant sa suppression.
+    Retourne le nombre de lignes supprimées.
+    """
+    anciennes = Notification.objects.filter(lue=True, date_lecture__lt=avant).order_by('date_lecture')
+    total = 0
+    while True:
+        lot = list(anciennes.values(
+            'id', 'utilisateur_id', 'type', 'message', 'donnees', 'date_creation', 'date_lecture'
+        )[:batch_size])
+        if not lot:
+            return total
+        if exporter is not None:
+            exporter(lot)
+        Notification.objects.filter(id__in=[ligne['id'] for ligne in lot]).delete()
+        total += len(lot)
@@ -2,18 +2,26 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
 from django.contrib.auth import login
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.db.models import Q, Avg
-from .models import Utilisateur, Lieu, Evenement, AvisLieu, AvisEvenement
+from .models import Lieu, Evenement, AvisLieu, AvisEvenement
 from .serializers import (
     UtilisateurSerializer, UtilisateurCreateSerializer, LoginSerializer,
     LieuSerializer, LieuDetailSerializer, LieuListSerializer,
     EvenementSerializer, EvenementDetailSerializer, EvenementListSerializer,
     AvisLieuSerializer, AvisEvenementSerializer
 )
+from .search_index import autocomplete_index, TYPE_LIEU, TYPE_EVENEMENT
+from .cache_utils import cached_api_response
+from .statistiques import StatistiquesService
+from .websocket_utils import WebSocketHealthCheck
+from .user_notifications import compter_non_lues, marquer_lues, page_non_lues
+from .categories import (
+    get_categories_facettes, slug_categorie, LOME_LAT_RANGE, LOME_LNG_RANGE
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -118,7 +126,7 @@ class LieuViewSet(viewsets.ModelViewSet):
         search = self.request.query_params.get('search')
         
         if categorie:
-            queryset = queryset.filter(categorie__icontains=categorie)
+            queryset = queryset.filter(categorie_slug=slug_categorie(categorie))
         
         if proprietaire:
             queryset = queryset.filter(proprietaire__username__icontains=proprietaire)
@@ -389,22 +397,23 @@ class AvisEvenementViewSet(viewsets.ModelViewSet):
 # Vues pour les statistiques et données publiques
 @api_view(['GET'])
 @permission_classes([])
+@cached_api_response('statistiques')
 def statistiques(request):
     """Statistiques générales de l'application"""
+    stats = StatistiquesService.get()
     return Response({
-        'nombre_lieux': Lieu.objects.count(),
-        'nombre_evenements': Evenement.objects.count(),
-        'nombre_utilisateurs': Utilisateur.objects.filter(is_active=True).count(),
-        'nombre_avis_lieux': AvisLieu.objects.count(),
-        'nombre_avis_evenements': AvisEvenement.objects.count(),
-        'evenements_a_venir': Evenement.objects.filter(
-            date_debut__gt=timezone.now()
-        ).count()
+        'nombre_lieux': stats.nombre_lieux,
+        'nombre_evenements': stats.nombre_evenements,
+        'nombre_utilisateurs': stats.nombre_utilisateurs_actifs,
+        'nombre_avis_lieux': stats.nombre_avis_lieux,
+        'nombre_avis_evenements': stats.nombre_avis_evenements,
+        'evenements_a_venir': stats.evenements_a_venir
     })
 
 
 @api_view(['GET'])
 @permission_classes([])
+@cached_api_response('lieux_populaires')
 def lieux_populaires(request):
     """Top 10 des lieux les plus populaires (par nombre d'événements)"""
     from django.db.models import Count
@@ -419,6 +428,7 @@ def lieux_populaires(request):
 
 @api_view(['GET'])
 @permission_classes([])
+@cached_api_response('evenements_tendances')
 def evenements_tendances(request):
     """Événements tendances (à venir avec le plus d'avis positifs)"""
     from django.db.models import Count, Avg
@@ -436,15 +446,12 @@ def evenements_tendances(request):
 
 @api_view(['GET'])
 @permission_classes([])
+@cached_api_response('donnees_lome')
 def donnees_lome(request):
     """Données spécifiques à Lomé"""
-    # Coordonnées approximatives de Lomé
-    lome_lat_min, lome_lat_max = 6.0, 6.3
-    lome_lng_min, lome_lng_max = 1.0, 1.4
-    
     lieux_lome = Lieu.objects.filter(
-        latitude__range=[lome_lat_min, lome_lat_max],
-        longitude__range=[lome_lng_min, lome_lng_max]
+        latitude__range=LOME_LAT_RANGE,
+        longitude__range=LOME_LNG_RANGE
     )
     
     evenements_lome = Evenement.objects.filter(
@@ -455,10 +462,96 @@ def donnees_lome(request):
     return Response({
         'nombre_lieux_lome': lieux_lome.count(),
         'nombre_evenements_a_venir': evenements_lome.count(),
-        'categories_lieux': list(
-            lieux_lome.values_list('categorie', flat=True).distinct()
-        ),
+        'categories_lieux': [
+            facette['categorie'] for facette in get_categories_facettes(lome_seulement=True)
+        ],
         'prochains_evenements': EvenementListSerializer(
             evenements_lome[:5], many=True
         ).data
-    })
\ No newline at end of file
+    })
+
+
+@api_view(['GET'])
+@permission_classes([])
+def autocomplete(request):
+    """Autocomplétion des noms de lieux et d'événements à venir (index en mémoire)"""
+    query = request.query_params.get('q', '')
+    type_filtre = request.query_params.get('type')
+    
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    
+    types = None
+    if type_filtre in (TYPE_LIEU, TYPE_EVENEMENT):
+        types = {type_filtre}
+    
+    resultats = autocomplete_index.rechercher(query, limit=limit, types=types)
+    
+    return Response({
+        'query': query,
+        'count': len(resultats),
+        'resultats': resultats
+    })
+
+
+@api_view(['GET'])
+@permission_classes([])
+def categories(request):
+    """Catégories de lieux avec leur nombre de lieux (comptes mis en cache)"""
+    facettes = get_categories_facettes()
+    return Response({
+        'count': len(facettes),
+        'categories': facettes
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def notifications_non_lues(request):
+    """Notifications personnelles non lues, par pages (paramètres cursor et limit)"""
+    try:
+        notifications, next_cursor = page_non_lues(
+            request.user.id,
+            request.query_params.get('cursor'),
+            request.query_params.get('limit', 20)
+        )
+    except ValueError:
+        return Response({'error': 'Curseur ou limite invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'count': compter_non_lues(request.user.id),
+        'notifications': notifications,
+        'next_cursor': next_cursor
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def marquer_notifications_lues(request):
+    """Marquer comme lues des notifications (ids) ou toutes (all=true), en une requête"""
+    if request.data.get('all'):
+        ids = None
+    else:
+        ids = request.data.get('ids')
+        if not isinstance(ids, list):
+            return Response(
+                {'error': "Fournir 'ids' (liste) ou 'all': true"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            ids = [int(identifiant) for identifiant in ids]
+        except (TypeError, ValueError):
+            return Response({'error': 'Identifiants invalides'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'count': marquer_lues(request.user.id, ids)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def websocket_stats(request):
+    """Présence WebSocket (connexions par processus, groupes, utilisateurs uniques) et métriques"""
+    stats = WebSocketHealthCheck.get_connection_stats(details=True)
+    code = status.HTTP_200_OK if stats['status'] == 'healthy' else status.HTTP_503_SERVICE_UNAVAILABLE
+    return Response(stats, status=code)
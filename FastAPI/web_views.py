@@ -9,17 +9,18 @@ from django.utils import timezone
 from .models import Utilisateur, Lieu, Evenement, AvisLieu, AvisEvenement
 from .serializers import UtilisateurCreateSerializer, LoginSerializer
 from .geolocation_services import GeolocationService, LomeLocationService
+from .categories import get_categories_facettes, slug_categorie
+from .statistiques import StatistiquesService
 
 
 def index(request):
     """Page d'accueil"""
     # Statistiques
+    statistiques = StatistiquesService.get()
     stats = {
-        'total_lieux': Lieu.objects.count(),
-        'total_evenements': Evenement.objects.count(),
-        'evenements_a_venir': Evenement.objects.filter(
-            date_debut__gt=timezone.now()
-        ).count(),
+        'total_lieux': statistiques.nombre_lieux,
+        'total_evenements': statistiques.nombre_evenements,
+        'evenements_a_venir': statistiques.evenements_a_venir,
     }
     
     # Événements à venir
@@ -49,7 +50,7 @@ def liste_lieux(request):
     search = request.GET.get('search')
     
     if categorie:
-        lieux = lieux.filter(categorie__icontains=categorie)
+        lieux = lieux.filter(categorie_slug=slug_categorie(categorie))
     
     if search:
         lieux = lieux.filter(
@@ -63,7 +64,7 @@ def liste_lieux(request):
     lieux_page = paginator.get_page(page_number)
     
     # Catégories disponibles
-    categories = Lieu.objects.values_list('categorie', flat=True).distinct()
+    categories = [facette['categorie'] for facette in get_categories_facettes()]
     
     context = {
         'lieux': lieux_page,
@@ -255,7 +256,7 @@ def create_evenement(request):
         except Exception as e:
             messages.error(request, f'Erreur lors de la création: {str(e)}')
     
-    lieux = Lieu.objects.all()
+    lieux = Lieu.objects.only('id', 'nom', 'categorie').order_by('nom')
     context = {'lieux': lieux}
     return render(request, 'evenements/create.html', context)
 
@@ -284,7 +285,7 @@ def edit_evenement(request, evenement_id):
         except Exception as e:
             messages.error(request, f'Erreur lors de la modification: {str(e)}')
     
-    lieux = Lieu.objects.all()
+    lieux = Lieu.objects.only('id', 'nom', 'categorie').order_by('nom')
     context = {
         'evenement': evenement,
         'lieux': lieux
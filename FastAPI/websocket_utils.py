@@ -3,94 +3,183 @@ Utilitaires WebSocket et gestion des tâches périodiques
 Fichier: websocket_utils.py
 """
 
+import asyncio
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from django.utils import timezone
 from datetime import timedelta
 from django.core.management.base import BaseCommand
-from .models import Evenement, Utilisateur
+from .models import Utilisateur
 from .serializers import EvenementListSerializer
+from .subscriber_index import message_localisation
+from .notification_frames import frame_rappel, frames_localisation
+from .geo_cells import cell_group_for_point, covering_groups, publish_groups
+from .metrics import lire_metriques
+from .notification_journal import journaliser
+from .presence import lire_presence
+from .event_reminders import envoyer_rappels
 import logging
 
 logger = logging.getLogger(__name__)
 channel_layer = get_channel_layer()
 
 
+class AsyncWebSocketManager:
+    """
+    Envois WebSocket natifs asyncio. Les envois vers plusieurs groupes sont
+    concurrents (asyncio.gather) pour recouvrir les allers-retours Redis.
+    Les messages des groupes publics sont d'abord numérotés et journalisés
+    pour la reprise après reconnexion (voir notification_journal.py).
+    """
+    
+    @staticmethod
+    async def send_many(groups, message, layer=None):
+        """
+        Envoyer le même message à plusieurs groupes en parallèle.
+        Retourne la liste des échecs [(groupe, exception)].
+        """
+        groups = list(groups)
+        await journaliser([(groups, message)])
+        return await AsyncWebSocketManager._diffuser(groups, message, layer)
+    
+    @staticmethod
+    async def _diffuser(groups, message, layer=None):
+        layer = layer or channel_layer
+        resultats = await asyncio.gather(
+            *(layer.group_send(group_name, message) for group_name in groups),
+            return_exceptions=True
+        )
+        echecs = [
+            (group_name, resultat)
+            for group_name, resultat in zip(groups, resultats)
+            if isinstance(resultat, BaseException)
+        ]
+        for group_name, erreur in echecs:
+            logger.error(f"Erreur envoi WebSocket vers {group_name}: {erreur}")
+        return echecs
+    
+    @staticmethod
+    async def send_batch(envois, layer=None):
+        """
+        Envoyer plusieurs messages [(groupes, message)] en un seul passage.
+        Retourne, pour chaque envoi, la liste de ses échecs.
+        """
+        envois = [(list(groups), message) for groups, message in envois]
+        await journaliser(envois)
+        return await asyncio.gather(*(
+            AsyncWebSocketManager._diffuser(groups, message, layer)
+            for groups, message in envois
+        ))
+    
+    @staticmethod
+    async def send_notification(group_name, notification_type, data):
+        """Envoyer une notification à un groupe"""
+        echecs = await AsyncWebSocketManager.send_many(
+            [group_name], {'type': notification_type, **data}
+        )
+        if not echecs:
+            logger.info(f"Notification envoyée à {group_name}: {notification_type}")
+        return not echecs
+    
+    @staticmethod
+    async def broadcast_to_all(notification_type, data):
+        """Diffuser à tous les clients connectés"""
+        return await AsyncWebSocketManager.send_notification(
+            'events_notifications', notification_type, data
+        )
+    
+    @staticmethod
+    async def send_personal_notification(user_id, notification_type, data):
+        """Envoyer une notification personnelle"""
+        return await AsyncWebSocketManager.send_notification(
+            f'user_{user_id}', notification_type, data
+        )
+    
+    @staticmethod
+    def location_envoi(latitude, longitude, notification_type, data):
+        """
+        (groupes, message) d'une notification localisée: la cellule du point à
+        chaque niveau. Les autres clés de `data` (ex: reminder_time) sont
+        ajoutées aux trames
+        """
+        champs = {cle: valeur for cle, valeur in data.items() if cle != 'event_data'}
+        return (
+            publish_groups(float(latitude), float(longitude)),
+            message_localisation(
+                latitude,
+                longitude,
+                frames_localisation(notification_type, data['event_data'], **champs)
+            )
+        )
+    
+    @staticmethod
+    async def send_location_notification(latitude, longitude, notification_type, data, radius=15):
+        """
+        Envoyer une notification basée sur la localisation.
+        Chaque processus la remet aux abonnés dont le rayon exact contient le
+        point (voir subscriber_index.py). `data['event_data']` est l'événement
+        sérialisé; `radius` est conservé pour compatibilité.
+        """
+        groups, message = AsyncWebSocketManager.location_envoi(
+            latitude, longitude, notification_type, data
+        )
+        echecs = await AsyncWebSocketManager.send_many(groups, message)
+        if not echecs:
+            logger.info(f"Notification localisée publiée: {notification_type}")
+        return not echecs
+    
+    @staticmethod
+    async def send_category_notification(category, notification_type, data):
+        """Envoyer une notification par catégorie"""
+        return await AsyncWebSocketManager.send_notification(
+            DynamicGroupManager.create_category_group(category), notification_type, data
+        )
+
+
 class WebSocketManager:
-    """Gestionnaire centralisé des notifications WebSocket"""
+    """Façade synchrone de AsyncWebSocketManager (vues, commandes, tâches)"""
+    
+    @staticmethod
+    def send_many(groups, message):
+        """Envoyer le même message à plusieurs groupes en parallèle"""
+        return async_to_sync(AsyncWebSocketManager.send_many)(groups, message)
+    
+    @staticmethod
+    def send_batch(envois):
+        """Envoyer plusieurs messages [(groupes, message)] en un seul passage"""
+        return async_to_sync(AsyncWebSocketManager.send_batch)(envois)
     
     @staticmethod
     def send_notification(group_name, notification_type, data):
         """Envoyer une notification à un groupe"""
-        try:
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                {
-                    'type': notification_type,
-                    **data
-                }
-            )
-            logger.info(f"Notification envoyée à {group_name}: {notification_type}")
-            return True
-        except Exception as e:
-            logger.error(f"Erreur envoi notification WebSocket: {e}")
-            return False
+        return async_to_sync(AsyncWebSocketManager.send_notification)(
+            group_name, notification_type, data
+        )
     
     @staticmethod
     def broadcast_to_all(notification_type, data):
         """Diffuser à tous les clients connectés"""
-        return WebSocketManager.send_notification(
-            'events_notifications',
-            notification_type,
-            data
-        )
+        return async_to_sync(AsyncWebSocketManager.broadcast_to_all)(notification_type, data)
     
     @staticmethod
     def send_personal_notification(user_id, notification_type, data):
         """Envoyer une notification personnelle"""
-        return WebSocketManager.send_notification(
-            f'user_{user_id}',
-            notification_type,
-            data
+        return async_to_sync(AsyncWebSocketManager.send_personal_notification)(
+            user_id, notification_type, data
         )
     
     @staticmethod
     def send_location_notification(latitude, longitude, notification_type, data, radius=15):
         """Envoyer une notification basée sur la localisation"""
-        # Zone principale
-        lat_zone = int(float(latitude) * 100)
-        lng_zone = int(float(longitude) * 100)
-        
-        success = WebSocketManager.send_notification(
-            f'location_{lat_zone}_{lng_zone}',
-            notification_type,
-            data
+        return async_to_sync(AsyncWebSocketManager.send_location_notification)(
+            latitude, longitude, notification_type, data, radius
         )
-        
-        # Zones adjacentes si nécessaire
-        if radius > 10:
-            for lat_offset in [-1, 0, 1]:
-                for lng_offset in [-1, 0, 1]:
-                    if lat_offset == 0 and lng_offset == 0:
-                        continue
-                    
-                    adjacent_group = f'location_{lat_zone + lat_offset}_{lng_zone + lng_offset}'
-                    WebSocketManager.send_notification(
-                        adjacent_group,
-                        notification_type,
-                        {**data, 'is_adjacent_zone': True}
-                    )
-        
-        return success
     
     @staticmethod
     def send_category_notification(category, notification_type, data):
         """Envoyer une notification par catégorie"""
-        category_group = f"category_{category.lower().replace(' ', '_')}"
-        return WebSocketManager.send_notification(
-            category_group,
-            notification_type,
-            data
+        return async_to_sync(AsyncWebSocketManager.send_category_notification)(
+            category, notification_type, data
         )
 
 
@@ -99,57 +188,41 @@ class EventReminderService:
     
     @staticmethod
     def send_upcoming_reminders():
-        """Envoyer les rappels pour les événements à venir"""
-        now = timezone.now()
-        
-        # Rappels à 24h
-        tomorrow = now + timedelta(hours=24)
-        events_24h = Evenement.objects.filter(
-            date_debut__gte=now + timedelta(hours=23, minutes=30),
-            date_debut__lte=tomorrow + timedelta(minutes=30)
-        ).select_related('organisateur', 'lieu')
-        
-        for event in events_24h:
-            EventReminderService.send_reminder(event, '24 heures')
-        
-        # Rappels à 1h
-        one_hour = now + timedelta(hours=1)
-        events_1h = Evenement.objects.filter(
-            date_debut__gte=now + timedelta(minutes=30),
-            date_debut__lte=one_hour + timedelta(minutes=30)
-        ).select_related('organisateur', 'lieu')
-        
-        for event in events_1h:
-            EventReminderService.send_reminder(event, '1 heure')
+        """
+        Envoyer les rappels dus. Les rappels sont planifiés à la création et
+        au changement de date des événements (voir event_reminders.py): un
+        appel répété ou tardif n'envoie ni doublon ni rappel manqué.
+        """
+        traites = envoyer_rappels()
+        logger.info(f"Rappels traités: {traites}")
+    
+    @staticmethod
+    def reminder_envois(event, time_until):
+        """Messages [(groupes, message)] du rappel d'un événement"""
+        event_data = EvenementListSerializer(event).data
         
-        logger.info(f"Rappels envoyés: {len(events_24h)} (24h), {len(events_1h)} (1h)")
+        return [
+            # Rappel à l'organisateur
+            (
+                [f'user_{event.organisateur.id}'],
+                {
+                    'type': 'event_reminder',
+                    'frame': frame_rappel(event_data, time_until, is_organizer=True)
+                }
+            ),
+            # Rappel géographique pour les utilisateurs de la zone
+            AsyncWebSocketManager.location_envoi(
+                event.lieu.latitude,
+                event.lieu.longitude,
+                'proximity_event_reminder',
+                {'event_data': event_data, 'reminder_time': time_until}
+            ),
+        ]
     
     @staticmethod
     def send_reminder(event, time_until):
         """Envoyer un rappel pour un événement spécifique"""
-        event_data = EvenementListSerializer(event).data
-        
-        # Rappel à l'organisateur
-        WebSocketManager.send_personal_notification(
-            event.organisateur.id,
-            'event_reminder',
-            {
-                'event_data': event_data,
-                'reminder_time': time_until,
-                'is_organizer': True
-            }
-        )
-        
-        # Rappel géographique pour les utilisateurs de la zone
-        WebSocketManager.send_location_notification(
-            float(event.lieu.latitude),
-            float(event.lieu.longitude),
-            'proximity_event_reminder',
-            {
-                'event_data': event_data,
-                'reminder_time': time_until
-            }
-        )
+        WebSocketManager.send_batch(EventReminderService.reminder_envois(event, time_until))
 
 
 class WebSocketHealthCheck:
@@ -177,16 +250,32 @@ class WebSocketHealthCheck:
             return False
     
     @staticmethod
-    def get_connection_stats():
-        """Obtenir les statistiques de connexion (nécessite Redis)"""
+    def get_connection_stats(details=False):
+        """
+        Statistiques de connexion agrégées depuis la présence Redis (presence.py).
+        `details`: ajouter les groupes les plus peuplés et les métriques publiées
+        """
         try:
-            # Ici vous pouvez implémenter des statistiques via Redis
-            # Par exemple, compter les connexions actives
-            return {
+            presence_stats = lire_presence()
+            stats = {
                 'status': 'healthy',
-                'active_connections': 'N/A',
+                'active_connections': presence_stats['connexions_totales'],
+                'nodes': presence_stats['connexions_par_processus'],
+                'unique_users': presence_stats['utilisateurs_uniques'],
                 'last_check': timezone.now().isoformat()
             }
+            if details:
+                stats['groups'] = presence_stats['groupes']
+                stats['group_count'] = presence_stats['nombre_groupes']
+                stats['metrics'] = {
+                    'relais_notifications': lire_metriques('relais_notifications'),
+                    'rappels_evenements': lire_metriques('rappels_evenements'),
+                    **{
+                        f'websocket_{noeud}': lire_metriques(f'websocket_{noeud}')
+                        for noeud in presence_stats['connexions_par_processus']
+                    },
+                }
+            return stats
         except Exception as e:
             return {
                 'status': 'error',
@@ -367,11 +456,14 @@ class DynamicGroupManager:
     """Gestionnaire pour les groupes WebSocket dynamiques"""
     
     @staticmethod
-    def create_location_group(latitude, longitude, precision=2):
-        """Créer un nom de groupe basé sur la localisation"""
-        lat_zone = round(float(latitude) * (10 ** precision))
-        lng_zone = round(float(longitude) * (10 ** precision))
-        return f'location_{lat_zone}_{lng_zone}'
+    def create_location_group(latitude, longitude, level=0):
+        """Nom du groupe de la cellule contenant le point (voir geo_cells.py)"""
+        return cell_group_for_point(float(latitude), float(longitude), level)
+    
+    @staticmethod
+    def create_location_groups(latitude, longitude, radius_km):
+        """Groupes de cellules couvrant un cercle (au plus 2x2)"""
+        return covering_groups(float(latitude), float(longitude), float(radius_km))
     
     @staticmethod
     def create_category_group(category):
@@ -389,63 +481,6 @@ class DynamicGroupManager:
         return f'event_{event_id}'
 
 
-# Système de rate limiting pour les WebSockets
-class WebSocketRateLimiter:
-    """Rate limiting pour les connexions WebSocket"""
-    
-    def __init__(self, max_connections_per_ip=10, max_messages_per_minute=60):
-        self.max_connections_per_ip = max_connections_per_ip
-        self.max_messages_per_minute = max_messages_per_minute
-        self.connections = {}  # IP -> count
-        self.messages = {}     # IP -> [(timestamp, count), ...]
-    
-    def can_connect(self, ip_address):
-        """Vérifier si une IP peut se connecter"""
-        current_connections = self.connections.get(ip_address, 0)
-        return current_connections < self.max_connections_per_ip
-    
-    def add_connection(self, ip_address):
-        """Ajouter une connexion"""
-        self.connections[ip_address] = self.connections.get(ip_address, 0) + 1
-    
-    def remove_connection(self, ip_address):
-        """Supprimer une connexion"""
-        if ip_address in self.connections:
-            self.connections[ip_address] -= 1
-            if self.connections[ip_address] <= 0:
-                del self.connections[ip_address]
-    
-    def can_send_message(self, ip_address):
-        """Vérifier si une IP peut envoyer un message"""
-        now = timezone.now()
-        minute_ago = now - timedelta(minutes=1)
-        
-        # Nettoyer les anciens messages
-        if ip_address in self.messages:
-            self.messages[ip_address] = [
-                (timestamp, count) for timestamp, count in self.messages[ip_address]
-                if timestamp > minute_ago
-            ]
-        
-        # Compter les messages dans la dernière minute
-        current_count = sum(
-            count for timestamp, count in self.messages.get(ip_address, [])
-        )
-        
-        return current_count < self.max_messages_per_minute
-    
-    def add_message(self, ip_address):
-        """Enregistrer un message envoyé"""
-        now = timezone.now()
-        if ip_address not in self.messages:
-            self.messages[ip_address] = []
-        self.messages[ip_address].append((now, 1))
-
-
-# Instance globale du rate limiter
-rate_limiter = WebSocketRateLimiter()
-
-
 # Système d'analytics pour les WebSockets
 class WebSocketAnalytics:
     """Analytics pour les connexions WebSocket"""
@@ -473,12 +508,20 @@ class ProductionWebSocketConfig:
     # Limite de connexions par serveur
     MAX_CONNECTIONS = 10000
     
-    # Timeout pour les connexions inactives
-    CONNECTION_TIMEOUT = timedelta(minutes=30)
+    # Timeout des connexions inactives (aucune trame reçue), pour les clients
+    # qui répondent aux pings serveur par un pong
+    CONNECTION_TIMEOUT = timedelta(seconds=90)
+    
+    # Ping serveur après cette durée sans trame reçue du client
+    HEARTBEAT_INTERVAL = timedelta(seconds=30)
     
     # Taille max des messages
     MAX_MESSAGE_SIZE = 64 * 1024  # 64KB
     
+    # Appliqués par consumers.ConnectionGuardMixin (voir connection_guard.py),
+    # surchargeables par WEBSOCKET_MAX_CONNECTIONS, WEBSOCKET_IDLE_TIMEOUT,
+    # WEBSOCKET_HEARTBEAT_INTERVAL et WEBSOCKET_MAX_MESSAGE_SIZE
+    
     # Configuration Redis pour la scalabilité
     REDIS_CONFIG = {
         'hosts': [('redis-server', 6379)],
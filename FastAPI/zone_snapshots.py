@@ -0,0 +1,124 @@
+"""
+Instantanés des événements à venir par cellule géographique pour les
+connexions de localisation (trame current_events)
+Fichier: zone_snapshots.py
+
+Le cercle d'un abonné est couvert par au plus 2x2 cellules (geo_cells.py).
+Chaque cellule est calculée une seule fois (une requête, avis préchargés,
+sérialisation en un passage), mise en cache et partagée par tous les clients
+de la zone: une ruée de reconnexions ne coûte que des lectures de cache, et
+le filtrage au rayon exact et à l'heure courante se fait en mémoire.
+
+Les cellules d'un lieu (tous niveaux) sont invalidées après le commit des
+écritures sur le lieu, ses événements ou leurs avis (voir signals.py). Comme
+pour cache_utils.bump_generation, l'invalidation incrémente une génération
+par cellule, incluse dans la clé de l'instantané: un recalcul en cours, lancé
+avant l'écriture, range son résultat sous l'ancienne génération, qui n'est
+plus lue.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .cache_utils import cache_aside
+from .geo_cells import (
+    cell_bounds, cell_group, cell_index, covering_cells, distance_km, publish_groups
+)
+from .subscription_filters import attributs_evenement
+
+SNAPSHOT_CACHE_KEY = 'instantane_zone_{}_g{}'
+SNAPSHOT_GENERATION_KEY = 'instantane_zone_generation_{}'
+SNAPSHOT_CACHE_TIMEOUT = 10 * 60
+
+# Événements à venir conservés par cellule, et envoyés à la connexion
+SNAPSHOT_CELL_MAX = 200
+SNAPSHOT_EVENTS_MAX = 10
+
+# Marge (degrés) de la requête autour d'une cellule: l'appartenance exacte est
+# vérifiée avec cell_index, comme pour la publication des notifications
+SNAPSHOT_BOUNDS_MARGIN = 1e-6
+
+
+def cles_instantanes(cellules):
+    """Clés des instantanés des cellules à leur génération courante (une lecture du cache)"""
+    groupes = [cell_group(*cellule) for cellule in cellules]
+    generations = cache.get_many([SNAPSHOT_GENERATION_KEY.format(groupe) for groupe in groupes])
+    return [
+        SNAPSHOT_CACHE_KEY.format(groupe, generations.get(SNAPSHOT_GENERATION_KEY.format(groupe), 1))
+        for groupe in groupes
+    ]
+
+
+def calculer_cellule(level, i, j):
+    """Événements à venir des lieux de la cellule, par date de début"""
+    from .models import Evenement
+    from .serializers import EvenementListSerializer
+
+    lat_min, lat_max, lng_min, lng_max = cell_bounds(level, i, j)
+    evenements = Evenement.objects.filter(
+        lieu__latitude__gte=lat_min - SNAPSHOT_BOUNDS_MARGIN,
+        lieu__latitude__lte=lat_max + SNAPSHOT_BOUNDS_MARGIN,
+        lieu__longitude__gte=lng_min - SNAPSHOT_BOUNDS_MARGIN,
+        lieu__longitude__lte=lng_max + SNAPSHOT_BOUNDS_MARGIN,
+        date_debut__gt=timezone.now()
+    ).select_related('lieu', 'organisateur').prefetch_related('avis').order_by('date_debut')
+
+    entrees = []
+    for evenement in evenements[:SNAPSHOT_CELL_MAX]:
+        latitude, longitude = float(evenement.lieu.latitude), float(evenement.lieu.longitude)
+        if cell_index(latitude, longitude, level) != (i, j):
+            continue
+        event_data = EvenementListSerializer(evenement).data
+        # latitude, longitude, debut, et les champs évalués par les filtres d'abonnement
+        entrees.append({
+            **attributs_evenement(evenement, event_data['moyenne_avis']),
+            'event': event_data,
+        })
+    return entrees
+
+
+def evenements_zone(latitude, longitude, radius_km, limite=SNAPSHOT_EVENTS_MAX, filtre=None):
+    """
+    Événements à venir dans le cercle (données sérialisées), les plus proches
+    dans le temps d'abord; `filtre`: FiltreAbonnement de la connexion
+    """
+    maintenant = time.time()
+    resultats = []
+    cellules = covering_cells(latitude, longitude, radius_km)
+    for cellule, cle in zip(cellules, cles_instantanes(cellules)):
+        entrees = cache_aside(
+            cle,
+            lambda cellule=cellule: calculer_cellule(*cellule),
+            SNAPSHOT_CACHE_TIMEOUT
+        )
+        resultats.extend(
+            entree for entree in entrees
+            if entree['debut'] > maintenant
+            and distance_km(latitude, longitude, entree['latitude'], entree['longitude']) <= radius_km
+            and (filtre is None or filtre.accepte(entree))
+        )
+    resultats.sort(key=lambda entree: entree['debut'])
+    return [entree['event'] for entree in resultats[:limite]]
+
+
+def invalider_zone(latitude, longitude):
+    """
+    Invalider les instantanés des cellules d'un point, après le commit de la
+    transaction: nouvelle génération de chaque cellule
+    """
+    cles = [
+        SNAPSHOT_GENERATION_KEY.format(groupe)
+        for groupe in publish_groups(float(latitude), float(longitude))
+    ]
+    transaction.on_commit(lambda: _incrementer_generations(cles))
+
+
+def _incrementer_generations(cles):
+    for cle in cles:
+        # Génération absente: 1 implicite. add n'écrase pas une génération
+        # créée entre-temps par un autre processus, incr reste atomique
+        cache.add(cle, 1, None)
+        cache.incr(cle)
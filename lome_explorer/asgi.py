@@ -6,18 +6,20 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lome_explorer.settings')
 django.setup()
 
 from django.core.asgi import get_asgi_application
+from django.urls import re_path
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 
 # Importer les routes WebSocket APRÈS django.setup()
-from FastAPI.routing import websocket_urlpatterns
+from FastAPI.routing import http_urlpatterns, websocket_urlpatterns
 
 # Application ASGI Django classique
 django_asgi_app = get_asgi_application()
 
 # Application ASGI complète avec WebSocket
 application = ProtocolTypeRouter({
-    "http": django_asgi_app,
+    # Flux SSE routé avant Django, puis toutes les autres requêtes HTTP
+    "http": URLRouter(http_urlpatterns + [re_path(r'', django_asgi_app)]),
     "websocket": AuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
@@ -96,6 +96,21 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Données temps réel (présence WebSocket...): base distincte du channel layer et du cache
+REDIS_DATA_URL = os.getenv('REDIS_DATA_URL', f'redis://{REDIS_HOST}:{REDIS_PORT}/2')
+WEBSOCKET_PRESENCE_ENABLED = os.getenv('WEBSOCKET_PRESENCE_ENABLED', 'True') == 'True'
+# Journal des notifications (Redis Streams) pour la reprise après reconnexion (resume_from)
+NOTIFICATION_JOURNAL_ENABLED = os.getenv('NOTIFICATION_JOURNAL_ENABLED', 'True') == 'True'
+
+# Notifications WebSocket: publiées juste après le commit en développement,
+# par `python manage.py relay_notifications` en production
+NOTIFICATION_RELAY_INLINE = os.getenv('NOTIFICATION_RELAY_INLINE', str(DEBUG)) == 'True'
+
+# File sortante par connexion WebSocket: fenêtre de regroupement (0 = envoi
+# immédiat) et nombre maximal de trames en attente
+WEBSOCKET_FLUSH_WINDOW_MS = int(os.getenv('WEBSOCKET_FLUSH_WINDOW_MS', '200'))
+WEBSOCKET_SEND_QUEUE_MAX = int(os.getenv('WEBSOCKET_SEND_QUEUE_MAX', '100'))
+
 # ==============================================================================
 # CORS CONFIGURATION
 # ==============================================================================
@@ -250,6 +265,9 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # Proxys de confiance devant l'application (Render): l'IP client est
+    # l'entrée de X-Forwarded-For ajoutée par le dernier d'entre eux
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1')),
 }
 
 # ==============================================================================